@@ -20,7 +20,9 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+import json
 import signal
+import hashlib
 import logging
 import multiprocessing
 import numpy as np
@@ -67,10 +69,78 @@ def in_hull(p, hull):
     return flag
 
 
+def pts_in_box3d(pts, box3d):
+    """
+    Analytic version of in_hull(pts, corners of box3d)
+    :param pts: (N, 3) points in rect camera coords
+    :param box3d: (7) [x, y, z, h, w, l, ry], (x, y, z) is the bottom center
+    :return (N) bool
+    """
+    x, y, z, h, w, l, ry = box3d[:7]
+    cos_ry, sin_ry = np.cos(ry), np.sin(ry)
+    dx = pts[:, 0] - x
+    dz = pts[:, 2] - z
+    # rotate back into the box frame, see kitti_utils.boxes3d_to_corners3d
+    local_x = dx * cos_ry - dz * sin_ry
+    local_z = dx * sin_ry + dz * cos_ry
+    dy = pts[:, 1] - y
+    return (np.abs(local_x) <= l / 2.) & (np.abs(local_z) <= w / 2.) & \
+           (dy <= 0) & (dy >= -h)
+
+
+def _pack_batch(buf, samples):
+    """
+    Write the fields of samples into the shared buffer buf. ndarray fields
+    are stacked into one [batch_size, max_len, ...] array, padded with zeros
+    for fields whose length differs between samples, other fields are
+    kept in the layout.
+    :return layout to rebuild the samples with _unpack_batch, None if buf
+            is too small
+    """
+    layout = []
+    offset = 0
+    for values in zip(*samples):
+        if not all(isinstance(v, np.ndarray) and v.ndim > 0 for v in values) or \
+                len(set((v.dtype, v.shape[1:]) for v in values)) > 1:
+            layout.append((None, values))
+            continue
+        lens = [v.shape[0] for v in values]
+        shape = (len(values), max(lens)) + values[0].shape[1:]
+        dtype = values[0].dtype
+        offset = (offset + 63) // 64 * 64
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if offset + nbytes > buf.nbytes:
+            return None
+        arr = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        for i, v in enumerate(values):
+            arr[i, :lens[i]] = v
+            arr[i, lens[i]:] = 0
+        layout.append(((offset, shape, dtype.str), lens))
+        offset += nbytes
+    return layout
+
+
+def _unpack_batch(buf, layout):
+    """
+    Samples written by _pack_batch. Each array is copied out of buf in one
+    block, so the samples stay valid after the slot is reused.
+    """
+    fields = []
+    for arr_info, values in layout:
+        if arr_info is None:
+            fields.append(values)
+            continue
+        offset, shape, dtype = arr_info
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset).copy()
+        fields.append([arr[i, :l] for i, l in enumerate(values)])
+    return [list(sample) for sample in zip(*fields)]
+
+
 class KittiRCNNReader(KittiDataset):
     def __init__(self, data_dir, npoints=16384, split='train', classes='Car', mode='TRAIN',
                  random_select=True, rcnn_training_roi_dir=None, rcnn_training_feature_dir=None,
-                 rcnn_eval_roi_dir=None, rcnn_eval_feature_dir=None, gt_database_dir=None):
+                 rcnn_eval_roi_dir=None, rcnn_eval_feature_dir=None, gt_database_dir=None,
+                 pts_cache_dir=None):
         super(KittiRCNNReader, self).__init__(data_dir=data_dir, split=split)
         if classes == 'Car':
             self.classes = ('Background', 'Car')
@@ -142,6 +212,10 @@ class KittiRCNNReader(KittiDataset):
                 self.sample_id_list = [int(sample_id) for sample_id in self.image_idx_list]
                 logger.info('Load testing samples from %s' % self.imageset_dir)
                 logger.info('Done: total test samples %d' % len(self.sample_id_list))
+
+            if pts_cache_dir is None:
+                pts_cache_dir = os.path.join(data_dir, 'KITTI', 'pts_cache')
+            self.load_pts_cache(pts_cache_dir)
         elif cfg.RCNN.ENABLED:
             for idx in range(0, self.num_sample):
                 sample_id = int(self.image_idx_list[idx])
@@ -275,8 +349,11 @@ class KittiRCNNReader(KittiDataset):
             pts_valid_flag = pts_valid_flag & range_flag
         return pts_valid_flag
 
-    def get_rpn_sample(self, index):
-        sample_id = int(self.sample_id_list[index])
+    def get_valid_pts(self, sample_id):
+        """
+        Rect points (N, 3) and intensity (N) of the points that are in the
+        image (and in the PC_AREA_SCOPE)
+        """
         if sample_id < 10000:
             calib = self.get_calib(sample_id)
             # img = self.get_image(sample_id)
@@ -301,6 +378,78 @@ class KittiRCNNReader(KittiDataset):
 
         pts_rect = pts_rect[pts_valid_flag][:, 0:3]
         pts_intensity = pts_intensity[pts_valid_flag]
+        return pts_rect, pts_intensity
+
+    def get_valid_pts_files(self, sample_id):
+        """
+        Point, calib and image files read by get_valid_pts for sample_id
+        """
+        if sample_id < 10000:
+            pts_file = os.path.join(self.lidar_dir, '%06d.bin' % sample_id)
+        else:
+            pts_file = os.path.join(self.aug_pts_dir, '%06d.bin' % sample_id)
+        return [pts_file,
+                os.path.join(self.calib_dir, '%06d.txt' % (sample_id % 10000)),
+                os.path.join(self.image_dir, '%06d.png' % (sample_id % 10000))]
+
+    def load_pts_cache(self, cache_dir):
+        """
+        get_valid_pts of all samples, computed once and saved in cache_dir as
+        one float32 (x, y, z, intensity) .bin file with per sample offsets,
+        which is memory-mapped when loaded again. The file names contain a
+        digest of the samples, the point range config and the size and mtime
+        of the point, calib and image files, so that a regenerated aug_scene
+        builds a new cache.
+        """
+        sample_ids = sorted(set(int(sample_id) for sample_id in self.sample_id_list))
+        file_stats = []
+        for sample_id in sample_ids:
+            for path in self.get_valid_pts_files(sample_id):
+                st = os.stat(path)
+                file_stats.append([st.st_size, int(st.st_mtime)])
+        digest = hashlib.md5(json.dumps(
+            [sample_ids, bool(cfg.PC_REDUCE_BY_RANGE),
+             np.asarray(cfg.PC_AREA_SCOPE).tolist(), file_stats]).encode('utf-8')).hexdigest()[:16]
+        prefix = os.path.join(cache_dir, '{}_{}'.format(self.split, digest))
+        pts_path, index_path = prefix + '_pts.bin', prefix + '_index.npy'
+
+        if not (os.path.exists(pts_path) and os.path.exists(index_path)):
+            logger.info('building point cache %s for %d samples' % (prefix, len(sample_ids)))
+            index = np.zeros((len(sample_ids) + 1, 2), dtype=np.int64)
+            index[:-1, 0] = sample_ids
+            try:
+                if not os.path.isdir(cache_dir):
+                    os.makedirs(cache_dir)
+                tmp_suffix = '.{}.tmp'.format(os.getpid())
+                with open(pts_path + tmp_suffix, 'wb') as f:
+                    for k, sample_id in enumerate(sample_ids):
+                        pts_rect, pts_intensity = self.get_valid_pts(sample_id)
+                        pts = np.concatenate((pts_rect, pts_intensity.reshape(-1, 1)),
+                                             axis=1).astype(np.float32)
+                        f.write(pts.tobytes())
+                        index[k + 1, 1] = index[k, 1] + pts.shape[0]
+                os.rename(pts_path + tmp_suffix, pts_path)
+                with open(index_path + tmp_suffix, 'wb') as f:
+                    np.save(f, index)
+                os.rename(index_path + tmp_suffix, index_path)
+            except (IOError, OSError) as e:
+                logger.warning('failed to save point cache to %s: %s' % (cache_dir, e))
+                self.pts_cache = None
+                return
+
+        index = np.load(index_path)
+        self.pts_cache = np.memmap(pts_path, dtype=np.float32, mode='r').reshape(-1, 4)
+        self.pts_cache_offsets = dict(zip(index[:-1, 0].tolist(),
+                                          zip(index[:-1, 1].tolist(), index[1:, 1].tolist())))
+
+    def get_rpn_sample(self, index):
+        sample_id = int(self.sample_id_list[index])
+        if getattr(self, 'pts_cache', None) is not None:
+            start, end = self.pts_cache_offsets[sample_id]
+            pts = np.array(self.pts_cache[start:end])
+            pts_rect, pts_intensity = pts[:, 0:3], pts[:, 3]
+        else:
+            pts_rect, pts_intensity = self.get_valid_pts(sample_id)
 
         if cfg.GT_AUG_ENABLED and self.mode == 'TRAIN':
             # all labels for checking overlapping
@@ -577,18 +726,14 @@ class KittiRCNNReader(KittiDataset):
     def generate_rpn_training_labels(pts_rect, gt_boxes3d):
         cls_label = np.zeros((pts_rect.shape[0]), dtype=np.int32)
         reg_label = np.zeros((pts_rect.shape[0], 7), dtype=np.float32)  # dx, dy, dz, ry, h, w, l
-        gt_corners = kitti_utils.boxes3d_to_corners3d(gt_boxes3d, rotate=True)
         extend_gt_boxes3d = kitti_utils.enlarge_box3d(gt_boxes3d, extra_width=0.2)
-        extend_gt_corners = kitti_utils.boxes3d_to_corners3d(extend_gt_boxes3d, rotate=True)
         for k in range(gt_boxes3d.shape[0]):
-            box_corners = gt_corners[k]
-            fg_pt_flag = in_hull(pts_rect, box_corners)
+            fg_pt_flag = pts_in_box3d(pts_rect, gt_boxes3d[k])
             fg_pts_rect = pts_rect[fg_pt_flag]
             cls_label[fg_pt_flag] = 1
 
             # enlarge the bbox3d, ignore nearby points
-            extend_box_corners = extend_gt_corners[k]
-            fg_enlarge_flag = in_hull(pts_rect, extend_box_corners)
+            fg_enlarge_flag = pts_in_box3d(pts_rect, extend_gt_boxes3d[k])
             ignore_flag = np.logical_xor(fg_pt_flag, fg_enlarge_flag)
             cls_label[ignore_flag] = -1
 
@@ -1136,12 +1281,44 @@ class KittiRCNNReader(KittiDataset):
         return reader
 
     def get_multiprocess_reader(self, batch_size, fields, proc_num=8, max_queue_len=128, drop_last=False):
-        def read_to_queue(idxs, queue):
-            for idx in idxs:
-                sample_all = self.__getitem__(idx)
-                sample = [sample_all[f] for f in fields]
-                queue.put(sample)
-            queue.put(None)
+        """
+        Each worker process reads whole batches and writes them into one of
+        the shared memory slots, only the slot id and the batch layout are
+        sent through the queue. max_queue_len samples are buffered in slots.
+        """
+        slots = []
+        slot_num = max(2, int(max_queue_len / batch_size))
+
+        def init_slots(idx):
+            # slot size from one sample, with room for fields whose length
+            # differs between samples
+            sample_all = self.__getitem__(idx)
+            slot_bytes = 0
+            for f in fields:
+                if isinstance(sample_all[f], np.ndarray):
+                    slot_bytes += int(sample_all[f].nbytes * 1.5) + 65536
+            slot_bytes *= batch_size
+            for i in range(slot_num):
+                slots.append(np.frombuffer(multiprocessing.RawArray('B', slot_bytes), dtype=np.uint8))
+
+        def read_to_slots(task_queue, free_queue, ready_queue):
+            while True:
+                idxs = task_queue.get()
+                if idxs is None:
+                    break
+                samples = []
+                for idx in idxs:
+                    sample_all = self.__getitem__(idx)
+                    samples.append([sample_all[f] for f in fields])
+                slot = free_queue.get()
+                layout = _pack_batch(slots[slot], samples)
+                if layout is None:
+                    # batch larger than the slot, send it through the queue
+                    free_queue.put(slot)
+                    ready_queue.put((None, samples))
+                else:
+                    ready_queue.put((slot, layout))
+            ready_queue.put(None)
 
         def reader():
             sample_num = self.__len__()
@@ -1149,37 +1326,52 @@ class KittiRCNNReader(KittiDataset):
             if self.mode == 'TRAIN':
                 np.random.shuffle(idxs)
 
-            proc_idxs = []
-            proc_sample_num = int(sample_num / proc_num)
-            start_idx = 0
-            for i in range(proc_num - 1):
-                proc_idxs.append(idxs[start_idx:start_idx + proc_sample_num])
-                start_idx += proc_sample_num
-            proc_idxs.append(idxs[start_idx:])
+            batch_idxs = [idxs[i:i + batch_size] for i in range(0, sample_num, batch_size)]
+            if drop_last and len(batch_idxs) > 0 and len(batch_idxs[-1]) < batch_size:
+                batch_idxs.pop()
+            if len(batch_idxs) == 0:
+                return
+            if len(slots) == 0:
+                init_slots(idxs[0])
+
+            task_queue = multiprocessing.Queue()
+            for b in batch_idxs:
+                task_queue.put(b)
+            for i in range(proc_num):
+                task_queue.put(None)
+            free_queue = multiprocessing.Queue()
+            for i in range(slot_num):
+                free_queue.put(i)
+            ready_queue = multiprocessing.Queue(slot_num)
 
-            queue = multiprocessing.Queue(max_queue_len)
             p_list = []
             for i in range(proc_num):
                 p_list.append(multiprocessing.Process(
-                    target=read_to_queue, args=(proc_idxs[i], queue,)))
+                    target=read_to_slots, args=(task_queue, free_queue, ready_queue,)))
                 p_list[-1].start()
 
-            finish_num = 0
-            batch_out = []
-            while finish_num < len(p_list):
-                sample = queue.get()
-                if sample is None:
-                    finish_num += 1
-                else:
-                    batch_out.append(sample)
-                    if len(batch_out) == batch_size:
-                        yield batch_out
-                        batch_out = []
-
-            # join process
-            for p in p_list:
-                if p.is_alive():
+            try:
+                finish_num = 0
+                while finish_num < len(p_list):
+                    batch = ready_queue.get()
+                    if batch is None:
+                        finish_num += 1
+                        continue
+                    slot, layout = batch
+                    if slot is None:
+                        yield layout
+                    else:
+                        samples = _unpack_batch(slots[slot], layout)
+                        free_queue.put(slot)
+                        yield samples
+                # join process
+                for p in p_list:
                     p.join()
+            finally:
+                # reader stopped early
+                for p in p_list:
+                    if p.is_alive():
+                        p.terminate()
 
         return reader
 
@@ -93,6 +93,11 @@ def parse_args():
         type=str,
         default=None,
         help='specify the saved features for rcnn evaluation when using rcnn_offline mode')
+    parser.add_argument(
+        '--pts_cache_dir',
+        type=str,
+        default=None,
+        help='directory of the cached valid points of RPN samples, default data_dir/KITTI/pts_cache')
     parser.add_argument(
         '--log_interval',
         type=int,
@@ -203,7 +208,8 @@ def eval():
                                         mode='EVAL',
                                         classes=cfg.CLASSES,
                                         rcnn_eval_roi_dir=args.rcnn_eval_roi_dir,
-                                        rcnn_eval_feature_dir=args.rcnn_eval_feature_dir)
+                                        rcnn_eval_feature_dir=args.rcnn_eval_feature_dir,
+                                        pts_cache_dir=args.pts_cache_dir)
     eval_reader = kitti_rcnn_reader.get_multiprocess_reader(args.batch_size, eval_feeds)
     eval_loader.set_sample_list_generator(eval_reader, place)
 
@@ -2,7 +2,7 @@ import time
 import fire
 
 import tools.kitti_object_eval_python.kitti_common as kitti
-from tools.kitti_object_eval_python.eval import get_official_eval_result, get_coco_eval_result
+from tools.kitti_object_eval_python.eval import get_official_eval_result, get_coco_eval_result, calculate_iou_partly, rotate_iou_eval
 
 
 def _read_imageset_file(path):
@@ -28,5 +28,27 @@ def evaluate(label_path,
         return get_official_eval_result(gt_annos, dt_annos, current_class)
 
 
+def benchmark(label_path,
+              result_path,
+              label_split_file,
+              num_parts=50,
+              repeat=3):
+    """time calculate_iou_partly of bbox/bev/3d on the whole split"""
+    dt_annos = kitti.get_label_annos(result_path)
+    val_image_ids = _read_imageset_file(label_split_file)
+    gt_annos = kitti.get_label_annos(label_path, val_image_ids)
+    print("rotate iou: {}".format(rotate_iou_eval.__name__))
+    for metric, name in enumerate(['bbox', 'bev', '3d']):
+        # the first run includes numba compilation
+        t = time.time()
+        calculate_iou_partly(gt_annos, dt_annos, metric, num_parts)
+        first = time.time() - t
+        t = time.time()
+        for _ in range(repeat):
+            calculate_iou_partly(gt_annos, dt_annos, metric, num_parts)
+        print("{}: first run {:.3f}s, {:.3f}s per run".format(
+            name, first, (time.time() - t) / repeat))
+
+
 if __name__ == '__main__':
     fire.Fire()
@@ -0,0 +1,254 @@
+#####################
+# CPU version of rotate_iou.py, the device functions are ported to
+# numba.njit and the kernel is parallelized over boxes with prange.
+# Intermediate values are kept in float32 as in the CUDA version.
+#####################
+import math
+
+import numba
+import numpy as np
+
+
+@numba.njit
+def trangle_area(a0, a1, b0, b1, c0, c1):
+    return ((a0 - c0) * (b1 - c1) - (a1 - c1) * (b0 - c0)) / 2.0
+
+
+@numba.njit
+def area(int_pts, num_of_inter):
+    area_val = 0.0
+    for i in range(num_of_inter - 2):
+        area_val += abs(
+            trangle_area(int_pts[0], int_pts[1], int_pts[2 * i + 2],
+                         int_pts[2 * i + 3], int_pts[2 * i + 4],
+                         int_pts[2 * i + 5]))
+    return area_val
+
+
+@numba.njit
+def sort_vertex_in_convex_polygon(int_pts, num_of_inter, vs):
+    if num_of_inter > 0:
+        center_x = np.float32(0.0)
+        center_y = np.float32(0.0)
+        for i in range(num_of_inter):
+            center_x += int_pts[2 * i]
+            center_y += int_pts[2 * i + 1]
+        center_x = np.float32(center_x / num_of_inter)
+        center_y = np.float32(center_y / num_of_inter)
+        for i in range(num_of_inter):
+            v0 = int_pts[2 * i] - center_x
+            v1 = int_pts[2 * i + 1] - center_y
+            d = math.sqrt(v0 * v0 + v1 * v1)
+            v0 = v0 / d
+            v1 = v1 / d
+            if v1 < 0:
+                v0 = np.float32(-2 - v0)
+            vs[i] = v0
+        for i in range(1, num_of_inter):
+            if vs[i - 1] > vs[i]:
+                temp = vs[i]
+                tx = int_pts[2 * i]
+                ty = int_pts[2 * i + 1]
+                j = i
+                while j > 0 and vs[j - 1] > temp:
+                    vs[j] = vs[j - 1]
+                    int_pts[j * 2] = int_pts[j * 2 - 2]
+                    int_pts[j * 2 + 1] = int_pts[j * 2 - 1]
+                    j -= 1
+
+                vs[j] = temp
+                int_pts[j * 2] = tx
+                int_pts[j * 2 + 1] = ty
+
+
+@numba.njit
+def line_segment_intersection(pts1, pts2, i, j, temp_pts):
+    A0 = pts1[2 * i]
+    A1 = pts1[2 * i + 1]
+
+    B0 = pts1[2 * ((i + 1) % 4)]
+    B1 = pts1[2 * ((i + 1) % 4) + 1]
+
+    C0 = pts2[2 * j]
+    C1 = pts2[2 * j + 1]
+
+    D0 = pts2[2 * ((j + 1) % 4)]
+    D1 = pts2[2 * ((j + 1) % 4) + 1]
+    BA0 = B0 - A0
+    BA1 = B1 - A1
+    DA0 = D0 - A0
+    CA0 = C0 - A0
+    DA1 = D1 - A1
+    CA1 = C1 - A1
+    acd = DA1 * CA0 > CA1 * DA0
+    bcd = (D1 - B1) * (C0 - B0) > (C1 - B1) * (D0 - B0)
+    if acd != bcd:
+        abc = CA1 * BA0 > BA1 * CA0
+        abd = DA1 * BA0 > BA1 * DA0
+        if abc != abd:
+            DC0 = D0 - C0
+            DC1 = D1 - C1
+            ABBA = A0 * B1 - B0 * A1
+            CDDC = C0 * D1 - D0 * C1
+            DH = BA1 * DC0 - BA0 * DC1
+            Dx = ABBA * DC0 - BA0 * CDDC
+            Dy = ABBA * DC1 - BA1 * CDDC
+            temp_pts[0] = Dx / DH
+            temp_pts[1] = Dy / DH
+            return True
+    return False
+
+
+@numba.njit
+def point_in_quadrilateral(pt_x, pt_y, corners):
+    ab0 = corners[2] - corners[0]
+    ab1 = corners[3] - corners[1]
+
+    ad0 = corners[6] - corners[0]
+    ad1 = corners[7] - corners[1]
+
+    ap0 = pt_x - corners[0]
+    ap1 = pt_y - corners[1]
+
+    abab = ab0 * ab0 + ab1 * ab1
+    abap = ab0 * ap0 + ab1 * ap1
+    adad = ad0 * ad0 + ad1 * ad1
+    adap = ad0 * ap0 + ad1 * ap1
+
+    return abab >= abap and abap >= 0 and adad >= adap and adap >= 0
+
+
+@numba.njit
+def quadrilateral_intersection(pts1, pts2, int_pts, temp_pts):
+    num_of_inter = 0
+    for i in range(4):
+        if point_in_quadrilateral(pts1[2 * i], pts1[2 * i + 1], pts2):
+            int_pts[num_of_inter * 2] = pts1[2 * i]
+            int_pts[num_of_inter * 2 + 1] = pts1[2 * i + 1]
+            num_of_inter += 1
+        if point_in_quadrilateral(pts2[2 * i], pts2[2 * i + 1], pts1):
+            int_pts[num_of_inter * 2] = pts2[2 * i]
+            int_pts[num_of_inter * 2 + 1] = pts2[2 * i + 1]
+            num_of_inter += 1
+    for i in range(4):
+        for j in range(4):
+            has_pts = line_segment_intersection(pts1, pts2, i, j, temp_pts)
+            if has_pts:
+                int_pts[num_of_inter * 2] = temp_pts[0]
+                int_pts[num_of_inter * 2 + 1] = temp_pts[1]
+                num_of_inter += 1
+
+    return num_of_inter
+
+
+@numba.njit
+def rbbox_to_corners(corners, rbbox):
+    # generate clockwise corners and rotate it clockwise
+    angle = rbbox[4]
+    a_cos = math.cos(angle)
+    a_sin = math.sin(angle)
+    center_x = rbbox[0]
+    center_y = rbbox[1]
+    x_d = np.float32(rbbox[2] / 2)
+    y_d = np.float32(rbbox[3] / 2)
+    corners_x = (-x_d, -x_d, x_d, x_d)
+    corners_y = (-y_d, y_d, y_d, -y_d)
+    for i in range(4):
+        corners[2 *
+                i] = a_cos * corners_x[i] + a_sin * corners_y[i] + center_x
+        corners[2 * i
+                + 1] = -a_sin * corners_x[i] + a_cos * corners_y[i] + center_y
+
+
+@numba.njit
+def inter(corners1, corners2, intersection_corners, vs, temp_pts):
+    num_intersection = quadrilateral_intersection(
+        corners1, corners2, intersection_corners, temp_pts)
+    sort_vertex_in_convex_polygon(intersection_corners, num_intersection, vs)
+
+    return area(intersection_corners, num_intersection)
+
+
+@numba.njit
+def iou_from_area(area_inter, area1, area2, criterion=-1):
+    if criterion == -1:
+        return area_inter / (area1 + area2 - area_inter)
+    elif criterion == 0:
+        return area_inter / area1
+    elif criterion == 1:
+        return area_inter / area2
+    else:
+        return area_inter
+
+
+@numba.njit
+def devRotateIoUEval(rbox1, rbox2, corners1, corners2, intersection_corners,
+                     vs, temp_pts, criterion=-1):
+    area1 = rbox1[2] * rbox1[3]
+    area2 = rbox2[2] * rbox2[3]
+    area_inter = inter(corners1, corners2, intersection_corners, vs, temp_pts)
+    return iou_from_area(area_inter, area1, area2, criterion)
+
+
+@numba.njit(parallel=True)
+def rotate_iou_kernel_eval(boxes, query_boxes, iou, criterion=-1):
+    N = boxes.shape[0]
+    K = query_boxes.shape[0]
+    corners = np.empty((N, 8), dtype=np.float32)
+    query_corners = np.empty((K, 8), dtype=np.float32)
+    query_extents = np.empty((K, 4), dtype=np.float32)
+    for n in numba.prange(N):
+        rbbox_to_corners(corners[n], boxes[n])
+    for k in numba.prange(K):
+        rbbox_to_corners(query_corners[k], query_boxes[k])
+        query_extents[k, 0] = query_corners[k, 0::2].min()
+        query_extents[k, 1] = query_corners[k, 0::2].max()
+        query_extents[k, 2] = query_corners[k, 1::2].min()
+        query_extents[k, 3] = query_corners[k, 1::2].max()
+
+    for n in numba.prange(N):
+        intersection_corners = np.empty((16, ), dtype=np.float32)
+        vs = np.empty((16, ), dtype=np.float32)
+        temp_pts = np.empty((2, ), dtype=np.float32)
+        # a margin keeps pairs that only touch, so that the skipped
+        # pairs have no intersection points at all
+        x_min = corners[n, 0::2].min() - 1e-3
+        x_max = corners[n, 0::2].max() + 1e-3
+        y_min = corners[n, 1::2].min() - 1e-3
+        y_max = corners[n, 1::2].max() + 1e-3
+        for k in range(K):
+            if (query_extents[k, 0] > x_max or query_extents[k, 1] < x_min or
+                    query_extents[k, 2] > y_max or query_extents[k, 3] < y_min):
+                iou[n, k] = iou_from_area(
+                    0.0, query_boxes[k, 2] * query_boxes[k, 3],
+                    boxes[n, 2] * boxes[n, 3], criterion)
+                continue
+            # same argument order as rotate_iou_kernel_eval in rotate_iou.py
+            iou[n, k] = devRotateIoUEval(
+                query_boxes[k], boxes[n], query_corners[k], corners[n],
+                intersection_corners, vs, temp_pts, criterion)
+
+
+def rotate_iou_cpu_eval(boxes, query_boxes, criterion=-1):
+    """rotated box iou running in cpu, same interface and results as
+    rotate_iou_gpu_eval in rotate_iou.py.
+
+    Args:
+        boxes (float tensor: [N, 5]): rbboxes. format: centers, dims,
+            angles(clockwise when positive)
+        query_boxes (float tensor: [K, 5]): [description]
+        criterion (int, optional): -1: iou, 0: intersection over area of
+            query box, 1: intersection over area of box, else intersection.
+
+    Returns:
+        [N, K] float32 overlaps
+    """
+    boxes = np.ascontiguousarray(boxes, dtype=np.float32)
+    query_boxes = np.ascontiguousarray(query_boxes, dtype=np.float32)
+    N = boxes.shape[0]
+    K = query_boxes.shape[0]
+    iou = np.zeros((N, K), dtype=np.float32)
+    if N == 0 or K == 0:
+        return iou
+    rotate_iou_kernel_eval(boxes, query_boxes, iou, criterion)
+    return iou
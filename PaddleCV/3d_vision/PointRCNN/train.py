@@ -97,6 +97,11 @@ def parse_args():
         type=str,
         default=None,
 	help='specify the saved features for rcnn training when using rcnn_offline mode')
+    parser.add_argument(
+        '--pts_cache_dir',
+        type=str,
+        default=None,
+        help='directory of the cached valid points of RPN samples, default data_dir/KITTI/pts_cache')
     parser.add_argument(
         '--worker_num',
         type=int,
@@ -151,7 +156,8 @@ def train():
                                     classes=cfg.CLASSES,
                                     rcnn_training_roi_dir=args.rcnn_training_roi_dir,
                                     rcnn_training_feature_dir=args.rcnn_training_feature_dir,
-                                    gt_database_dir=args.gt_database)
+                                    gt_database_dir=args.gt_database,
+                                    pts_cache_dir=args.pts_cache_dir)
     num_samples = len(kitti_rcnn_reader)
     steps_per_epoch = int(num_samples / args.batch_size)
     logger.info("Total {} samples, {} batch per epoch.".format(num_samples, steps_per_epoch))
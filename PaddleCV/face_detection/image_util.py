@@ -51,52 +51,49 @@ class sampler():
         self.use_square = use_square
 
 
-class bbox():
-    def __init__(self, xmin, ymin, xmax, ymax):
-        self.xmin = xmin
-        self.ymin = ymin
-        self.xmax = xmax
-        self.ymax = ymax
-
-
-def intersect_bbox(bbox1, bbox2):
-    if bbox2.xmin > bbox1.xmax or bbox2.xmax < bbox1.xmin or \
-        bbox2.ymin > bbox1.ymax or bbox2.ymax < bbox1.ymin:
-        intersection_box = bbox(0.0, 0.0, 0.0, 0.0)
-    else:
-        intersection_box = bbox(
-            max(bbox1.xmin, bbox2.xmin),
-            max(bbox1.ymin, bbox2.ymin),
-            min(bbox1.xmax, bbox2.xmax), min(bbox1.ymax, bbox2.ymax))
-    return intersection_box
-
-
-def bbox_coverage(bbox1, bbox2):
-    inter_box = intersect_bbox(bbox1, bbox2)
-    intersect_size = bbox_area(inter_box)
-
-    if intersect_size > 0:
-        bbox1_size = bbox_area(bbox1)
-        return intersect_size / bbox1_size
-    else:
-        return 0.
-
-
-def bbox_area(src_bbox):
-    if src_bbox.xmax < src_bbox.xmin or src_bbox.ymax < src_bbox.ymin:
-        return 0.
-    else:
-        width = src_bbox.xmax - src_bbox.xmin
-        height = src_bbox.ymax - src_bbox.ymin
-        return width * height
-
-
-def generate_sample(sampler, image_width, image_height):
-    scale = np.random.uniform(sampler.min_scale, sampler.max_scale)
+def bbox_area(bboxes):
+    """areas of [..., 4] boxes (xmin, ymin, xmax, ymax), 0 if inverted"""
+    width = bboxes[..., 2] - bboxes[..., 0]
+    height = bboxes[..., 3] - bboxes[..., 1]
+    return np.where((width < 0) | (height < 0), 0., width * height)
+
+
+def intersect_area(bboxes1, bboxes2):
+    """[T, G] intersection areas of [T, 4] boxes with [G, 4] boxes"""
+    width = np.minimum(bboxes1[:, np.newaxis, 2], bboxes2[np.newaxis, :, 2]) - \
+            np.maximum(bboxes1[:, np.newaxis, 0], bboxes2[np.newaxis, :, 0])
+    height = np.minimum(bboxes1[:, np.newaxis, 3], bboxes2[np.newaxis, :, 3]) - \
+             np.maximum(bboxes1[:, np.newaxis, 1], bboxes2[np.newaxis, :, 1])
+    return np.maximum(width, 0.) * np.maximum(height, 0.)
+
+
+def jaccard_overlap(sample_bboxes, object_bboxes):
+    """[T, G] IoU of [T, 4] sampled boxes with [G, 4] object boxes"""
+    intersect_size = intersect_area(sample_bboxes, object_bboxes)
+    union_size = bbox_area(sample_bboxes)[:, np.newaxis] + bbox_area(
+        object_bboxes)[np.newaxis, :] - intersect_size
+    return np.where(intersect_size > 0,
+                    intersect_size / np.where(union_size > 0, union_size, 1.),
+                    0.)
+
+
+def bbox_coverage(object_bboxes, sample_bboxes):
+    """[T, G] fraction of each of [G, 4] object boxes inside [T, 4] samples"""
+    intersect_size = intersect_area(sample_bboxes, object_bboxes)
+    object_size = bbox_area(object_bboxes)[np.newaxis, :]
+    return np.where(intersect_size > 0,
+                    intersect_size / np.where(object_size > 0, object_size,
+                                              1.), 0.)
+
+
+def generate_sample(sampler, image_width, image_height, num_sample=1):
+    """[num_sample, 4] random normalized boxes of sampler"""
+    scale = np.random.uniform(sampler.min_scale, sampler.max_scale,
+                              num_sample)
     aspect_ratio = np.random.uniform(sampler.min_aspect_ratio,
-                                     sampler.max_aspect_ratio)
-    aspect_ratio = max(aspect_ratio, (scale**2.0))
-    aspect_ratio = min(aspect_ratio, 1 / (scale**2.0))
+                                     sampler.max_aspect_ratio, num_sample)
+    aspect_ratio = np.maximum(aspect_ratio, (scale**2.0))
+    aspect_ratio = np.minimum(aspect_ratio, 1 / (scale**2.0))
 
     bbox_width = scale * (aspect_ratio**0.5)
     bbox_height = scale / (aspect_ratio**0.5)
@@ -110,120 +107,97 @@ def generate_sample(sampler, image_width, image_height):
 
     xmin_bound = 1 - bbox_width
     ymin_bound = 1 - bbox_height
-    xmin = np.random.uniform(0, xmin_bound)
-    ymin = np.random.uniform(0, ymin_bound)
+    xmin = np.random.uniform(0, 1, num_sample) * xmin_bound
+    ymin = np.random.uniform(0, 1, num_sample) * ymin_bound
     xmax = xmin + bbox_width
     ymax = ymin + bbox_height
-    sampled_bbox = bbox(xmin, ymin, xmax, ymax)
-    return sampled_bbox
-
-
-def data_anchor_sampling(sampler, bbox_labels, image_width, image_height,
-                         scale_array, resize_width, resize_height):
+    return np.stack([xmin, ymin, xmax, ymax], axis=1)
+
+
+def data_anchor_sampling(sampler,
+                         bbox_labels,
+                         image_width,
+                         image_height,
+                         scale_array,
+                         resize_width,
+                         resize_height,
+                         num_sample=1):
+    """
+    [num_sample, 4] normalized boxes sampled around a random face each, so
+    that the face is resized to a random anchor scale of scale_array near
+    its own scale. Empty if there is no face in bbox_labels.
+    """
     num_gt = len(bbox_labels)
+    if num_gt == 0:
+        return np.zeros((0, 4))
     # np.random.randint range: [low, high)
-    rand_idx = np.random.randint(0, num_gt) if num_gt != 0 else 0
-
-    if num_gt != 0:
-        norm_xmin = bbox_labels[rand_idx][1]
-        norm_ymin = bbox_labels[rand_idx][2]
-        norm_xmax = bbox_labels[rand_idx][3]
-        norm_ymax = bbox_labels[rand_idx][4]
-
-        xmin = norm_xmin * image_width
-        ymin = norm_ymin * image_height
-        wid = image_width * (norm_xmax - norm_xmin)
-        hei = image_height * (norm_ymax - norm_ymin)
-        range_size = 0
-
-        area = wid * hei
-        for scale_ind in range(0, len(scale_array) - 1):
-            if area > scale_array[scale_ind] ** 2 and area < \
-                    scale_array[scale_ind + 1] ** 2:
-                range_size = scale_ind + 1
-                break
-
-        if area > scale_array[len(scale_array) - 2]**2:
-            range_size = len(scale_array) - 2
-
-        scale_choose = 0.0
-        if range_size == 0:
-            rand_idx_size = 0
-        else:
-            # np.random.randint range: [low, high)
-            rng_rand_size = np.random.randint(0, range_size + 1)
-            rand_idx_size = rng_rand_size % (range_size + 1)
-
-        if rand_idx_size == range_size:
-            min_resize_val = scale_array[rand_idx_size] / 2.0
-            max_resize_val = min(2.0 * scale_array[rand_idx_size],
-                                 2 * math.sqrt(wid * hei))
-            scale_choose = random.uniform(min_resize_val, max_resize_val)
-        else:
-            min_resize_val = scale_array[rand_idx_size] / 2.0
-            max_resize_val = 2.0 * scale_array[rand_idx_size]
-            scale_choose = random.uniform(min_resize_val, max_resize_val)
-
-        sample_bbox_size = wid * resize_width / scale_choose
-
-        w_off_orig = 0.0
-        h_off_orig = 0.0
-        if sample_bbox_size < max(image_height, image_width):
-            if wid <= sample_bbox_size:
-                w_off_orig = np.random.uniform(xmin + wid - sample_bbox_size,
-                                               xmin)
-            else:
-                w_off_orig = np.random.uniform(xmin,
-                                               xmin + wid - sample_bbox_size)
-
-            if hei <= sample_bbox_size:
-                h_off_orig = np.random.uniform(ymin + hei - sample_bbox_size,
-                                               ymin)
-            else:
-                h_off_orig = np.random.uniform(ymin,
-                                               ymin + hei - sample_bbox_size)
-
-        else:
-            w_off_orig = np.random.uniform(image_width - sample_bbox_size, 0.0)
-            h_off_orig = np.random.uniform(image_height - sample_bbox_size, 0.0)
-
-        w_off_orig = math.floor(w_off_orig)
-        h_off_orig = math.floor(h_off_orig)
-
-        # Figure out top left coordinates.
-        w_off = 0.0
-        h_off = 0.0
-        w_off = float(w_off_orig / image_width)
-        h_off = float(h_off_orig / image_height)
-
-        sampled_bbox = bbox(w_off, h_off,
-                            w_off + float(sample_bbox_size / image_width),
-                            h_off + float(sample_bbox_size / image_height))
-        return sampled_bbox
-    else:
-        return 0
-
-
-def jaccard_overlap(sample_bbox, object_bbox):
-    if sample_bbox.xmin >= object_bbox.xmax or \
-            sample_bbox.xmax <= object_bbox.xmin or \
-            sample_bbox.ymin >= object_bbox.ymax or \
-            sample_bbox.ymax <= object_bbox.ymin:
-        return 0
-    intersect_xmin = max(sample_bbox.xmin, object_bbox.xmin)
-    intersect_ymin = max(sample_bbox.ymin, object_bbox.ymin)
-    intersect_xmax = min(sample_bbox.xmax, object_bbox.xmax)
-    intersect_ymax = min(sample_bbox.ymax, object_bbox.ymax)
-    intersect_size = (intersect_xmax - intersect_xmin) * (
-        intersect_ymax - intersect_ymin)
-    sample_bbox_size = bbox_area(sample_bbox)
-    object_bbox_size = bbox_area(object_bbox)
-    overlap = intersect_size / (
-        sample_bbox_size + object_bbox_size - intersect_size)
-    return overlap
-
-
-def satisfy_sample_constraint(sampler, sample_bbox, bbox_labels):
+    rand_idx = np.random.randint(0, num_gt, num_sample)
+
+    norm_xmin = bbox_labels[rand_idx, 1]
+    norm_ymin = bbox_labels[rand_idx, 2]
+    norm_xmax = bbox_labels[rand_idx, 3]
+    norm_ymax = bbox_labels[rand_idx, 4]
+
+    xmin = norm_xmin * image_width
+    ymin = norm_ymin * image_height
+    wid = image_width * (norm_xmax - norm_xmin)
+    hei = image_height * (norm_ymax - norm_ymin)
+
+    # index of the anchor scale range of the face
+    area = wid * hei
+    square = np.asarray(scale_array, dtype=np.float64)**2
+    in_range = (area[:, np.newaxis] > square[np.newaxis, :-1]) & \
+               (area[:, np.newaxis] < square[np.newaxis, 1:])
+    range_size = np.where(in_range.any(axis=1), in_range.argmax(axis=1) + 1,
+                          0)
+    range_size[area > square[-2]] = len(scale_array) - 2
+
+    # a random anchor scale no larger than the range of the face
+    rand_idx_size = np.floor(
+        np.random.uniform(0, 1, num_sample) * (range_size + 1)).astype(
+            np.int64)
+    rand_idx_size = np.minimum(rand_idx_size, range_size)
+    scale = np.asarray(scale_array, dtype=np.float64)[rand_idx_size]
+    min_resize_val = scale / 2.0
+    max_resize_val = np.where(rand_idx_size == range_size,
+                              np.minimum(2.0 * scale, 2 * np.sqrt(area)),
+                              2.0 * scale)
+    scale_choose = np.random.uniform(0, 1, num_sample) * (
+        max_resize_val - min_resize_val) + min_resize_val
+
+    sample_bbox_size = wid * resize_width / scale_choose
+
+    # random offsets keeping the face inside the sample, or the image inside
+    # the sample if the sample is larger than the image
+    inside = sample_bbox_size < max(image_height, image_width)
+    w_low = np.where(inside, xmin + wid - sample_bbox_size,
+                     image_width - sample_bbox_size)
+    w_high = np.where(inside, xmin, 0.0)
+    h_low = np.where(inside, ymin + hei - sample_bbox_size,
+                     image_height - sample_bbox_size)
+    h_high = np.where(inside, ymin, 0.0)
+    w_off_orig = np.floor(w_low + np.random.uniform(0, 1, num_sample) *
+                          (w_high - w_low))
+    h_off_orig = np.floor(h_low + np.random.uniform(0, 1, num_sample) *
+                          (h_high - h_low))
+
+    # Figure out top left coordinates.
+    w_off = w_off_orig / image_width
+    h_off = h_off_orig / image_height
+    return np.stack(
+        [
+            w_off, h_off, w_off + sample_bbox_size / image_width,
+            h_off + sample_bbox_size / image_height
+        ],
+        axis=1)
+
+
+def satisfy_sample_constraint(sampler, sample_bboxes, bbox_labels):
+    """
+    [T] whether each of [T, 4] sample_bboxes overlaps at least one face of
+    bbox_labels within the jaccard range of sampler, or is within the
+    object coverage range if sampler has no jaccard range
+    """
     if sampler.min_jaccard_overlap == 0 and sampler.max_jaccard_overlap == 0:
         has_jaccard_overlap = False
     else:
@@ -234,162 +208,132 @@ def satisfy_sample_constraint(sampler, sample_bbox, bbox_labels):
         has_object_coverage = True
 
     if not has_jaccard_overlap and not has_object_coverage:
-        return True
-    found = False
-    for i in range(len(bbox_labels)):
-        object_bbox = bbox(bbox_labels[i][1], bbox_labels[i][2],
-                           bbox_labels[i][3], bbox_labels[i][4])
-        if has_jaccard_overlap:
-            overlap = jaccard_overlap(sample_bbox, object_bbox)
-            if sampler.min_jaccard_overlap != 0 and \
-                    overlap < sampler.min_jaccard_overlap:
-                continue
-            if sampler.max_jaccard_overlap != 0 and \
-                    overlap > sampler.max_jaccard_overlap:
-                continue
-            found = True
-        if has_object_coverage:
-            object_coverage = bbox_coverage(object_bbox, sample_bbox)
-            if sampler.min_object_coverage != 0 and \
-                    object_coverage < sampler.min_object_coverage:
-                continue
-            if sampler.max_object_coverage != 0 and \
-                    object_coverage > sampler.max_object_coverage:
-                continue
-            found = True
-        if found:
-            return True
+        return np.ones(sample_bboxes.shape[0], dtype=bool)
+    object_bboxes = bbox_labels[:, 1:5]
+    if has_jaccard_overlap:
+        overlap = jaccard_overlap(sample_bboxes, object_bboxes)
+        found = in_range(overlap, sampler.min_jaccard_overlap,
+                         sampler.max_jaccard_overlap)
+    else:
+        object_coverage = bbox_coverage(object_bboxes, sample_bboxes)
+        found = in_range(object_coverage, sampler.min_object_coverage,
+                         sampler.max_object_coverage)
+    return found.any(axis=1)
+
+
+def in_range(value, min_value, max_value):
+    """value >= min_value and value <= max_value, a bound of 0 is ignored"""
+    found = np.ones(value.shape, dtype=bool)
+    if min_value != 0:
+        found &= value >= min_value
+    if max_value != 0:
+        found &= value <= max_value
     return found
 
 
+def select_samples(sampler, sample_bboxes, bbox_labels, chunk_size=10):
+    """
+    the first max_sample of [T, 4] sample_bboxes satisfying the constraints
+    of sampler. The trials are checked chunk_size at a time to stop early
+    like trying them one by one.
+    """
+    selected = []
+    num_found = 0
+    for start in range(0, sample_bboxes.shape[0], chunk_size):
+        if num_found >= sampler.max_sample:
+            break
+        chunk = sample_bboxes[start:start + chunk_size]
+        chunk = chunk[satisfy_sample_constraint(sampler, chunk, bbox_labels)]
+        chunk = chunk[:sampler.max_sample - num_found]
+        selected.append(chunk)
+        num_found += chunk.shape[0]
+    return selected
+
+
 def generate_batch_samples(batch_sampler, bbox_labels, image_width,
                            image_height):
+    """up to max_sample boxes of max_trial trials of each sampler"""
     sampled_bbox = []
     for sampler in batch_sampler:
-        found = 0
-        for i in range(sampler.max_trial):
-            if found >= sampler.max_sample:
-                break
-            sample_bbox = generate_sample(sampler, image_width, image_height)
-            if satisfy_sample_constraint(sampler, sample_bbox, bbox_labels):
-                sampled_bbox.append(sample_bbox)
-                found = found + 1
-    return sampled_bbox
+        sample_bboxes = generate_sample(sampler, image_width, image_height,
+                                        sampler.max_trial)
+        sampled_bbox += select_samples(sampler, sample_bboxes, bbox_labels)
+    return np.concatenate(sampled_bbox) if sampled_bbox else np.zeros((0, 4))
 
 
 def generate_batch_random_samples(batch_sampler, bbox_labels, image_width,
                                   image_height, scale_array, resize_width,
                                   resize_height):
+    """generate_batch_samples with data anchor sampling"""
     sampled_bbox = []
     for sampler in batch_sampler:
-        found = 0
-        for i in range(sampler.max_trial):
-            if found >= sampler.max_sample:
-                break
-            sample_bbox = data_anchor_sampling(
-                sampler, bbox_labels, image_width, image_height, scale_array,
-                resize_width, resize_height)
-            if sample_bbox == 0:
-                break
-            if satisfy_sample_constraint(sampler, sample_bbox, bbox_labels):
-                sampled_bbox.append(sample_bbox)
-                found = found + 1
-    return sampled_bbox
+        sample_bboxes = data_anchor_sampling(
+            sampler, bbox_labels, image_width, image_height, scale_array,
+            resize_width, resize_height, sampler.max_trial)
+        sampled_bbox += select_samples(sampler, sample_bboxes, bbox_labels)
+    return np.concatenate(sampled_bbox) if sampled_bbox else np.zeros((0, 4))
 
 
 def clip_bbox(src_bbox):
-    src_bbox.xmin = max(min(src_bbox.xmin, 1.0), 0.0)
-    src_bbox.ymin = max(min(src_bbox.ymin, 1.0), 0.0)
-    src_bbox.xmax = max(min(src_bbox.xmax, 1.0), 0.0)
-    src_bbox.ymax = max(min(src_bbox.ymax, 1.0), 0.0)
-    return src_bbox
-
-
-def meet_emit_constraint(src_bbox, sample_bbox):
-    center_x = (src_bbox.xmax + src_bbox.xmin) / 2
-    center_y = (src_bbox.ymax + src_bbox.ymin) / 2
-    if center_x >= sample_bbox.xmin and \
-        center_x <= sample_bbox.xmax and \
-        center_y >= sample_bbox.ymin and \
-        center_y <= sample_bbox.ymax:
-        return True
-    return False
-
-
-def project_bbox(object_bbox, sample_bbox):
-    if object_bbox.xmin >= sample_bbox.xmax or \
-       object_bbox.xmax <= sample_bbox.xmin or \
-       object_bbox.ymin >= sample_bbox.ymax or \
-       object_bbox.ymax <= sample_bbox.ymin:
-        return False
-    else:
-        proj_bbox = bbox(0, 0, 0, 0)
-        sample_width = sample_bbox.xmax - sample_bbox.xmin
-        sample_height = sample_bbox.ymax - sample_bbox.ymin
-        proj_bbox.xmin = (object_bbox.xmin - sample_bbox.xmin) / sample_width
-        proj_bbox.ymin = (object_bbox.ymin - sample_bbox.ymin) / sample_height
-        proj_bbox.xmax = (object_bbox.xmax - sample_bbox.xmin) / sample_width
-        proj_bbox.ymax = (object_bbox.ymax - sample_bbox.ymin) / sample_height
-        proj_bbox = clip_bbox(proj_bbox)
-        if bbox_area(proj_bbox) > 0:
-            return proj_bbox
-        else:
-            return False
+    return np.clip(src_bbox, 0.0, 1.0)
+
+
+def meet_emit_constraint(src_bboxes, sample_bbox):
+    """whether the centers of [G, 4] src_bboxes are inside sample_bbox"""
+    center_x = (src_bboxes[:, 2] + src_bboxes[:, 0]) / 2
+    center_y = (src_bboxes[:, 3] + src_bboxes[:, 1]) / 2
+    return (center_x >= sample_bbox[0]) & (center_x <= sample_bbox[2]) & \
+           (center_y >= sample_bbox[1]) & (center_y <= sample_bbox[3])
+
+
+def project_bbox(object_bboxes, sample_bbox):
+    """
+    [G, 4] object_bboxes projected into sample_bbox and clipped, and
+    whether each projection is a box of positive area
+    """
+    overlap = (object_bboxes[:, 0] < sample_bbox[2]) & \
+              (object_bboxes[:, 2] > sample_bbox[0]) & \
+              (object_bboxes[:, 1] < sample_bbox[3]) & \
+              (object_bboxes[:, 3] > sample_bbox[1])
+    sample_width = sample_bbox[2] - sample_bbox[0]
+    sample_height = sample_bbox[3] - sample_bbox[1]
+    proj_bbox = (object_bboxes - sample_bbox[[0, 1, 0, 1]]) / np.array(
+        [sample_width, sample_height, sample_width, sample_height])
+    proj_bbox = clip_bbox(proj_bbox)
+    return proj_bbox, overlap & (bbox_area(proj_bbox) > 0)
 
 
 def transform_labels(bbox_labels, sample_bbox):
-    sample_labels = []
-    for i in range(len(bbox_labels)):
-        sample_label = []
-        object_bbox = bbox(bbox_labels[i][1], bbox_labels[i][2],
-                           bbox_labels[i][3], bbox_labels[i][4])
-        if not meet_emit_constraint(object_bbox, sample_bbox):
-            continue
-        proj_bbox = project_bbox(object_bbox, sample_bbox)
-        if proj_bbox:
-            sample_label.append(bbox_labels[i][0])
-            sample_label.append(float(proj_bbox.xmin))
-            sample_label.append(float(proj_bbox.ymin))
-            sample_label.append(float(proj_bbox.xmax))
-            sample_label.append(float(proj_bbox.ymax))
-            sample_label = sample_label + bbox_labels[i][5:]
-            sample_labels.append(sample_label)
+    """[G, 5+] labels of the faces emitted into sample_bbox, projected"""
+    object_bboxes = bbox_labels[:, 1:5]
+    proj_bbox, keep = project_bbox(object_bboxes, sample_bbox)
+    keep &= meet_emit_constraint(object_bboxes, sample_bbox)
+    sample_labels = bbox_labels[keep].copy()
+    sample_labels[:, 1:5] = proj_bbox[keep]
     return sample_labels
 
 
 def transform_labels_sampling(bbox_labels, sample_bbox, resize_val,
                               min_face_size):
-    sample_labels = []
-    for i in range(len(bbox_labels)):
-        sample_label = []
-        object_bbox = bbox(bbox_labels[i][1], bbox_labels[i][2],
-                           bbox_labels[i][3], bbox_labels[i][4])
-        if not meet_emit_constraint(object_bbox, sample_bbox):
-            continue
-        proj_bbox = project_bbox(object_bbox, sample_bbox)
-        if proj_bbox:
-            real_width = float((proj_bbox.xmax - proj_bbox.xmin) * resize_val)
-            real_height = float((proj_bbox.ymax - proj_bbox.ymin) * resize_val)
-            if real_width * real_height < float(min_face_size * min_face_size):
-                continue
-            else:
-                sample_label.append(bbox_labels[i][0])
-                sample_label.append(float(proj_bbox.xmin))
-                sample_label.append(float(proj_bbox.ymin))
-                sample_label.append(float(proj_bbox.xmax))
-                sample_label.append(float(proj_bbox.ymax))
-                sample_label = sample_label + bbox_labels[i][5:]
-                sample_labels.append(sample_label)
+    """transform_labels dropping the faces smaller than min_face_size"""
+    object_bboxes = bbox_labels[:, 1:5]
+    proj_bbox, keep = project_bbox(object_bboxes, sample_bbox)
+    keep &= meet_emit_constraint(object_bboxes, sample_bbox)
+    real_width = (proj_bbox[:, 2] - proj_bbox[:, 0]) * resize_val
+    real_height = (proj_bbox[:, 3] - proj_bbox[:, 1]) * resize_val
+    keep &= real_width * real_height >= float(min_face_size * min_face_size)
+    sample_labels = bbox_labels[keep].copy()
+    sample_labels[:, 1:5] = proj_bbox[keep]
     return sample_labels
 
 
 def crop_image(img, bbox_labels, sample_bbox, image_width, image_height,
                resize_width, resize_height, min_face_size):
     sample_bbox = clip_bbox(sample_bbox)
-    xmin = int(sample_bbox.xmin * image_width)
-    xmax = int(sample_bbox.xmax * image_width)
-    ymin = int(sample_bbox.ymin * image_height)
-    ymax = int(sample_bbox.ymax * image_height)
+    xmin = int(sample_bbox[0] * image_width)
+    xmax = int(sample_bbox[2] * image_width)
+    ymin = int(sample_bbox[1] * image_height)
+    ymax = int(sample_bbox[3] * image_height)
 
     sample_img = img[ymin:ymax, xmin:xmax]
     resize_val = resize_width
@@ -402,10 +346,10 @@ def crop_image_sampling(img, bbox_labels, sample_bbox, image_width,
                         image_height, resize_width, resize_height,
                         min_face_size):
     # no clipping here
-    xmin = int(sample_bbox.xmin * image_width)
-    xmax = int(sample_bbox.xmax * image_width)
-    ymin = int(sample_bbox.ymin * image_height)
-    ymax = int(sample_bbox.ymax * image_height)
+    xmin = int(sample_bbox[0] * image_width)
+    xmax = int(sample_bbox[2] * image_width)
+    ymin = int(sample_bbox[1] * image_height)
+    ymax = int(sample_bbox[3] * image_height)
 
     w_off = xmin
     h_off = ymin
@@ -509,9 +453,10 @@ def expand_image(img, bbox_labels, img_width, img_height, settings):
             width = int(img_width * expand_ratio)
             h_off = math.floor(np.random.uniform(0, height - img_height))
             w_off = math.floor(np.random.uniform(0, width - img_width))
-            expand_bbox = bbox(-w_off / img_width, -h_off / img_height,
-                               (width - w_off) / img_width,
-                               (height - h_off) / img_height)
+            expand_bbox = np.array([
+                -w_off / img_width, -h_off / img_height,
+                (width - w_off) / img_width, (height - h_off) / img_height
+            ])
             expand_img = np.ones((height, width, 3))
             expand_img = np.uint8(expand_img * np.squeeze(settings.img_mean))
             expand_img = Image.fromarray(expand_img)
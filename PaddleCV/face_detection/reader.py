@@ -25,7 +25,6 @@ import time
 import copy
 import random
 import cv2
-import six
 import math
 from itertools import islice
 import paddle
@@ -165,10 +164,8 @@ def preprocess(img, bbox_labels, mode, settings, image_path):
         mirror = int(np.random.uniform(0, 2))
         if mirror == 1:
             img = img[:, ::-1, :]
-            for i in six.moves.xrange(len(sampled_labels)):
-                tmp = sampled_labels[i][1]
-                sampled_labels[i][1] = 1 - sampled_labels[i][3]
-                sampled_labels[i][3] = 1 - tmp
+            sampled_labels = sampled_labels.copy()
+            sampled_labels[:, [1, 3]] = 1 - sampled_labels[:, [3, 1]]
 
     img = to_chw_bgr(img)
     img = img.astype('float32')
@@ -266,9 +263,9 @@ def train_generator(settings, file_list, batch_size, shuffle=True):
                     bbox_sample.append(float(xmax) / im_width)
                     bbox_sample.append(float(ymax) / im_height)
                     bbox_labels.append(bbox_sample)
+            bbox_labels = np.array(bbox_labels).reshape((-1, 5))
             im, sample_labels = preprocess(im, bbox_labels, "train", settings,
                                            image_path)
-            sample_labels = np.array(sample_labels)
             if len(sample_labels) == 0: continue
 
             im = im.astype('float32')
@@ -20,6 +20,8 @@ import time
 import numpy as np
 import argparse
 import functools
+import collections
+import multiprocessing
 from PIL import Image
 
 
@@ -54,6 +56,10 @@ add_arg('file_list',       str,   'data/wider_face_split/wider_face_val_bbx_gt.t
 add_arg('infer',           bool,  False,                             "Whether do infer or eval.")
 add_arg('confs_threshold', float, 0.15,                              "Confidence threshold to draw bbox.")
 add_arg('image_path',      str,   '',                                "The image used to inference and visualize.")
+add_arg('batch_size',      int,   8,                                 "Max number of same size images in a forward pass when eval.")
+add_arg('batch_pixels',    int,   678 * 1024 * 4,                    "Max number of pixels of a forward pass when eval.")
+add_arg('max_pending',     int,   8,                                 "Max number of images whose passes wait to be batched when eval.")
+add_arg('num_workers',     int,   4,                                 "Number of processes to load and resize images when eval, 0 to load in the main process.")
 # yapf: enable
 
 
@@ -70,37 +76,143 @@ def infer(args, config):
             image = image.convert('RGB')
         shrink, max_shrink = get_shrink(image.size[1], image.size[0])
 
-        det0 = detect_face(image, shrink)
         if args.use_gpu:
-            det1 = flip_test(image, shrink)
-            [det2, det3] = multi_scale_test(image, max_shrink)
-            det4 = multi_scale_test_pyramid(image, max_shrink)
-            det = np.row_stack((det0, det1, det2, det3, det4))
+            detect = functools.partial(detect_face, image)
+            det = tta_detect(detect, image.size[0], shrink, max_shrink)
             dets = bbox_vote(det)
         else:
             # when infer on cpu, use a simple case
-            dets = det0
+            dets = detect_face(image, shrink)
 
         keep_index = np.where(dets[:, 4] >= args.confs_threshold)[0]
         dets = dets[keep_index, :]
         draw_bboxes(image_path, dets[:, 0:4])
     else:
-        test_reader = reader.test(config, args.file_list)
-        for image, image_path in test_reader():
-            shrink, max_shrink = get_shrink(image.size[1], image.size[0])
-
-            det0 = detect_face(image, shrink)
-            det1 = flip_test(image, shrink)
-            [det2, det3] = multi_scale_test(image, max_shrink)
-            det4 = multi_scale_test_pyramid(image, max_shrink)
-            det = np.row_stack((det0, det1, det2, det3, det4))
-            dets = bbox_vote(det)
-
+        file_lists = reader.load_file_list(args.file_list)
+        image_paths = [
+            os.path.join(config.data_dir, image[0]) for image in file_lists
+        ]
+        engine = TTAEngine(args.batch_size, args.batch_pixels,
+                           args.max_pending)
+        if args.num_workers > 0:
+            pool = multiprocessing.Pool(args.num_workers)
+            images = prefetch(pool, load_tta_image, image_paths,
+                              2 * args.num_workers)
+        else:
+            images = (load_tta_image(path) for path in image_paths)
+        for image in images:
+            for image_path, dets in engine.add(*image):
+                save_widerface_bboxes(image_path, dets, pred_dir)
+        for image_path, dets in engine.finish():
             save_widerface_bboxes(image_path, dets, pred_dir)
+        if args.num_workers > 0:
+            pool.close()
+            pool.join()
 
         print("Finish evaluation.")
 
 
+def prefetch(pool, func, items, num_prefetch):
+    """map func over items in pool, keeping at most num_prefetch in flight"""
+    results = collections.deque()
+    for item in items:
+        results.append(pool.apply_async(func, (item, )))
+        if len(results) >= num_prefetch:
+            yield results.popleft().get()
+    while len(results) > 0:
+        yield results.popleft().get()
+
+
+def load_tta_image(image_path):
+    """
+    Load an image and resize it to every scale of its test time augmentation.
+    Returns image_path, image width, shrink, max_shrink and a dict of the
+    resized uint8 RGB images by scale.
+    """
+    image = Image.open(image_path)
+    if image.mode == 'L':
+        image = image.convert('RGB')
+    shrink, max_shrink = get_shrink(image.size[1], image.size[0])
+    resized = {}
+    for scale, _ in tta_passes(shrink, max_shrink):
+        if scale not in resized:
+            resized[scale] = resize_image(image, scale)
+    return image_path, image.size[0], shrink, max_shrink, resized
+
+
+class TTAEngine(object):
+    """
+    Run the test time augmentation passes of a stream of images as batched
+    forward passes. Resized images of the same size are grouped across the
+    passes of up to max_pending images, a batch holds at most batch_size
+    images and batch_pixels pixels. A pass shared by several augmentations
+    of an image, e.g. the same scale, is run once.
+    """
+
+    def __init__(self, batch_size, batch_pixels, max_pending):
+        self.batch_size = batch_size
+        self.batch_pixels = batch_pixels
+        self.max_pending = max_pending
+        # resized image shape -> [(image_path, scale, flip, image)]
+        self.buckets = collections.OrderedDict()
+        self.images = collections.OrderedDict()
+
+    def add(self, image_path, width, shrink, max_shrink, resized):
+        """add an image from load_tta_image, return the finished images"""
+        passes = tta_passes(shrink, max_shrink)
+        self.images[image_path] = {
+            'width': width,
+            'shrink': shrink,
+            'max_shrink': max_shrink,
+            'dets': {},
+            'left': len(passes),
+        }
+        for scale, flip in passes:
+            image = resized[scale][:, ::-1] if flip else resized[scale]
+            bucket = self.buckets.setdefault(image.shape, [])
+            bucket.append((image_path, scale, flip, image))
+            if len(bucket) >= self.capacity(image.shape):
+                self.run(image.shape)
+        if len(self.images) > self.max_pending:
+            self.flush()
+        return self.pop_finished()
+
+    def finish(self):
+        self.flush()
+        return self.pop_finished()
+
+    def capacity(self, shape):
+        return max(1,
+                   min(self.batch_size,
+                       self.batch_pixels // (shape[0] * shape[1])))
+
+    def run(self, shape):
+        bucket = self.buckets.pop(shape)
+        dets = detect_batch([item[3] for item in bucket],
+                            [item[1] for item in bucket])
+        for (image_path, scale, flip, _), det in zip(bucket, dets):
+            image = self.images[image_path]
+            image['dets'][(scale, flip)] = det
+            image['left'] -= 1
+
+    def flush(self):
+        for shape in list(self.buckets.keys()):
+            self.run(shape)
+
+    def pop_finished(self):
+        finished = []
+        for image_path in list(self.images.keys()):
+            image = self.images[image_path]
+            if image['left'] > 0:
+                continue
+            detect = lambda scale, flip=False: image['dets'][(scale, flip)]
+            det = tta_detect(detect, image['width'], image['shrink'],
+                             image['max_shrink'])
+            finished.append((image_path, bbox_vote(det)))
+            del self.images[image_path]
+        return finished
+
+
 def save_widerface_bboxes(image_path, bboxes_scores, output_dir):
     """
     Save predicted results, including bbox and score into text file.
@@ -129,117 +241,183 @@ def save_widerface_bboxes(image_path, bboxes_scores, output_dir):
     print("The predicted result is saved as {}".format(ofname))
 
 
-def detect_face(image, shrink):
-    image_shape = [3, image.size[1], image.size[0]]
+def resize_image(image, shrink):
+    """resize a PIL image by shrink to a uint8 RGB HWC array"""
     if shrink != 1:
-        h, w = int(image_shape[1] * shrink), int(image_shape[2] * shrink)
+        h, w = int(image.size[1] * shrink), int(image.size[0] * shrink)
         image = image.resize((w, h), Image.ANTIALIAS)
-        image_shape = [3, h, w]
+    return np.array(image)
+
 
-    img = np.array(image)
-    img = reader.to_chw_bgr(img)
+def detect_batch(images, shrinks):
+    """
+    Detect faces in a batch of same size uint8 RGB HWC images, which are
+    resized from the original images by shrinks. Returns the detections of
+    every image in original image coordinates.
+    """
+    h, w = images[0].shape[:2]
+    # NHWC RGB to NCHW BGR
+    img = np.stack(images).transpose((0, 3, 1, 2))[:, ::-1]
+    img = np.ascontiguousarray(img).astype('float32')
     mean = [104., 117., 123.]
     scale = 0.007843
-    img = img.astype('float32')
     img -= np.array(mean)[:, np.newaxis, np.newaxis].astype('float32')
-    img = img * scale
-    img = [img]
-    img = np.array(img)
+    img *= scale
 
     detection, = exe.run(infer_program,
                          feed={'image': img},
                          fetch_list=fetches,
                          return_numpy=False)
+    lod = detection.lod()
     detection = np.array(detection)
-    # layout: xmin, ymin, xmax. ymax, score
     if np.prod(detection.shape) == 1:
-        print("No face detected")
-        return np.array([[0, 0, 0, 0, 0]])
-    det_conf = detection[:, 1]
-    det_xmin = image_shape[2] * detection[:, 2] / shrink
-    det_ymin = image_shape[1] * detection[:, 3] / shrink
-    det_xmax = image_shape[2] * detection[:, 4] / shrink
-    det_ymax = image_shape[1] * detection[:, 5] / shrink
-
-    det = np.column_stack((det_xmin, det_ymin, det_xmax, det_ymax, det_conf))
-    return det
+        offsets = [0] * (len(images) + 1)
+    elif len(lod) > 0:
+        offsets = lod[0]
+    else:
+        offsets = [0, detection.shape[0]]
+
+    dets = []
+    for i, shrink in enumerate(shrinks):
+        det = detection[offsets[i]:offsets[i + 1]]
+        # layout: xmin, ymin, xmax. ymax, score
+        if det.shape[0] == 0:
+            print("No face detected")
+            dets.append(np.array([[0, 0, 0, 0, 0]]))
+            continue
+        det_conf = det[:, 1]
+        det_xmin = w * det[:, 2] / shrink
+        det_ymin = h * det[:, 3] / shrink
+        det_xmax = w * det[:, 4] / shrink
+        det_ymax = h * det[:, 5] / shrink
+        dets.append(
+            np.column_stack((det_xmin, det_ymin, det_xmax, det_ymax,
+                             det_conf)))
+    return dets
+
+
+def detect_face(image, shrink, flip=False):
+    img = resize_image(image, shrink)
+    if flip:
+        img = img[:, ::-1]
+    return detect_batch([img], [shrink])[0]
 
 
 def bbox_vote(det):
+    """
+    Merge the boxes of det greedily: the highest scoring box left and all
+    left boxes overlapping it by IoU >= 0.3 form a group, whose boxes are
+    averaged weighted by score. Groups of a single box are dropped, except
+    the last one. The boxes are sorted once and only the group of every box
+    is found in the greedy loop, the groups are then reduced in one segmented
+    pass.
+    """
     order = det[:, 4].ravel().argsort()[::-1]
     det = det[order, :]
     if det.shape[0] == 0:
-        dets = np.array([[10, 10, 20, 20, 0.002]])
-        det = np.empty(shape=[0, 5])
-    while det.shape[0] > 0:
-        # IOU
-        area = (det[:, 2] - det[:, 0] + 1) * (det[:, 3] - det[:, 1] + 1)
-        xx1 = np.maximum(det[0, 0], det[:, 0])
-        yy1 = np.maximum(det[0, 1], det[:, 1])
-        xx2 = np.minimum(det[0, 2], det[:, 2])
-        yy2 = np.minimum(det[0, 3], det[:, 3])
+        return np.array([[10, 10, 20, 20, 0.002]])
+
+    area = (det[:, 2] - det[:, 0] + 1) * (det[:, 3] - det[:, 1] + 1)
+    group = np.zeros(det.shape[0], dtype=np.int64)
+    left = np.arange(det.shape[0])
+    num_groups = 0
+    while left.shape[0] > 0:
+        # IOU of the top box left with all left boxes
+        top = left[0]
+        xx1 = np.maximum(det[top, 0], det[left, 0])
+        yy1 = np.maximum(det[top, 1], det[left, 1])
+        xx2 = np.minimum(det[top, 2], det[left, 2])
+        yy2 = np.minimum(det[top, 3], det[left, 3])
         w = np.maximum(0.0, xx2 - xx1 + 1)
         h = np.maximum(0.0, yy2 - yy1 + 1)
         inter = w * h
-        o = inter / (area[0] + area[:] - inter)
-
-        # nms
-        merge_index = np.where(o >= 0.3)[0]
-        det_accu = det[merge_index, :]
-        det = np.delete(det, merge_index, 0)
-        if merge_index.shape[0] <= 1:
-            if det.shape[0] == 0:
-                try:
-                    dets = np.row_stack((dets, det_accu))
-                except:
-                    dets = det_accu
-            continue
-        det_accu[:, 0:4] = det_accu[:, 0:4] * np.tile(det_accu[:, -1:], (1, 4))
-        max_score = np.max(det_accu[:, 4])
-        det_accu_sum = np.zeros((1, 5))
-        det_accu_sum[:, 0:4] = np.sum(det_accu[:, 0:4],
-                                      axis=0) / np.sum(det_accu[:, -1:])
-        det_accu_sum[:, 4] = max_score
-        try:
-            dets = np.row_stack((dets, det_accu_sum))
-        except:
-            dets = det_accu_sum
+        o = inter / (area[top] + area[left] - inter)
+
+        merge = o >= 0.3
+        merge[0] = True
+        group[left[merge]] = num_groups
+        left = left[~merge]
+        num_groups += 1
+
+    # score weighted average of the coordinates of every group
+    score = det[:, 4]
+    count = np.bincount(group, minlength=num_groups)
+    score_sum = np.bincount(group, weights=score, minlength=num_groups)
+    dets = np.zeros((num_groups, 5))
+    for i in range(4):
+        dets[:, i] = np.bincount(
+            group, weights=det[:, i] * score,
+            minlength=num_groups) / np.maximum(score_sum, 1e-30)
+    # the first box of a group is its top box and has the max score
+    first = np.full(num_groups, det.shape[0], dtype=np.int64)
+    np.minimum.at(first, group, np.arange(det.shape[0]))
+    dets[:, 4] = score[first]
+    if count[-1] == 1:
+        dets[-1] = det[first[-1]]
+    keep = count > 1
+    keep[-1] = True
+    dets = dets[keep]
     dets = dets[0:750, :]
     return dets
 
 
-def flip_test(image, shrink):
-    img = image.transpose(Image.FLIP_LEFT_RIGHT)
-    det_f = detect_face(img, shrink)
+def tta_detect(detect, width, shrink, max_shrink):
+    """
+    Test time augmentation of an image of width: detect(scale, flip=False)
+    returns the detections of the image resized by scale, and flipped
+    horizontally if flip.
+    """
+    det0 = detect(shrink)
+    det1 = flip_test(detect, width, shrink)
+    [det2, det3] = multi_scale_test(detect, max_shrink)
+    det4 = multi_scale_test_pyramid(detect, max_shrink)
+    det = np.row_stack((det0, det1, det2, det3, det4))
+    return det
+
+
+def tta_passes(shrink, max_shrink):
+    """the distinct (scale, flip) passes of tta_detect, in order"""
+    passes = []
+
+    def record(scale, flip=False):
+        if (scale, flip) not in passes:
+            passes.append((scale, flip))
+        return np.zeros((0, 5))
+
+    tta_detect(record, 0, shrink, max_shrink)
+    return passes
+
+
+def flip_test(detect, width, shrink):
+    det_f = detect(shrink, flip=True)
     det_t = np.zeros(det_f.shape)
-    # image.size: [width, height]
-    det_t[:, 0] = image.size[0] - det_f[:, 2]
+    det_t[:, 0] = width - det_f[:, 2]
     det_t[:, 1] = det_f[:, 1]
-    det_t[:, 2] = image.size[0] - det_f[:, 0]
+    det_t[:, 2] = width - det_f[:, 0]
     det_t[:, 3] = det_f[:, 3]
     det_t[:, 4] = det_f[:, 4]
     return det_t
 
 
-def multi_scale_test(image, max_shrink):
+def multi_scale_test(detect, max_shrink):
     # Shrink detecting is only used to detect big faces
     st = 0.5 if max_shrink >= 0.75 else 0.5 * max_shrink
-    det_s = detect_face(image, st)
+    det_s = detect(st)
     index = np.where(
         np.maximum(det_s[:, 2] - det_s[:, 0] + 1, det_s[:, 3] - det_s[:, 1] + 1)
         > 30)[0]
     det_s = det_s[index, :]
     # Enlarge one times
     bt = min(2, max_shrink) if max_shrink > 1 else (st + max_shrink) / 2
-    det_b = detect_face(image, bt)
+    det_b = detect(bt)
 
     # Enlarge small image x times for small faces
     if max_shrink > 2:
         bt *= 2
         while bt < max_shrink:
-            det_b = np.row_stack((det_b, detect_face(image, bt)))
+            det_b = np.row_stack((det_b, detect(bt)))
             bt *= 2
-        det_b = np.row_stack((det_b, detect_face(image, max_shrink)))
+        det_b = np.row_stack((det_b, detect(max_shrink)))
 
     # Enlarged images are only used to detect small faces.
     if bt > 1:
@@ -256,9 +434,9 @@ def multi_scale_test(image, max_shrink):
     return det_s, det_b
 
 
-def multi_scale_test_pyramid(image, max_shrink):
+def multi_scale_test_pyramid(detect, max_shrink):
     # Use image pyramids to detect faces
-    det_b = detect_face(image, 0.25)
+    det_b = detect(0.25)
     index = np.where(
         np.maximum(det_b[:, 2] - det_b[:, 0] + 1, det_b[:, 3] - det_b[:, 1] + 1)
         > 30)[0]
@@ -267,7 +445,7 @@ def multi_scale_test_pyramid(image, max_shrink):
     st = [0.75, 1.25, 1.5, 1.75]
     for i in range(len(st)):
         if (st[i] <= max_shrink):
-            det_temp = detect_face(image, st[i])
+            det_temp = detect(st[i])
             # Enlarged images are only used to detect small faces.
             if st[i] > 1:
                 index = np.where(
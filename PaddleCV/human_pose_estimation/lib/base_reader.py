@@ -21,6 +21,9 @@ from __future__ import print_function
 
 import os
 import shutil
+import random
+import collections
+import multiprocessing
 import cv2
 import numpy as np
 
@@ -53,10 +56,30 @@ def visualize(cfg, filename, data_numpy, input, joints, target):
         cv2.circle(input, (int(joints[i, 0]), int(joints[i, 1])), 5, [170, 255, 0], -1)
     cv2.imwrite(os.path.join(TMPDIR, 'input_kps.jpg'), input)
 
-def generate_target(cfg, joints, joints_vis):
+_gaussian_cache = {}
+
+
+def gaussian_kernel(sigma):
+    """
+    :param sigma: the standard deviation of gaussian
+    :return: the unnormalized gaussian patch of size 6 * sigma + 1, cached per sigma
+    """
+    if sigma not in _gaussian_cache:
+        tmp_size = sigma * 3
+        size = 2 * tmp_size + 1
+        x = np.arange(0, size, 1, np.float32)
+        y = x[:, np.newaxis]
+        x0 = y0 = size // 2
+        # The gaussian is not normalized, we want the center value to equal 1
+        _gaussian_cache[sigma] = np.exp(- ((x - x0) ** 2 + (y - y0) ** 2) / (2 * sigma ** 2))
+    return _gaussian_cache[sigma]
+
+def generate_target(cfg, joints, joints_vis, target=None, target_weight=None):
     """
     :param joints:  [num_joints, 3]
     :param joints_vis: [num_joints, 3]
+    :param target: [num_joints, h, w] array to fill, allocated if None
+    :param target_weight: [num_joints, 1] array to fill, allocated if None
     :return: target, target_weight(1: visible, 0: invisible)
     """
     NUM_JOINTS = cfg.NUM_JOINTS
@@ -65,52 +88,113 @@ def generate_target(cfg, joints, joints_vis):
     IMAGE_SIZE = cfg.IMAGE_SIZE
     SIGMA = cfg.SIGMA
 
-    target_weight = np.ones((NUM_JOINTS, 1), dtype=np.float32)
+    if target_weight is None:
+        target_weight = np.ones((NUM_JOINTS, 1), dtype=np.float32)
     target_weight[:, 0] = joints_vis[:, 0]
 
     assert TARGET_TYPE == 'gaussian', \
         'Only support gaussian map now!'
 
     if TARGET_TYPE == 'gaussian':
-        target = np.zeros((NUM_JOINTS,
-                           HEATMAP_SIZE[1],
-                           HEATMAP_SIZE[0]),
-                           dtype=np.float32)
+        if target is None:
+            target = np.zeros((NUM_JOINTS,
+                               HEATMAP_SIZE[1],
+                               HEATMAP_SIZE[0]),
+                               dtype=np.float32)
+        else:
+            target[...] = 0
 
         tmp_size = SIGMA * 3
+        heatmap_size = np.array(HEATMAP_SIZE)
+        feat_stride = np.array(IMAGE_SIZE) / heatmap_size
+        mu = (joints[:, 0:2] / feat_stride + 0.5).astype(np.int64)
+
+        # Check that any part of the gaussian is in-bounds
+        ul = (mu - tmp_size).astype(np.int64)
+        br = (mu + tmp_size + 1).astype(np.int64)
+        outside = np.any(ul >= heatmap_size, axis=1) | np.any(br < 0, axis=1)
+        target_weight[outside] = 0
+
+        g = gaussian_kernel(SIGMA)
+        # Usable gaussian range
+        g_lo = np.maximum(0, -ul)
+        g_hi = np.minimum(br, heatmap_size) - ul
+        # Image range
+        img_lo = np.maximum(0, ul)
+        img_hi = np.minimum(br, heatmap_size)
+
+        for joint_id in np.nonzero(target_weight[:, 0] > 0.5)[0]:
+            target[joint_id][img_lo[joint_id, 1]:img_hi[joint_id, 1], img_lo[joint_id, 0]:img_hi[joint_id, 0]] = \
+                g[g_lo[joint_id, 1]:g_hi[joint_id, 1], g_lo[joint_id, 0]:g_hi[joint_id, 0]]
 
-        for joint_id in range(NUM_JOINTS):
-            feat_stride = np.array(IMAGE_SIZE) / np.array(HEATMAP_SIZE)
-            mu_x = int(joints[joint_id][0] / feat_stride[0] + 0.5)
-            mu_y = int(joints[joint_id][1] / feat_stride[1] + 0.5)
-
-            # Check that any part of the gaussian is in-bounds
-            ul = [int(mu_x - tmp_size), int(mu_y - tmp_size)]
-            br = [int(mu_x + tmp_size + 1), int(mu_y + tmp_size + 1)]
-            if ul[0] >= HEATMAP_SIZE[0] or ul[1] >= HEATMAP_SIZE[1] \
-                    or br[0] < 0 or br[1] < 0:
-                # If not, just return the image as is
-                target_weight[joint_id] = 0
-                continue
-
-            # Generate gaussian
-            size = 2 * tmp_size + 1
-            x = np.arange(0, size, 1, np.float32)
-            y = x[:, np.newaxis]
-            x0 = y0 = size // 2
-            # The gaussian is not normalized, we want the center value to equal 1
-            g = np.exp(- ((x - x0) ** 2 + (y - y0) ** 2) / (2 * SIGMA ** 2))
-
-            # Usable gaussian range
-            g_x = max(0, -ul[0]), min(br[0], HEATMAP_SIZE[0]) - ul[0]
-            g_y = max(0, -ul[1]), min(br[1], HEATMAP_SIZE[1]) - ul[1]
-            # Image range
-            img_x = max(0, ul[0]), min(br[0], HEATMAP_SIZE[0])
-            img_y = max(0, ul[1]), min(br[1], HEATMAP_SIZE[1])
-
-            v = target_weight[joint_id]
-            if v > 0.5:
-                target[joint_id][img_y[0]:img_y[1], img_x[0]:img_x[1]] = \
-                    g[g_y[0]:g_y[1], g_x[0]:g_x[1]]
+    return target, target_weight
 
+def generate_batch_target(cfg, joints, joints_vis):
+    """
+    :param joints:  [batch_size, num_joints, 3]
+    :param joints_vis: [batch_size, num_joints, 3]
+    :return: target [batch_size, num_joints, h, w], target_weight [batch_size, num_joints, 1]
+    """
+    batch_size = joints.shape[0]
+    # zeroed per sample by generate_target
+    target = np.empty((batch_size, cfg.NUM_JOINTS,
+                       cfg.HEATMAP_SIZE[1], cfg.HEATMAP_SIZE[0]),
+                      dtype=np.float32)
+    target_weight = np.ones((batch_size, cfg.NUM_JOINTS, 1), dtype=np.float32)
+    for i in range(batch_size):
+        generate_target(cfg, joints[i], joints_vis[i], target[i], target_weight[i])
     return target, target_weight
+
+def _seed_worker():
+    # forked workers start from the random state of the parent
+    random.seed()
+    np.random.seed()
+
+def _attach_target(cfg, samples):
+    joints = np.stack([sample[1] for sample in samples])
+    joints_vis = np.stack([sample[2] for sample in samples])
+    target, target_weight = generate_batch_target(cfg, joints, joints_vis)
+    for i, sample in enumerate(samples):
+        yield (sample[0], target[i], target_weight[i]) + tuple(sample[3:])
+
+def parallel_reader(cfg, reader, mapper, group_size=32):
+    """
+    Map the samples of reader in cfg.THREAD processes, in order. The mapper
+    returns (input, joints, joints_vis, ...), the targets of every group_size
+    samples are generated together so that the heatmaps are never passed
+    between processes.
+    :return: reader of (input, target, target_weight, ...)
+    """
+    def pop():
+        pool = None
+        if cfg.THREAD > 1:
+            pool = multiprocessing.Pool(cfg.THREAD, initializer=_seed_worker)
+        pending = collections.deque()
+        samples = []
+        try:
+            for x in reader():
+                if pool is None:
+                    samples.append(mapper(x))
+                else:
+                    pending.append(pool.apply_async(mapper, (x, )))
+                    if len(pending) >= 4 * cfg.THREAD:
+                        samples.append(pending.popleft().get())
+                if len(samples) == group_size:
+                    for sample in _attach_target(cfg, samples):
+                        yield sample
+                    samples = []
+            while pending:
+                samples.append(pending.popleft().get())
+                if len(samples) == group_size or not pending:
+                    for sample in _attach_target(cfg, samples):
+                        yield sample
+                    samples = []
+            if samples:
+                for sample in _attach_target(cfg, samples):
+                    yield sample
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    return pop
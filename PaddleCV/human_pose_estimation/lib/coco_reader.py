@@ -26,8 +26,9 @@ import random
 
 from utils.transforms import fliplr_joints
 from utils.transforms import get_affine_transform
-from utils.transforms import affine_transform
-from lib.base_reader import visualize, generate_target
+from utils.transforms import affine_transform_points
+from utils.transforms import crop
+from lib.base_reader import visualize, generate_target, parallel_reader
 from pycocotools.coco import COCO
 
 # NOTE
@@ -249,19 +250,13 @@ def data_augmentation(sample, is_train):
             c[0] = data_numpy.shape[1] - c[0] - 1
 
     trans = get_affine_transform(c, s, r, cfg.IMAGE_SIZE)
-    input = cv2.warpAffine(
-        data_numpy,
-        trans, (int(cfg.IMAGE_SIZE[0]), int(cfg.IMAGE_SIZE[1])),
-        flags=cv2.INTER_LINEAR)
+    input = crop(data_numpy, c, s, cfg.IMAGE_SIZE, r, trans)
 
-    for i in range(cfg.NUM_JOINTS):
-        if joints_vis[i, 0] > 0.0:
-            joints[i, 0:2] = affine_transform(joints[i, 0:2], trans)
-
-    # Numpy target
-    target, target_weight = generate_target(cfg, joints, joints_vis)
+    vis = joints_vis[:, 0] > 0.0
+    joints[vis, 0:2] = affine_transform_points(joints[vis, 0:2], trans)
 
     if cfg.DEBUG:
+        target, target_weight = generate_target(cfg, joints, joints_vis)
         visualize(cfg, filename, data_numpy, input.copy(), joints, target)
 
     # Normalization
@@ -269,10 +264,11 @@ def data_augmentation(sample, is_train):
     input -= np.array(cfg.MEAN).reshape((3, 1, 1))
     input /= np.array(cfg.STD).reshape((3, 1, 1))
 
+    # Targets are generated in batch by parallel_reader
     if is_train:
-        return input, target, target_weight
+        return input, joints, joints_vis
     else:
-        return input, target, target_weight, c, s, score, image_file
+        return input, joints, joints_vis, c, s, score, image_file
 
 
 # Create a reader
@@ -336,30 +332,18 @@ def train():
         reader, mapper = _reader_creator(
             cfg.DATAROOT, 'train', shuffle=False, is_train=True)
 
-    def pop():
-        for i, x in enumerate(reader()):
-            yield mapper(x)
-
-    return pop
+    return parallel_reader(cfg, reader, mapper)
 
 
 def valid():
     reader, mapper = _reader_creator(
         cfg.DATAROOT, 'val', shuffle=False, is_train=False, use_gt_bbox=True)
 
-    def pop():
-        for i, x in enumerate(reader()):
-            yield mapper(x)
-
-    return pop
+    return parallel_reader(cfg, reader, mapper)
 
 
 def test():
     reader, mapper = _reader_creator(
         cfg.DATAROOT, 'test', shuffle=False, is_train=False, use_gt_bbox=True)
 
-    def pop():
-        for i, x in enumerate(reader()):
-            yield mapper(x)
-
-    return pop
+    return parallel_reader(cfg, reader, mapper)
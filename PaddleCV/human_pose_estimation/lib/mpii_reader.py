@@ -28,8 +28,9 @@ import cv2
 
 from utils.transforms import fliplr_joints
 from utils.transforms import get_affine_transform
-from utils.transforms import affine_transform
-from lib.base_reader import visualize, generate_target
+from utils.transforms import affine_transform_points
+from utils.transforms import crop
+from lib.base_reader import visualize, generate_target, parallel_reader
 
 class Config:
     """Configurations for MPII dataset.
@@ -89,20 +90,13 @@ def data_augmentation(sample, is_train):
             c[0] = data_numpy.shape[1] - c[0] - 1
 
     trans = get_affine_transform(c, s, r, cfg.IMAGE_SIZE)
-    input = cv2.warpAffine(
-            data_numpy,
-            trans,
-            (int(cfg.IMAGE_SIZE[0]), int(cfg.IMAGE_SIZE[1])),
-            flags=cv2.INTER_LINEAR)
+    input = crop(data_numpy, c, s, cfg.IMAGE_SIZE, r, trans)
 
-    for i in range(cfg.NUM_JOINTS):
-        if joints_vis[i, 0] > 0.0:
-            joints[i, 0:2] = affine_transform(joints[i, 0:2], trans)
-
-    # Numpy target
-    target, target_weight = generate_target(cfg, joints, joints_vis)
+    vis = joints_vis[:, 0] > 0.0
+    joints[vis, 0:2] = affine_transform_points(joints[vis, 0:2], trans)
 
     if cfg.DEBUG:
+        target, target_weight = generate_target(cfg, joints, joints_vis)
         visualize(cfg, filename, data_numpy, input.copy(), joints, target)
 
     # Normalization
@@ -110,10 +104,11 @@ def data_augmentation(sample, is_train):
     input -= np.array(cfg.MEAN).reshape((3, 1, 1))
     input /= np.array(cfg.STD).reshape((3, 1, 1))
 
+    # Targets are generated in batch by parallel_reader
     if is_train:
-        return input, target, target_weight
+        return input, joints, joints_vis
     else:
-        return input, target, target_weight, c, s, score
+        return input, joints, joints_vis, c, s, score
 
 def test_data_augmentation(sample):
     image_file = sample['image']
@@ -196,17 +191,11 @@ def _reader_creator(root, image_set, shuffle=False, is_train=False):
 
 def train():
     reader, mapper = _reader_creator(cfg.DATAROOT, 'train', shuffle=True, is_train=True)
-    def pop():
-         for i, x in enumerate(reader()):
-             yield mapper(x)
-    return pop
+    return parallel_reader(cfg, reader, mapper)
 
 def valid():
     reader, mapper = _reader_creator(cfg.DATAROOT, 'valid', shuffle=False, is_train=False)
-    def pop():
-        for i, x in enumerate(reader()):
-            yield mapper(x)
-    return pop
+    return parallel_reader(cfg, reader, mapper)
 
 def test():
     reader, mapper = _reader_creator(cfg.DATAROOT, 'test')
@@ -17,26 +17,28 @@
 
 import os
 import json
+import multiprocessing
 
 import numpy as np
-from collections import defaultdict
 from collections import OrderedDict
 import pickle
 
 from utils.base_evaluator import BaseEvaluator
-from utils.nms_utils import oks_nms
+from utils.nms_utils import oks_nms_arrays
 from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
 
 class COCOEvaluator(BaseEvaluator):
-    def __init__(self, root, kp_dim=17):
+    def __init__(self, root, kp_dim=17, num_workers=4):
         """
         :param root: the root dir of dataset
         :param kp_dim: the dimension of keypoints
+        :param num_workers: the number of processes to run oks nms
         """
         super(COCOEvaluator, self).__init__(root, kp_dim)
         self.kp_dim = kp_dim
+        self.num_workers = num_workers
         self.in_vis_thre = 0.2
         self.oks_thre = 0.9
         self.coco = COCO(os.path.join(root, 'annotations', 'person_keypoints_val2017.json'))
@@ -64,48 +66,43 @@ class COCOEvaluator(BaseEvaluator):
             os.makedirs(res_folder)
         res_file = os.path.join(res_folder, 'keypoints_coco_results.json')
 
-        # person x (keypoints)
-        _kpts = []
-        for idx, kpt in enumerate(preds):
-            _kpts.append({
-                'keypoints': kpt,
-                'center': all_boxes[idx][0:2],
-                'scale': all_boxes[idx][2:4],
-                'area': all_boxes[idx][4],
-                'score': all_boxes[idx][5],
-                'image': int(img_path[idx][-16:-4])
-            })
-        # image x person x (keypoints)
-        kpts = defaultdict(list)
-        for kpt in _kpts:
-            kpts[kpt['image']].append(kpt)
-
-        # rescoring and oks nms
-        kp_dim = self.kp_dim
-        in_vis_thre = self.in_vis_thre
-        oks_thre = self.oks_thre
-        oks_nmsed_kpts = []
-        for img in kpts.keys():
-            img_kpts = kpts[img]
-            for n_p in img_kpts:
-                box_score = n_p['score']
-                kpt_score = 0
-                valid_num = 0
-                for n_jt in range(0, kp_dim):
-                    t_s = n_p['keypoints'][n_jt][2]
-                    if t_s > in_vis_thre:
-                        kpt_score = kpt_score + t_s
-                        valid_num = valid_num + 1
-                if valid_num != 0:
-                    kpt_score = kpt_score / valid_num
-                # rescoring
-                n_p['score'] = kpt_score * box_score
-            keep = oks_nms([img_kpts[i] for i in range(len(img_kpts))], oks_thre)
-            if len(keep) == 0:
-                oks_nmsed_kpts.append(img_kpts)
-            else:
-                oks_nmsed_kpts.append([img_kpts[_keep] for _keep in keep])
-
+        # person x keypoints x (x, y, score)
+        preds = np.asarray(preds)
+        all_boxes = np.asarray(all_boxes)
+        image_ids = np.array([int(os.path.splitext(os.path.basename(path))[0]) for path in img_path])
+
+        # rescoring by the mean score of visible keypoints
+        kpt_scores = preds[:, :, 2]
+        valid = kpt_scores > self.in_vis_thre
+        valid_num = valid.sum(axis=1)
+        kpt_score = np.cumsum(np.where(valid, kpt_scores, 0), axis=1)[:, -1]
+        kpt_score = np.where(valid_num != 0, kpt_score / np.maximum(valid_num, 1).astype(kpt_score.dtype), 0)
+        scores = kpt_score * all_boxes[:, 5]
+
+        # image x person, images in order of appearance
+        _, first, inverse = np.unique(image_ids, return_index=True, return_inverse=True)
+        rank = np.argsort(np.argsort(first))[inverse.reshape(-1)]
+        order = np.argsort(rank, kind='mergesort')
+        img_inds = np.split(order, np.cumsum(np.bincount(rank))[:-1])
+
+        # oks nms
+        tasks = [(preds[inds], scores[inds], all_boxes[inds, 4], self.oks_thre) for inds in img_inds]
+        if self.num_workers > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(self.num_workers)
+            keeps = pool.map(_oks_nms_task, tasks, chunksize=max(1, len(tasks) // (self.num_workers * 4)))
+            pool.close()
+            pool.join()
+        else:
+            keeps = [_oks_nms_task(task) for task in tasks]
+        keep = np.concatenate([inds[keep] for inds, keep in zip(img_inds, keeps)]).astype(np.int64)
+
+        oks_nmsed_kpts = {
+            'keypoints': preds[keep],
+            'center': all_boxes[keep, 0:2],
+            'scale': all_boxes[keep, 2:4],
+            'score': scores[keep],
+            'image': image_ids[keep]
+        }
         self._write_coco_keypoint_results(oks_nmsed_kpts, res_file)
         info_str = self._do_python_keypoint_eval(res_file, res_folder)
         name_value = OrderedDict(info_str)
@@ -122,7 +119,7 @@ class COCOEvaluator(BaseEvaluator):
 
         results = self._coco_keypoint_results_one_category_kernel(data_pack[0])
         with open(res_file, 'w') as f:
-            json.dump(results, f, sort_keys=True, indent=4)
+            f.write(json.dumps(results, sort_keys=True))
         try:
             json.load(open(res_file))
         except Exception:
@@ -138,30 +135,19 @@ class COCOEvaluator(BaseEvaluator):
     def _coco_keypoint_results_one_category_kernel(self, data_pack):
         cat_id = data_pack['cat_id']
         keypoints = data_pack['keypoints']
-        cat_results = []
-
-        for img_kpts in keypoints:
-            if len(img_kpts) == 0:
-                continue
-
-            _key_points = np.array([img_kpts[k]['keypoints']
-                                    for k in range(len(img_kpts))])
-            key_points = np.zeros(
-                (_key_points.shape[0], self.kp_dim * 3), dtype=np.float)
-
-            for ipt in range(self.kp_dim):
-                key_points[:, ipt * 3 + 0] = _key_points[:, ipt, 0]
-                key_points[:, ipt * 3 + 1] = _key_points[:, ipt, 1]
-                key_points[:, ipt * 3 + 2] = _key_points[:, ipt, 2]  # keypoints score.
-
-            result = [{'image_id': img_kpts[k]['image'],
-                       'category_id': cat_id,
-                       'keypoints': list(key_points[k]),
-                       'score': img_kpts[k]['score'],
-                       'center': list(img_kpts[k]['center']),
-                       'scale': list(img_kpts[k]['scale'])
-                       } for k in range(len(img_kpts))]
-            cat_results.extend(result)
+
+        key_points = keypoints['keypoints'][:, :self.kp_dim].reshape(-1, self.kp_dim * 3).astype(np.float64).tolist()
+        scores = keypoints['score'].tolist()
+        centers = keypoints['center'].tolist()
+        scales = keypoints['scale'].tolist()
+        image_ids = keypoints['image'].tolist()
+        cat_results = [{'image_id': image_ids[k],
+                        'category_id': cat_id,
+                        'keypoints': key_points[k],
+                        'score': scores[k],
+                        'center': centers[k],
+                        'scale': scales[k]
+                        } for k in range(len(key_points))]
 
         return cat_results
 
@@ -187,3 +173,10 @@ class COCOEvaluator(BaseEvaluator):
 
         return info_str
 
+
+def _oks_nms_task(args):
+    kpts, scores, areas, oks_thre = args
+    keep = oks_nms_arrays(kpts, scores, areas, oks_thre)
+    if len(keep) == 0:
+        return np.arange(len(kpts))
+    return np.array(keep)
@@ -19,26 +19,56 @@ from __future__ import print_function
 import numpy as np
 
 
-def oks_iou(g, d, a_g, a_d, sigmas=None, in_vis_thre=None):
+COCO_SIGMAS = np.array([.26, .25, .25, .35, .35, .79, .79, .72, .72, .62, .62, 1.07, 1.07, .87, .87, .89, .89]) / 10.0
+
+
+def oks_matrix(g, d, a_g, a_d, sigmas=None, in_vis_thre=None):
+    """
+    pairwise oks of [G, K, 3] keypoints g with areas a_g and [D, K, 3]
+    keypoints d with areas a_d
+    :return: [G, D] oks
+    """
     if not isinstance(sigmas, np.ndarray):
-        sigmas = np.array([.26, .25, .25, .35, .35, .79, .79, .72, .72, .62, .62, 1.07, 1.07, .87, .87, .89, .89]) / 10.0
+        sigmas = COCO_SIGMAS
     vars = (sigmas * 2) ** 2
-    xg = g[0::3]
-    yg = g[1::3]
-    vg = g[2::3]
-    ious = np.zeros((d.shape[0]))
-    for n_d in range(0, d.shape[0]):
-        xd = d[n_d, 0::3]
-        yd = d[n_d, 1::3]
-        vd = d[n_d, 2::3]
-        dx = xd - xg
-        dy = yd - yg
-        e = (dx ** 2 + dy ** 2) / vars / ((a_g + a_d[n_d]) / 2 + np.spacing(1)) / 2
-        if in_vis_thre is not None:
-            ind = list(vg > in_vis_thre) and list(vd > in_vis_thre)
-            e = e[ind]
-        ious[n_d] = np.sum(np.exp(-e)) / e.shape[0] if e.shape[0] != 0 else 0.0
-    return ious
+    dx = d[np.newaxis, :, :, 0] - g[:, np.newaxis, :, 0]
+    dy = d[np.newaxis, :, :, 1] - g[:, np.newaxis, :, 1]
+    e = (dx ** 2 + dy ** 2) / vars / ((a_g[:, np.newaxis, np.newaxis] + a_d[np.newaxis, :, np.newaxis]) / 2 + np.spacing(1)) / 2
+    if in_vis_thre is None:
+        return np.mean(np.exp(-e), axis=2)
+    # only the visible keypoints of d are counted
+    vis = np.broadcast_to(d[np.newaxis, :, :, 2] > in_vis_thre, e.shape)
+    num_vis = vis.sum(axis=2)
+    ious = np.where(vis, np.exp(-e), 0.).sum(axis=2)
+    return np.where(num_vis > 0, ious / np.maximum(num_vis, 1), 0.0)
+
+
+def oks_iou(g, d, a_g, a_d, sigmas=None, in_vis_thre=None):
+    g = np.asarray(g).reshape(1, -1, 3)
+    d = np.asarray(d).reshape(d.shape[0], -1, 3)
+    return oks_matrix(g, d, np.array([a_g]), np.asarray(a_d), sigmas, in_vis_thre)[0]
+
+
+def oks_nms_arrays(kpts, scores, areas, thresh, sigmas=None, in_vis_thre=None):
+    """
+    oks nms of [N, K, 3] keypoints with [N] scores and areas
+    :return: indexes to keep in descending score
+    """
+    if len(kpts) == 0:
+        return []
+
+    oks = oks_matrix(kpts, kpts, areas, areas, sigmas, in_vis_thre)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    suppressed = np.zeros(len(kpts), dtype=bool)
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= oks[i] > thresh
+
+    return keep
 
 
 def oks_nms(kpts_db, thresh, sigmas=None, in_vis_thre=None):
@@ -53,19 +83,7 @@ def oks_nms(kpts_db, thresh, sigmas=None, in_vis_thre=None):
         return []
 
     scores = np.array([kpts_db[i]['score'] for i in range(len(kpts_db))])
-    kpts = np.array([kpts_db[i]['keypoints'].flatten() for i in range(len(kpts_db))])
+    kpts = np.array([np.asarray(kpts_db[i]['keypoints']).reshape(-1, 3) for i in range(len(kpts_db))])
     areas = np.array([kpts_db[i]['area'] for i in range(len(kpts_db))])
 
-    order = scores.argsort()[::-1]
-
-    keep = []
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-
-        oks_ovr = oks_iou(kpts[i], kpts[order[1:]], areas[i], areas[order[1:]], sigmas, in_vis_thre)
-
-        inds = np.where(oks_ovr <= thresh)[0]
-        order = order[inds + 1]
-
-    return keep
\ No newline at end of file
+    return oks_nms_arrays(kpts, scores, areas, thresh, sigmas, in_vis_thre)
@@ -115,6 +115,14 @@ def affine_transform(pt, t):
     return new_pt[:2]
 
 
+def affine_transform_points(pts, t):
+    """
+    :param pts: [N, 2] points
+    :param t: [2, 3] affine transform
+    """
+    return np.dot(pts, t[:, 0:2].T) + t[:, 2]
+
+
 def get_3rd_point(a, b):
     direct = a - b
     return b + np.array([-direct[1], direct[0]], dtype=np.float32)
@@ -130,8 +138,9 @@ def get_dir(src_point, rot_rad):
     return src_result
 
 
-def crop(img, center, scale, output_size, rot=0):
-    trans = get_affine_transform(center, scale, rot, output_size)
+def crop(img, center, scale, output_size, rot=0, trans=None):
+    if trans is None:
+        trans = get_affine_transform(center, scale, rot, output_size)
 
     dst_img = cv2.warpAffine(img,
                              trans,
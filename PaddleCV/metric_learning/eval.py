@@ -104,8 +104,11 @@ def eval(args):
 
     f = np.vstack(f)
     l = np.hstack(l)
-    recall = recall_topk(f, l, k=1)
-    print("[%s] End test %d, test_recall %.5f" % (fmt_time(), len(f), recall))
+    recalls = recall_topk(f, l, k=[1, 10, 100, 1000])
+    print("[%s] End test %d, test_recall %.5f" %
+          (fmt_time(), len(f), recalls[0]))
+    print("[%s] recall@1 %.5f, recall@10 %.5f, recall@100 %.5f, "
+          "recall@1000 %.5f" % ((fmt_time(), ) + tuple(recalls)))
     sys.stdout.flush()
 
 
@@ -26,7 +26,7 @@ import paddle
 import paddle.fluid as fluid
 import models
 import reader
-from utility import add_arguments, print_arguments, check_cuda
+from utility import add_arguments, print_arguments, check_cuda, GalleryIndex
 
 parser = argparse.ArgumentParser(description=__doc__)
 add_arg = functools.partial(add_arguments, argparser=parser)
@@ -37,6 +37,8 @@ add_arg('batch_size', int, 1, "Minibatch size.")
 add_arg('image_shape', str, "3,224,224", "Input image size.")
 add_arg('use_gpu', bool, True, "Whether to use GPU or not.")
 add_arg('pretrained_model', str, None, "Whether to use pretrained model.")
+add_arg('gallery_index', str, None, "The .npz gallery index. If the file does not exist, it is built from the features of the images and saved, otherwise the images are searched in it.")
+add_arg('topk', int, 10, "The number of nearest gallery images to print for each image.")
 # yapf: enable
 
 model_list = [m for m in dir(models) if "__" not in m]
@@ -52,9 +54,10 @@ def infer(args):
                                                                      model_list)
 
     image = fluid.data(name='image', shape=[None] + image_shape, dtype='float32')
+    label = fluid.data(name='label', shape=[None, 1], dtype='int64')
 
     infer_loader = fluid.io.DataLoader.from_generator(
-                feed_list=[image],
+                feed_list=[image, label],
                 capacity=64,
                 use_double_buffer=True,
                 iterable=True)
@@ -84,12 +87,37 @@ def infer(args):
 
     fetch_list = [out.name]
 
+    gallery = None
+    if args.gallery_index and os.path.exists(args.gallery_index):
+        gallery = GalleryIndex.load(args.gallery_index)
+        print("Load gallery index {} of {} images".format(args.gallery_index,
+                                                          len(gallery)))
+
+    f, l = [], []
     for batch_id, data in enumerate(infer_loader()):
-        result = exe.run(test_program, fetch_list=fetch_list, feed=data)
-        result = result[0][0].reshape(-1)
+        [feas] = exe.run(test_program, fetch_list=fetch_list, feed=data)
+        result = feas[0].reshape(-1)
         print("Test-{0}-feature: {1}".format(batch_id, result[:5]))
+        if gallery is not None:
+            indices, dists = gallery.search(feas, k=args.topk)
+            for i in range(len(feas)):
+                neighbors = indices[i]
+                if gallery.lab is not None:
+                    neighbors = gallery.lab[neighbors]
+                print("Test-{0}-{1}-top{2}: {3}, dist: {4}".format(
+                    batch_id, i, args.topk, neighbors.tolist(),
+                    np.round(dists[i], 4).tolist()))
+        elif args.gallery_index:
+            f.append(feas)
+            l.append(np.asarray(data[0]['label']).reshape(-1))
         sys.stdout.flush()
 
+    if gallery is None and args.gallery_index:
+        gallery = GalleryIndex(np.vstack(f), np.hstack(l))
+        gallery.save(args.gallery_index)
+        print("Save gallery index of {} images to {}".format(
+            len(gallery), args.gallery_index))
+
 
 def main():
     args = parser.parse_args()
@@ -26,7 +26,6 @@ import numpy as np
 import sys
 import paddle.fluid as fluid
 from paddle.fluid import core
-import multiprocessing as mp
 
 
 def print_arguments(args):
@@ -99,61 +98,93 @@ def recall_topk_ori(fea, lab, k):
     return res
 
 
-def func(param):
-    sharedlist, s, e = param
-    fea, a, b = sharedlist
-    ab = np.dot(fea[s:e], fea.T)
-    d = a[s:e] + b - 2 * ab
-    for i in range(e - s):
-        d[i][s + i] += 1e8
-    sorted_index = np.argsort(d, 1)[:, :10]
-    return sorted_index
-
-
-def recall_topk_parallel(fea, lab, k):
-    fea = np.array(fea)
+def _normalize(fea):
+    fea = np.asarray(fea, dtype=np.float32)
     fea = fea.reshape(fea.shape[0], -1)
     n = np.sqrt(np.sum(fea**2, 1)).reshape(-1, 1)
-    fea = fea / n
-    a = np.sum(fea**2, 1).reshape(-1, 1)
-    b = a.T
-    sharedlist = mp.Manager().list()
-    sharedlist.append(fea)
-    sharedlist.append(a)
-    sharedlist.append(b)
-
-    N = 100
-    L = fea.shape[0] / N
-    params = []
-    for i in range(N):
-        if i == N - 1:
-            s, e = int(i * L), int(fea.shape[0])
-        else:
-            s, e = int(i * L), int((i + 1) * L)
-        params.append([sharedlist, s, e])
-
-    pool = mp.Pool(processes=4)
-    sorted_index_list = pool.map(func, params)
-    pool.close()
-    pool.join()
-    sorted_index = np.vstack(sorted_index_list)
+    return fea / np.maximum(n, 1e-12)
 
-    res = 0
-    for i in range(len(fea)):
-        for j in range(k):
-            pred = lab[sorted_index[i][j]]
-            if lab[i] == pred:
-                res += 1.0
-                break
-    res = res / len(fea)
-    return res
+
+class GalleryIndex(object):
+    """Exhaustive nearest neighbour search over L2 normalized features.
+
+    The queries are searched in chunks of rows, so that a chunk of the
+    distance matrix stays under max_chunk_bytes. The matmul of a chunk runs
+    on the BLAS threads and only the top k columns of each row are kept by
+    argpartition. An index can be saved and loaded again to search new
+    images against the same gallery.
+    """
+
+    def __init__(self, fea, lab=None, max_chunk_bytes=256 << 20):
+        self.fea = _normalize(fea)
+        self.lab = None if lab is None else np.asarray(lab).reshape(-1)
+        self.max_chunk_bytes = max_chunk_bytes
+
+    def __len__(self):
+        return self.fea.shape[0]
+
+    def search(self, query=None, k=10):
+        """ top k gallery indices and squared L2 distances of each query,
+        nearest first. If query is None the gallery itself is searched,
+        without matching an image to itself.
+        """
+        exclude_self = query is None
+        query = self.fea if exclude_self else _normalize(query)
+        num = len(self)
+        k = max(0, min(k, num - 1 if exclude_self else num))
+        indices = np.empty((query.shape[0], k), dtype=np.int64)
+        dists = np.empty((query.shape[0], k), dtype=np.float32)
+        if k == 0:
+            return indices, dists
+
+        chunk = max(1, int(self.max_chunk_bytes // (4 * num)))
+        for s in range(0, query.shape[0], chunk):
+            e = min(s + chunk, query.shape[0])
+            rows = np.arange(e - s).reshape(-1, 1)
+            sim = np.dot(query[s:e], self.fea.T)
+            if exclude_self:
+                sim[rows[:, 0], np.arange(s, e)] = -np.inf
+            if k < num:
+                top = np.argpartition(sim, num - k, axis=1)[:, num - k:]
+            else:
+                top = np.tile(np.arange(num), (e - s, 1))
+            order = np.argsort(-sim[rows, top], axis=1, kind='mergesort')
+            indices[s:e] = top[rows, order]
+            dists[s:e] = np.maximum(2 - 2 * sim[rows, indices[s:e]], 0)
+        return indices, dists
+
+    def save(self, path):
+        """ save the index as a .npz file """
+        arrays = {'fea': self.fea}
+        if self.lab is not None:
+            arrays['lab'] = self.lab
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        data = np.load(path)
+        lab = data['lab'] if 'lab' in data.files else None
+        return cls(data['fea'], lab, **kwargs)
 
 
 def recall_topk(fea, lab, k=1):
-    if fea.shape[0] < 20:
-        return recall_topk_ori(fea, lab, k)
+    """ recall@k with each sample as the query and all the other samples
+    as the gallery. k can be a list, then the recalls of all the k are
+    computed from one top max(k) search and returned as a list.
+    """
+    ks = list(k) if isinstance(k, (list, tuple)) else [k]
+    index = GalleryIndex(fea, lab)
+    indices, _ = index.search(k=max(ks))
+    if indices.shape[1] == 0:
+        recalls = [0.0 for _ in ks]
     else:
-        return recall_topk_parallel(fea, lab, k)
+        lab = index.lab
+        hits = lab[indices] == lab.reshape(-1, 1)
+        # rank of the first sample of the same label
+        first_hit = np.where(hits.any(1), hits.argmax(1), max(ks))
+        recalls = [float(np.mean(first_hit < kk)) for kk in ks]
+    return recalls if isinstance(k, (list, tuple)) else recalls[0]
 
 
 def get_gpu_num():
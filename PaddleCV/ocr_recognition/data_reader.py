@@ -16,7 +16,12 @@ from __future__ import division
 from __future__ import print_function
 import os
 import cv2
+import json
+import hashlib
 import tarfile
+import tempfile
+import collections
+import multiprocessing
 import numpy as np
 from PIL import Image
 from os import path
@@ -46,6 +51,114 @@ TRAIN_LIST_FILE_NAME = "train.list"
 TEST_LIST_FILE_NAME = "test.list"
 
 
+def _load_gray_image(img_path):
+    img = Image.open(img_path).convert('L')
+    img = img.resize((img.size[0], DATA_SHAPE[1]))  # resize height
+    return np.ascontiguousarray(np.array(img, dtype=np.uint8))
+
+
+def build_image_cache(img_root_dir, img_label_list, cache_dir=None,
+                      num_workers=4):
+    '''
+    Decode the images of img_label_list once into grayscale images of height
+    DATA_SHAPE[1] and pack them into one uint8 file, which is memory-mapped
+    by the readers. The file names contain a digest of the list file, so the
+    cache is rebuilt when the list changes.
+
+    :param cache_dir: The directory to save the cache, the directory of the
+    list file by default. A temporary directory is used if it is not writable.
+    :type cache_dir: str
+
+    :return: The path of the packed images and an int64 array of
+    [offset, width] of each image in the list.
+    '''
+    with open(img_label_list, 'rb') as f:
+        md5 = hashlib.md5(f.read())
+    md5.update(
+        json.dumps([os.path.abspath(img_root_dir), DATA_SHAPE[1]]).encode(
+            'utf-8'))
+    name = '{}_{}'.format(
+        os.path.splitext(os.path.basename(img_label_list))[0],
+        md5.hexdigest()[:16])
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.path.dirname(os.path.abspath(img_label_list)), 'image_cache')
+
+    for cache_dir in [cache_dir, os.path.join(tempfile.gettempdir(),
+                                              'ocr_image_cache')]:
+        images_path = os.path.join(cache_dir, name + '_images.bin')
+        index_path = os.path.join(cache_dir, name + '_index.npy')
+        if os.path.exists(images_path) and os.path.exists(index_path):
+            return images_path, np.load(index_path)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            tmp_suffix = '.{}.tmp'.format(os.getpid())
+            open(images_path + tmp_suffix, 'wb').close()
+            break
+        except (IOError, OSError) as e:
+            print("can not write image cache to {}: {}".format(cache_dir, e))
+    else:
+        raise IOError("no writable directory for the image cache")
+
+    img_paths = [
+        os.path.join(img_root_dir, line.split(' ')[2])
+        for line in open(img_label_list) if len(line.split(' ')) >= 4
+    ]
+    print("building image cache {} for {} images".format(images_path,
+                                                          len(img_paths)))
+    index = np.zeros((len(img_paths), 2), dtype=np.int64)
+    pool = None
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+    try:
+        imgs = pool.imap(_load_gray_image, img_paths, chunksize=64) \
+            if pool is not None else map(_load_gray_image, img_paths)
+        offset = 0
+        with open(images_path + tmp_suffix, 'wb') as f:
+            for i, img in enumerate(imgs):
+                f.write(img.tobytes())
+                index[i] = offset, img.shape[1]
+                offset += img.size
+    finally:
+        if pool is not None:
+            pool.terminate()
+    os.rename(images_path + tmp_suffix, images_path)
+    with open(index_path + tmp_suffix, 'wb') as f:
+        np.save(f, index)
+    os.rename(index_path + tmp_suffix, index_path)
+    return images_path, index
+
+
+_images = None
+
+
+def _init_image_worker(images_path):
+    global _images
+    _images = np.memmap(images_path, dtype=np.uint8, mode='r')
+
+
+def _read_batch(task, model):
+    '''
+    Build one batch from the image cache, task is a list of
+    (offset, width, label). All images are resized to the width of the
+    first one, which is a no-op for the images of the same width.
+    '''
+    result = []
+    height = DATA_SHAPE[1]
+    batch_width = task[0][1]
+    for offset, width, label in task:
+        img = _images[offset:offset + height * width].reshape(height, width)
+        if width != batch_width:
+            img = np.array(Image.fromarray(img).resize((batch_width, height)))
+        img = (img - np.float32(127.5))[np.newaxis, ...]
+        if model == "crnn_ctc":
+            result.append([img, label])
+        else:
+            result.append([img, [SOS] + label, label + [EOS]])
+    return result
+
+
 class DataGenerator(object):
     def __init__(self, model="crnn_ctc"):
         self.model = model
@@ -55,7 +168,9 @@ class DataGenerator(object):
                      img_label_list,
                      batchsize,
                      cycle,
-                     shuffle=True):
+                     shuffle=True,
+                     cache_dir=None,
+                     num_workers=4):
         '''
         Reader interface for training.
 
@@ -69,87 +184,74 @@ class DataGenerator(object):
         it reiterates dataset over as many times as necessary.
         :type cycle: bool
 
-        '''
+        :param cache_dir: The directory of the grayscale image cache, see
+        build_image_cache.
+        :type cache_dir: str
 
-        img_label_lines = []
-        to_file = "tmp.txt"
+        :param num_workers: The number of processes to build batches.
+        :type num_workers: int
 
-        def _shuffle_data(input_file_path, output_file_path, shuffle,
-                          batchsize):
-            def _write_file(file_path, lines_to_write):
-                open(file_path, 'w').writelines(
-                    ["{}\n".format(item) for item in lines_to_write])
+        '''
 
-            input_file = open(input_file_path, 'r')
-            lines_to_shuf = [line.strip() for line in input_file.readlines()]
+        lines = [line.split(' ') for line in open(img_label_list)]
+        lines = [items for items in lines if len(items) >= 4]
+        if len(lines) // batchsize == 0:
+            raise ValueError('Batch size is bigger than the dataset size.')
+        labels = [[int(c) for c in items[-1].split(',')] for items in lines]
+        images_path, index = build_image_cache(
+            img_root_dir, img_label_list, cache_dir, num_workers)
+        widths = index[:, 1]
 
+        def _shuffle_batches():
             if not shuffle:
-                _write_file(output_file_path, lines_to_shuf)
+                order = np.arange(len(lines))
             elif batchsize == 1:
-                random.shuffle(lines_to_shuf)
-                _write_file(output_file_path, lines_to_shuf)
+                order = np.random.permutation(len(lines))
             else:
-                #partial shuffle
-                for i in range(len(lines_to_shuf)):
-                    str_i = lines_to_shuf[i]
-                    list_i = str_i.strip().split(' ')
-                    str_i_ = "%04d%.4f " % (int(list_i[0]), random.random()
-                                            ) + str_i
-                    lines_to_shuf[i] = str_i_
-                lines_to_shuf.sort()
-                delete_num = random.randint(1, 100)
-                del lines_to_shuf[0:delete_num]
-
-                #batch merge and shuffle
-                lines_concat = []
-                for i in range(0, len(lines_to_shuf), batchsize):
-                    lines_concat.append(' '.join(lines_to_shuf[i:i +
-                                                               batchsize]))
-                random.shuffle(lines_concat)
-
-                #batch split
-                out_file = open(output_file_path, 'w')
-                for i in range(len(lines_concat)):
-                    tmp_list = lines_concat[i].split(' ')
-                    for j in range(int(len(tmp_list) / 5)):
-                        out_file.write("{} {} {} {}\n".format(tmp_list[
-                            5 * j + 1], tmp_list[5 * j + 2], tmp_list[
-                                5 * j + 3], tmp_list[5 * j + 4]))
-                out_file.close()
-            input_file.close()
-
-        _shuffle_data(img_label_list, to_file, shuffle, batchsize)
-        print("finish batch shuffle")
-        img_label_lines = open(to_file, 'r').readlines()
+                # partial shuffle: sort by width with random order inside the
+                # same width, so that a batch holds images of (nearly) the
+                # same width, then shuffle the batches
+                order = np.lexsort((np.random.rand(len(lines)), widths))
+                order = order[np.random.randint(1, 101):]
+            batches = [
+                order[i:i + batchsize]
+                for i in range(0, len(order) - batchsize + 1, batchsize)
+            ]
+            if shuffle and batchsize > 1:
+                random.shuffle(batches)
+            return batches
+
+        def _batch_task(batch):
+            return [(index[i, 0], index[i, 1], labels[i]) for i in batch]
 
         def reader():
-            sizes = len(img_label_lines) // batchsize
-            if sizes == 0:
-                raise ValueError('Batch size is bigger than the dataset size.')
-            while True:
-                for i in range(sizes):
-                    result = []
-                    sz = [0, 0]
-                    for j in range(batchsize):
-                        line = img_label_lines[i * batchsize + j]
-                        # h, w, img_name, labels
-                        items = line.split(' ')
-
-                        label = [int(c) for c in items[-1].split(',')]
-                        img = Image.open(os.path.join(img_root_dir, items[
-                            2])).convert('L')
-                        if j == 0:
-                            sz = img.size
-                        img = img.resize((sz[0], DATA_SHAPE[1]))
-                        img = np.array(img) - 127.5
-                        img = img[np.newaxis, ...]
-                        if self.model == "crnn_ctc":
-                            result.append([img, label])
-                        else:
-                            result.append([img, [SOS] + label, label + [EOS]])
-                    yield result
-                if not cycle:
-                    break
+            pool = None
+            if num_workers > 1:
+                pool = multiprocessing.Pool(
+                    num_workers,
+                    initializer=_init_image_worker,
+                    initargs=(images_path, ))
+            else:
+                _init_image_worker(images_path)
+            pending = collections.deque()
+            try:
+                while True:
+                    for batch in _shuffle_batches():
+                        task = _batch_task(batch)
+                        if pool is None:
+                            yield _read_batch(task, self.model)
+                            continue
+                        pending.append(
+                            pool.apply_async(_read_batch, (task, self.model)))
+                        if len(pending) >= 4 * num_workers:
+                            yield pending.popleft().get()
+                    if not cycle:
+                        break
+                while pending:
+                    yield pending.popleft().get()
+            finally:
+                if pool is not None:
+                    pool.terminate()
 
         return reader
 
@@ -252,7 +354,9 @@ def train(batch_size,
           train_images_dir=None,
           train_list_file=None,
           cycle=False,
-          model="crnn_ctc"):
+          model="crnn_ctc",
+          cache_dir=None,
+          num_workers=4):
     generator = DataGenerator(model)
     if train_images_dir is None:
         data_dir = download_data()
@@ -263,7 +367,13 @@ def train(batch_size,
     if 'ce_mode' in os.environ:
         shuffle = False
     return generator.train_reader(
-        train_images_dir, train_list_file, batch_size, cycle, shuffle=shuffle)
+        train_images_dir,
+        train_list_file,
+        batch_size,
+        cycle,
+        shuffle=shuffle,
+        cache_dir=cache_dir,
+        num_workers=num_workers)
 
 
 def test(batch_size=1,
@@ -49,6 +49,8 @@ add_arg('train_images',      str,     None,       "The directory of images to be
 add_arg('train_list',        str,     None,       "The list file of images to be used for training.")
 add_arg('test_images',       str,     None,       "The directory of images to be used for test.")
 add_arg('test_list',         str,     None,       "The list file of images to be used for training.")
+add_arg('image_cache_dir',   str,     None,       "The directory of the packed grayscale training images. None means the directory of the train list.")
+add_arg('num_workers',       int,     4,          "The number of processes to read training batches.")
 add_arg('model',             str,     "crnn_ctc",           "Which type of network to be used. 'crnn_ctc' or 'attention'")
 add_arg('init_model',        str,     None,       "The init model file of directory.")
 add_arg('use_gpu',           bool,    True,      "Whether use GPU to train.")
@@ -86,7 +88,9 @@ def train(args):
         train_images_dir=args.train_images,
         train_list_file=args.train_list,
         cycle=args.total_step > 0,
-        model=args.model)
+        model=args.model,
+        cache_dir=args.image_cache_dir,
+        num_workers=args.num_workers)
     test_reader = data_reader.test(
         test_images_dir=args.test_images,
         test_list_file=args.test_list,
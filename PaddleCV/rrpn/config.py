@@ -125,6 +125,9 @@ _C.TEST.detections_per_im = 300
 # NMS threshold used on RPN proposals
 _C.TEST.rpn_nms_thresh = 0.7
 
+# number of processes to evaluate images
+_C.TEST.eval_workers = 4
+
 #
 # Model options
 #
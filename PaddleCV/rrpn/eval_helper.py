@@ -16,6 +16,7 @@ import os
 import numpy as np
 import paddle.fluid as fluid
 import math
+import multiprocessing
 from config import cfg
 import six
 import numpy as np
@@ -99,17 +100,14 @@ def clip_box(bbox, im_info):
 
     h = im_info[0]
     w = im_info[1]
-    res = []
-    for b in bbox:
-        pts = b.reshape(4, 2)
-        pts[np.where(pts < 0)] = 1
-        pts[np.where(pts[:, 0] > w), 0] = w - 1
-        pts[np.where(pts[:, 1] > h), 1] = h - 1
-        pts = pts.reshape(-1)
-        pts /= im_info[2]
-        res.append(pts)
-
-    return np.array(res)
+    pts = np.array(bbox).reshape(-1, 4, 2)
+    pts[pts < 0] = 1
+    xs = pts[:, :, 0]
+    ys = pts[:, :, 1]
+    xs[xs > w] = w - 1
+    ys[ys > h] = h - 1
+    pts /= im_info[2]
+    return pts.reshape(-1, 8)
 
 
 def get_union(det, gt):
@@ -132,24 +130,193 @@ def get_intersection(det, gt):
     return inter.area()
 
 
-def parse_gt(result, im_id):
+def cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def quad_areas(quads):
+    """
+    Areas of [N, 4, 2] quadrilaterals, the same as Polygon.area()
+    """
+    return 0.5 * np.abs(cross(quads, np.roll(quads, -1, axis=1)).sum(axis=1))
+
+
+def quads_from_points(points):
+    """
+    [N, 4, 2] float corners from [N, 8] points, truncated to integers
+    like polygon_from_points
+    """
+    return np.asarray(points).astype(np.int64).reshape(-1, 4, 2).astype(
+        np.float64)
+
+
+def orient_convex_quads(quads):
+    """
+    Returns counter-clockwise copies of quads and whether each quad is
+    strictly convex
+    """
+    edges = np.roll(quads, -1, axis=1) - quads
+    turns = cross(edges, np.roll(edges, -1, axis=1))
+    ccw = np.all(turns > 0, axis=1)
+    cw = np.all(turns < 0, axis=1)
+    quads = np.where(cw[:, np.newaxis, np.newaxis], quads[:, ::-1], quads)
+    return quads, ccw | cw
+
+
+def convex_intersection_areas(quads1, quads2):
+    """
+    Intersection areas of pairs of counter-clockwise convex quadrilaterals.
+    The intersection is the convex hull of the corners of each quad lying
+    in the other one and the crossings of their edges, its vertices are
+    ordered by angle around their mean.
+    """
+    edges1 = np.roll(quads1, -1, axis=1) - quads1
+    edges2 = np.roll(quads2, -1, axis=1) - quads2
+    # [N, 4(points), 4(edges)] side of every corner w.r.t. the other edges
+    inside1 = np.all(
+        cross(edges2[:, np.newaxis], quads1[:, :, np.newaxis] -
+              quads2[:, np.newaxis]) >= 0,
+        axis=2)
+    inside2 = np.all(
+        cross(edges1[:, np.newaxis], quads2[:, :, np.newaxis] -
+              quads1[:, np.newaxis]) >= 0,
+        axis=2)
+    # [N, 4, 4] crossings of edge i of quads1 with edge j of quads2
+    offsets = quads2[:, np.newaxis] - quads1[:, :, np.newaxis]
+    denom = cross(edges1[:, :, np.newaxis], edges2[:, np.newaxis])
+    parallel = denom == 0
+    denom = np.where(parallel, 1., denom)
+    t = cross(offsets, edges2[:, np.newaxis]) / denom
+    u = cross(offsets, edges1[:, :, np.newaxis]) / denom
+    crossed = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    crossings = quads1[:, :, np.newaxis] + \
+        t[..., np.newaxis] * edges1[:, :, np.newaxis]
+
+    n = quads1.shape[0]
+    points = np.concatenate(
+        [quads1, quads2, crossings.reshape(n, 16, 2)], axis=1)
+    valid = np.concatenate(
+        [inside1, inside2, crossed.reshape(n, 16)], axis=1)
+    points = np.where(valid[..., np.newaxis], points, 0.)
+    count = np.maximum(valid.sum(axis=1), 1)
+    center = points.sum(axis=1) / count[:, np.newaxis]
+    offsets = points - center[:, np.newaxis]
+    angles = np.where(valid, np.arctan2(offsets[..., 1], offsets[..., 0]),
+                      np.inf)
+    order = np.argsort(angles, axis=1)
+    points = np.take_along_axis(points, order[..., np.newaxis], axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    # pad with the first vertex so that padded edges have no area
+    points = np.where(valid[..., np.newaxis], points, points[:, :1])
+    return quad_areas(points)
+
+
+def quad_intersection_areas(points1, points2):
+    """
+    Intersection areas of pairs of [N, 8] quadrilaterals. Convex pairs are
+    clipped in batch, the others fall back to Polygon.
+    """
+    quads1, convex1 = orient_convex_quads(quads_from_points(points1))
+    quads2, convex2 = orient_convex_quads(quads_from_points(points2))
+    convex = convex1 & convex2
+    inters = np.zeros(quads1.shape[0])
+    if convex.any():
+        inters[convex] = convex_intersection_areas(quads1[convex],
+                                                   quads2[convex])
+    for i in np.nonzero(~convex)[0]:
+        inters[i] = get_intersection(
+            polygon_from_points(points1[i]), polygon_from_points(points2[i]))
+    return inters
+
+
+def pair_intersection_areas(pairs):
+    return quad_intersection_areas(*pairs)
+
+
+def pair_overlaps(points1, points2, pool=None, chunk_size=4096):
+    """
+    Intersection and IoU of pairs of [N, 8] quadrilaterals, the pairs are
+    split into chunks over the processes of pool.
+    """
+    points1 = np.asarray(points1, dtype=np.float64).reshape(-1, 8)
+    points2 = np.asarray(points2, dtype=np.float64).reshape(-1, 8)
+    chunks = [(points1[i:i + chunk_size], points2[i:i + chunk_size])
+              for i in range(0, points1.shape[0], chunk_size)]
+    if len(chunks) == 0:
+        return np.zeros(0), np.zeros(0)
+    if pool is None or len(chunks) == 1:
+        inters = [pair_intersection_areas(chunk) for chunk in chunks]
+    else:
+        inters = pool.map(pair_intersection_areas, chunks)
+    inter = np.concatenate(inters)
+    union = quad_areas(quads_from_points(points1)) + \
+        quad_areas(quads_from_points(points2)) - inter
+    iou = np.where(union > 0, inter / np.where(union > 0, union, 1.), 0.)
+    return inter, iou
+
+
+def group_pairs(groups1, groups2):
+    """
+    Indices of all pairs of two sets in the same group, e.g. the
+    detections and ground truth of every image. Pairs of a group are
+    ordered by the first then the second index.
+    """
+    groups1 = np.asarray(groups1).reshape(-1)
+    groups2 = np.asarray(groups2).reshape(-1)
+    _, groups = np.unique(
+        np.concatenate([groups1, groups2]), return_inverse=True)
+    groups = groups.reshape(-1)
+    num_groups = groups.max() + 1 if groups.size > 0 else 0
+    groups1 = groups[:groups1.size]
+    groups2 = groups[groups1.size:]
+    order1 = np.argsort(groups1, kind='mergesort')
+    order2 = np.argsort(groups2, kind='mergesort')
+    counts1 = np.bincount(groups1, minlength=num_groups)
+    counts2 = np.bincount(groups2, minlength=num_groups)
+    num_pairs = counts1 * counts2
+    group = np.repeat(np.arange(num_groups), num_pairs)
+    local = np.arange(num_pairs.sum()) - np.repeat(
+        np.cumsum(num_pairs) - num_pairs, num_pairs)
+    rows = (np.cumsum(counts1) - counts1)[group] + local // counts2[group]
+    cols = (np.cumsum(counts2) - counts2)[group] + local % counts2[group]
+    return order1[rows], order2[cols]
+
+
+def bbox_extents(points):
+    """
+    [N, 4] xmin, ymin, xmax, ymax of [N, 8] quadrilaterals
+    """
+    return np.stack(
+        [
+            np.min(points[:, 0::2], axis=1), np.min(points[:, 1::2], axis=1),
+            np.max(points[:, 0::2], axis=1), np.max(points[:, 1::2], axis=1)
+        ],
+        axis=1)
+
+
+def index_gt(result):
+    """
+    Ground truth boxes, classes, difficult flags and image ids of all
+    images, concatenated
+    """
+    gt_index = {'bbox': [], 'class': [], 'difficult': [], 'im_id': []}
+    seen = set()
     for res in result:
-        if res['im_id'] == im_id:
-            gt_boxes = list(res['gt_box'])
-            gt_class = res['gt_class']
-            is_difficult = res['is_difficult'].reshape(-1)
-            objects = []
-            for i in range(len(gt_boxes)):
-                object_struct = {}
-                object_struct['bbox'] = gt_boxes[i]
-                object_struct['class'] = gt_class[i]
-                if is_difficult[i] == 1:
-                    object_struct['difficult'] = 1
-                else:
-                    object_struct['difficult'] = 0
-                object_struct['im_id'] = im_id
-                objects.append(object_struct)
-            return objects
+        im_id = res['im_id'][0][0]
+        if im_id in seen:
+            continue
+        seen.add(im_id)
+        gt_boxes = np.array(res['gt_box'], dtype=np.float64).reshape(-1, 8)
+        gt_index['bbox'].append(gt_boxes)
+        gt_index['class'].append(np.array(res['gt_class']).reshape(-1))
+        gt_index['difficult'].append(
+            np.array(res['is_difficult']).reshape(-1) == 1)
+        gt_index['im_id'].append(np.full(gt_boxes.shape[0], im_id))
+    for key in gt_index:
+        gt_index[key] = np.concatenate(gt_index[key]) if len(gt_index[
+            key]) > 0 else np.zeros(0)
+    gt_index['bbox'] = gt_index['bbox'].reshape(-1, 8)
+    return gt_index
 
 
 def calculate_ap(rec, prec):
@@ -164,103 +331,72 @@ def calculate_ap(rec, prec):
     return ap
 
 
-def icdar_map(result, class_name, ovthresh):
-    im_ids = []
-    for res in result:
-        im_ids.append(res['im_id'][0][0])
-    recs = {}
-
-    for i, im_id in enumerate(im_ids):
-        recs[str(im_id)] = parse_gt(result, im_id)
-    class_recs = {}
-    npos = 0
-    for k in im_ids:
-        res = [obj for obj in recs[str(k)] if obj['class'] == class_name]
-        bbox = np.array([x['bbox'] for x in res])
-        difficult = np.array([x['difficult'] for x in res]).astype(np.bool)
-        det = [False] * len(res)
-        npos = npos + sum(~difficult)
-        class_recs[k] = {'bbox': bbox, 'difficult': difficult, 'det': det}
+def icdar_map(result, class_name, ovthresh, gt_index=None, pool=None):
+    if gt_index is None:
+        gt_index = index_gt(result)
+    is_class = gt_index['class'] == class_name
+    gt_bbox = gt_index['bbox'][is_class]
+    difficult = gt_index['difficult'][is_class].astype(bool)
+    npos = np.sum(~difficult)
     image_ids = []
     confidence = []
     bbox = []
     for res in result:
         im_info = res['im_info'][0]
-        pred_boxes = res['bbox']
-        for box in pred_boxes:
-            if box[0] == class_name:
-                image_ids.append(res['im_id'][0][0])
-                confidence.append(box[1])
-                clipd_box = clip_box(box[2:].reshape(-1, 8), im_info)
-                bbox.append(clipd_box[0])
-    confidence = np.array(confidence)
+        pred_boxes = np.array(res['bbox']).reshape(-1, 10)
+        pred_boxes = pred_boxes[pred_boxes[:, 0] == class_name]
+        image_ids += [res['im_id'][0][0]] * len(pred_boxes)
+        confidence.append(pred_boxes[:, 1])
+        bbox.append(clip_box(pred_boxes[:, 2:], im_info))
+    confidence = np.concatenate(confidence)
     sorted_ind = np.argsort(-confidence)
-    sorted_scores = np.sort(-confidence)
-    bbox = np.array(bbox)
-    bbox = bbox[sorted_ind, :]
-    image_ids = [image_ids[x] for x in sorted_ind]
+    bbox = np.concatenate(bbox).astype(float)[sorted_ind, :]
+    image_ids = np.array(image_ids)[sorted_ind]
     nd = len(image_ids)
+
+    # axis-aligned overlaps of the detections and gt of every image select
+    # the pairs to clip
+    rows, cols = group_pairs(image_ids, gt_index['im_id'][is_class])
+    bb = bbox_extents(bbox)[rows]
+    gt = bbox_extents(gt_bbox)[cols]
+    iw = np.maximum(
+        np.minimum(bb[:, 2], gt[:, 2]) - np.maximum(bb[:, 0], gt[:, 0]) + 1.,
+        0.)
+    ih = np.maximum(
+        np.minimum(bb[:, 3], gt[:, 3]) - np.maximum(bb[:, 1], gt[:, 1]) + 1.,
+        0.)
+    inters = iw * ih
+    uni = ((bb[:, 2] - bb[:, 0] + 1.) * (bb[:, 3] - bb[:, 1] + 1.) +
+           (gt[:, 2] - gt[:, 0] + 1.) * (gt[:, 3] - gt[:, 1] + 1.) - inters)
+    keep = inters / uni > 0
+    rows = rows[keep]
+    cols = cols[keep]
+    _, overlaps = pair_overlaps(bbox[rows], gt_bbox[cols], pool)
+
+    # the best gt of every detection, the first one on ties
+    order = np.lexsort((cols, -overlaps, rows))
+    rows = rows[order]
+    cols = cols[order]
+    overlaps = overlaps[order]
+    best = np.ones(rows.size, dtype=bool)
+    best[1:] = rows[1:] != rows[:-1]
+    ovmax = np.full(nd, -np.inf)
+    jmax = np.zeros(nd, dtype=np.int64)
+    ovmax[rows[best]] = overlaps[best]
+    jmax[rows[best]] = cols[best]
+
+    # in descending confidence, the first detection of a non difficult gt
+    # is a tp and the later ones are fp, detections of difficult gt are
+    # ignored
+    hit = ovmax > ovthresh
+    counted = np.nonzero(hit)[0]
+    counted = counted[~difficult[jmax[counted]]]
+    _, first = np.unique(jmax[counted], return_index=True)
     tp = np.zeros(nd)
     fp = np.zeros(nd)
-    for d in range(nd):
-        res = class_recs[image_ids[d]]
-        bb = bbox[d, :].astype(float)
-        ovmax = -np.inf
-        gt_bbox = res['bbox'].astype(float)
-        if gt_bbox.size > 0:
-            # compute overlaps
-            gt_bbox_xmin = np.min(gt_bbox[:, 0::2], axis=1)
-            gt_bbox_ymin = np.min(gt_bbox[:, 1::2], axis=1)
-            gt_bbox_xmax = np.max(gt_bbox[:, 0::2], axis=1)
-            gt_bbox_ymax = np.max(gt_bbox[:, 1::2], axis=1)
-            bb_xmin = np.min(bb[0::2])
-            bb_ymin = np.min(bb[1::2])
-            bb_xmax = np.max(bb[0::2])
-            bb_ymax = np.max(bb[1::2])
-
-            ixmin = np.maximum(gt_bbox_xmin, bb_xmin)
-            iymin = np.maximum(gt_bbox_ymin, bb_ymin)
-            ixmax = np.minimum(gt_bbox_xmax, bb_xmax)
-            iymax = np.minimum(gt_bbox_ymax, bb_ymax)
-            iw = np.maximum(ixmax - ixmin + 1., 0.)
-            ih = np.maximum(iymax - iymin + 1., 0.)
-            inters = iw * ih
-
-            # union
-            uni = ((bb_xmax - bb_xmin + 1.) * (bb_ymax - bb_ymin + 1.) +
-                   (gt_bbox_xmax - gt_bbox_xmin + 1.) *
-                   (gt_bbox_ymax - gt_bbox_ymin + 1.) - inters)
-
-            overlaps = inters / uni
-            gt_bbox_keep_mask = overlaps > 0
-            gt_bbox_keep = gt_bbox[gt_bbox_keep_mask, :]
-            gt_bbox_keep_index = np.where(overlaps > 0)[0]
-
-            def calcoverlaps(gt_bbox_keep, bb):
-                overlaps = []
-                for index, _ in enumerate(gt_bbox_keep):
-                    p_g = polygon_from_points(gt_bbox_keep[index])
-                    p_d = polygon_from_points(bb)
-                    overlap = get_intersection_over_union(p_d, p_g)
-                    overlaps.append(overlap)
-                return overlaps
-
-            if len(gt_bbox_keep) > 0:
-                overlaps = calcoverlaps(gt_bbox_keep, bb)
-
-                ovmax = np.max(overlaps)
-                jmax = np.argmax(overlaps)
-                jmax = gt_bbox_keep_index[jmax]
-
-        if ovmax > ovthresh:
-            if not res['difficult'][jmax]:
-                if not res['det'][jmax]:
-                    tp[d] = 1.
-                    res['det'][jmax] = 1
-                else:
-                    fp[d] = 1.
-        else:
-            fp[d] = 1.
+    tp[counted[first]] = 1.
+    fp[counted] = 1. - tp[counted]
+    fp[~hit] = 1.
     # compute precision recall
     fp = np.cumsum(fp)
     tp = np.cumsum(tp)
@@ -271,96 +407,79 @@ def icdar_map(result, class_name, ovthresh):
     return rec, prec, ap
 
 
-def icdar_map_eval(result, num_class):
+def icdar_map_eval(result, num_class, pool=None):
     map = 0
+    gt_index = index_gt(result)
     for i in range(num_class - 1):
-        rec, prec, ap = icdar_map(result, i + 1, ovthresh=0.5)
+        rec, prec, ap = icdar_map(
+            result, i + 1, ovthresh=0.5, gt_index=gt_index, pool=pool)
         map = map + ap
     map = map / (num_class - 1)
     logger.info('mAP {}'.format(map))
 
 
-def icdar_box_eval(result, thresh):
-
-    matched_sum = 0
-    num_global_care_gt = 0
-    num_global_care_det = 0
-    for res in result:
+def overlapped_pairs(points1, points2, groups1, groups2):
+    """
+    Pairs of the same group whose axis-aligned boxes overlap
+    """
+    rows, cols = group_pairs(groups1, groups2)
+    b1 = bbox_extents(points1)[rows]
+    b2 = bbox_extents(points2)[cols]
+    keep = (np.minimum(b1[:, 2], b2[:, 2]) > np.maximum(b1[:, 0], b2[:, 0])) & \
+        (np.minimum(b1[:, 3], b2[:, 3]) > np.maximum(b1[:, 1], b2[:, 1]))
+    return rows[keep], cols[keep]
+
+
+def icdar_box_eval(result, thresh, pool=None):
+    gt_boxes = []
+    gt_ids = []
+    dont_care = []
+    det_boxes = []
+    det_ids = []
+    for i, res in enumerate(result):
         im_info = res['im_info'][0]
-        h = im_info[1]
-        w = im_info[2]
-        gt_boxes = res['gt_box']
+        points = np.array(res['gt_box'], dtype=np.float64).reshape(-1, 8)
+        gt_boxes.append(points.astype(np.int64))
+        gt_ids.append(np.full(points.shape[0], i))
+        dont_care.append(res['is_difficult'].reshape(-1) == 1)
         pred_boxes = res['bbox']
         pred_boxes = pred_boxes[np.where(pred_boxes[:, 1] > thresh)]
         pred_boxes = pred_boxes[:, 2:]
-        pred_boxes = clip_box(pred_boxes, im_info)
-
-        is_difficult = res['is_difficult']
-        det_matched = 0
-
-        iou_mat = np.empty([1, 1])
-
-        gt_pols = []
-        det_pols = []
-
-        gt_pol_points = []
-        det_pol_points = []
-
-        gt_dont_care_pols_num = []
-        det_dont_care_pols_num = []
-
-        det_matched_nums = []
-
-        points_list = list(gt_boxes)
-
-        dony_care = is_difficult.reshape(-1)
-        for i, points in enumerate(points_list):
-            gt_pol = polygon_from_points(list(points))
-            gt_pols.append(gt_pol)
-            gt_pol_points.append(list(points))
-            if dony_care[i] == 1:
-                gt_dont_care_pols_num.append(len(gt_pols) - 1)
-        for i, points in enumerate(pred_boxes):
-            points = list(points.reshape(8).astype(np.int32))
-            det_pol = polygon_from_points(points)
-            det_pols.append(det_pol)
-            det_pol_points.append(points)
-            if len(gt_dont_care_pols_num) > 0:
-                for dont_care_pol in gt_dont_care_pols_num:
-                    dont_care_pol = gt_pols[dont_care_pol]
-                    intersected_area = get_intersection(dont_care_pol, det_pol)
-                    pd_dimensions = det_pol.area()
-                    precision = 0 if pd_dimensions == 0 else intersected_area / pd_dimensions
-                    if (precision > 0.5):
-                        det_dont_care_pols_num.append(len(det_pols) - 1)
-                        break
-        if len(gt_pols) > 0 and len(det_pols) > 0:
-            # Calculate IoU and precision matrixs
-            output_shape = [len(gt_pols), len(det_pols)]
-            iou_mat = np.empty(output_shape)
-            gt_rect_mat = np.zeros(len(gt_pols), np.int8)
-            det_rect_mat = np.zeros(len(det_pols), np.int8)
-            for gt_num in range(len(gt_pols)):
-                for det_num in range(len(det_pols)):
-                    p_d = gt_pols[gt_num]
-                    p_g = det_pols[det_num]
-                    iou_mat[gt_num, det_num] = get_intersection_over_union(p_d,
-                                                                           p_g)
-
-            for gt_num in range(len(gt_pols)):
-                for det_num in range(len(det_pols)):
-                    if gt_rect_mat[gt_num] == 0 and det_rect_mat[
-                            det_num] == 0 and gt_num not in gt_dont_care_pols_num and det_num not in det_dont_care_pols_num:
-                        if iou_mat[gt_num, det_num] > 0.5:
-                            gt_rect_mat[gt_num] = 1
-                            det_rect_mat[det_num] = 1
-                            det_matched += 1
-                            det_matched_nums.append(det_num)
-        num_gt_care = (len(gt_pols) - len(gt_dont_care_pols_num))
-        num_det_care = (len(det_pols) - len(det_dont_care_pols_num))
-        matched_sum += det_matched
-        num_global_care_gt += num_gt_care
-        num_global_care_det += num_det_care
+        pred_boxes = clip_box(pred_boxes, im_info).astype(np.int32)
+        det_boxes.append(pred_boxes)
+        det_ids.append(np.full(pred_boxes.shape[0], i))
+    gt_boxes = np.concatenate(gt_boxes).astype(np.float64)
+    gt_ids = np.concatenate(gt_ids)
+    dont_care = np.concatenate(dont_care)
+    det_boxes = np.concatenate(det_boxes).astype(np.float64)
+    det_ids = np.concatenate(det_ids)
+
+    # detections mostly inside a don't care gt of its image are ignored
+    dont_care_gt = np.nonzero(dont_care)[0]
+    rows, cols = overlapped_pairs(det_boxes, gt_boxes[dont_care_gt],
+                                  det_ids, gt_ids[dont_care_gt])
+    inters, _ = pair_overlaps(det_boxes[rows], gt_boxes[dont_care_gt][cols],
+                              pool)
+    pd_dimensions = quad_areas(quads_from_points(det_boxes))[rows]
+    precision = inters / np.where(pd_dimensions > 0, pd_dimensions, np.inf)
+    det_dont_care = np.zeros(det_boxes.shape[0], dtype=bool)
+    det_dont_care[rows[precision > 0.5]] = True
+
+    # each cared gt in order matches the first unmatched cared detection
+    # of IoU above 0.5
+    rows, cols = overlapped_pairs(gt_boxes, det_boxes, gt_ids, det_ids)
+    _, iou = pair_overlaps(gt_boxes[rows], det_boxes[cols], pool)
+    cand = (iou > 0.5) & ~dont_care[rows] & ~det_dont_care[cols]
+    gt_matched = set()
+    det_matched = set()
+    for gt_num, det_num in zip(rows[cand], cols[cand]):
+        if gt_num not in gt_matched and det_num not in det_matched:
+            gt_matched.add(gt_num)
+            det_matched.add(det_num)
+
+    matched_sum = len(det_matched)
+    num_global_care_gt = gt_boxes.shape[0] - np.sum(dont_care)
+    num_global_care_det = det_boxes.shape[0] - np.sum(det_dont_care)
     method_recall = 0 if num_global_care_gt == 0 else float(
         matched_sum) / num_global_care_gt
     method_precision = 0 if num_global_care_det == 0 else float(
@@ -373,7 +492,14 @@ def icdar_box_eval(result, thresh):
 
 
 def icdar_eval(result):
-    if cfg.dataset == 'icdar2015':
-        icdar_box_eval(result, 0.8)
-    else:
-        icdar_map_eval(result, cfg.class_num)
+    num_workers = cfg.TEST.eval_workers
+    pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+    try:
+        if cfg.dataset == 'icdar2015':
+            icdar_box_eval(result, 0.8, pool)
+        else:
+            icdar_map_eval(result, cfg.class_num, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
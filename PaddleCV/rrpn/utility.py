@@ -155,6 +155,7 @@ def parse_args():
     add_arg('nms_thresh',    float, 0.3,    "NMS threshold.")
     add_arg('score_thresh',    float, 0.01,    "score threshold for NMS.")
     add_arg('snapshot_stride',  int,    1000,    "save model every snapshot stride.")
+    add_arg('eval_workers',     int,    4,       "Number of processes to evaluate images.")
     # SINGLE EVAL AND DRAW
     add_arg('draw_threshold',  float, 0.8,    "Confidence threshold to draw bbox.")
     add_arg('image_path',       str,   'ICDAR2015/tmp/',  "The image path used to inference and visualize.")
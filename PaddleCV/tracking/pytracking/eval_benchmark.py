@@ -5,10 +5,15 @@ from __future__ import unicode_literals
 
 import argparse
 import importlib
+import json
+import multiprocessing
 import os
 import os.path as osp
 import pickle
+import queue
 import sys
+import threading
+import time
 from glob import glob
 
 import cv2 as cv
@@ -35,6 +40,27 @@ parser.add_argument(
     '--num_repeat', '-n', default=1, type=int, help='number of repeat')
 parser.add_argument(
     '--exp_id', '-ex', default='', type=str, help='experiment id')
+parser.add_argument(
+    '--num_workers',
+    '-w',
+    default=1,
+    type=int,
+    help='number of processes to run sequences, each with its own tracker')
+parser.add_argument(
+    '--gpus',
+    default='',
+    type=str,
+    help='comma separated gpu ids assigned to the workers in turn')
+parser.add_argument(
+    '--prefetch',
+    default=16,
+    type=int,
+    help='number of frames decoded ahead of the tracker')
+parser.add_argument(
+    '--fourier_backend',
+    default='',
+    type=str,
+    help='override the fourier backend of the tracker, native or real')
 
 args = parser.parse_args()
 
@@ -52,6 +78,8 @@ def get_tracker_params(param_module, params):
     tracker_params.debug = 0  # disable debug
     # change checkpoint path
     tracker_params.features.features[0].net_path = params['checkpoint']
+    if params.get('fourier_backend', ''):
+        tracker_params.fourier_backend = params['fourier_backend']
     return tracker_params
 
 
@@ -97,14 +125,63 @@ def get_axis_aligned_bbox(region):
     return x11, y11, w, h
 
 
-def run_tracker(tracker, video, reset=False):
+def prefetch_frames(video, timer, queue_size=16):
+    """Decode the frames of video in a background thread, queue_size ahead"""
+    frames = queue.Queue(max(queue_size, 1))
+
+    def decode():
+        try:
+            frame_iter = iter(video)
+            while True:
+                tic = time.time()
+                try:
+                    img, gt_bbox = next(frame_iter)
+                except StopIteration:
+                    break
+                image = read_image(img)
+                timer['decode_time'] += time.time() - tic
+                frames.put((image, gt_bbox))
+            frames.put(None)
+        except Exception as e:
+            frames.put(e)
+
+    thread = threading.Thread(target=decode)
+    thread.daemon = True
+    thread.start()
+    while True:
+        tic = time.time()
+        frame = frames.get()
+        timer['wait_time'] += time.time() - tic
+        if frame is None:
+            break
+        if isinstance(frame, Exception):
+            raise frame
+        yield frame
+    thread.join()
+
+
+def new_timer():
+    return {
+        'num_frames': 0,
+        'decode_time': 0.,
+        'wait_time': 0.,
+        'track_time': 0.,
+        'total_time': 0.
+    }
+
+
+def run_tracker(tracker, video, reset=False, timer=None, prefetch=16):
+    if timer is None:
+        timer = new_timer()
+    start = time.time()
+    frames = prefetch_frames(video, timer, prefetch)
     if reset:
         frame_counter = 0
         pred_bboxes = []
-        for idx, (img_p, gt_bbox) in enumerate(video):
+        for idx, (image, gt_bbox) in enumerate(frames):
+            tic = time.time()
             if idx == frame_counter:
                 # init your tracker here
-                image = read_image(img_p)
                 if len(gt_bbox) == 8:
                     init_bbox = get_axis_aligned_bbox(gt_bbox)
                 else:
@@ -113,7 +190,6 @@ def run_tracker(tracker, video, reset=False):
                 pred_bboxes.append(1)
             elif idx > frame_counter:
                 # get tracking result here
-                image = read_image(img_p)
                 pred_bbox = tracker.track(image)
                 overlap = vot_overlap(pred_bbox, gt_bbox,
                                       (image.shape[1], image.shape[0]))
@@ -126,12 +202,15 @@ def run_tracker(tracker, video, reset=False):
                     frame_counter = idx + 5
             else:
                 pred_bboxes.append(0)
+                continue
+            timer['track_time'] += time.time() - tic
+            timer['num_frames'] += 1
     else:
         pred_bboxes = []
-        for idx, (img_p, gt_bbox) in enumerate(video):
+        for idx, (image, gt_bbox) in enumerate(frames):
+            tic = time.time()
             if idx == 0:
                 # init your tracker here
-                image = read_image(img_p)
                 if len(gt_bbox) == 8:
                     init_bbox = get_axis_aligned_bbox(gt_bbox)
                 else:
@@ -140,30 +219,53 @@ def run_tracker(tracker, video, reset=False):
                 pred_bboxes.append(init_bbox)
             else:
                 # get tracking result here
-                image = read_image(img_p)
                 pred_bbox = tracker.track(image)
                 pred_bboxes.append(pred_bbox)
+            timer['track_time'] += time.time() - tic
+            timer['num_frames'] += 1
+    timer['total_time'] += time.time() - start
     return pred_bboxes
 
 
-def run_one_sequence(video, params, tracker=None):
-    # idt = multiprocessing.current_process()._identity[0]
-    # os.environ["CUDA_VISIBLE_DEVICES"] = "{}".format(idt % 4)
-    save_dir = osp.join(params['result_dir'], params['save_dataset_name'],
-                        params['tracking_base_param'], params['exp_id'])
+def get_save_dir(params):
+    return osp.join(params['result_dir'], params['save_dataset_name'],
+                    params['tracking_base_param'], params['exp_id'])
 
-    if tracker is None:
-        tracker = create_tracker(params)
 
+def get_save_paths(video, params):
+    save_dir = get_save_dir(params)
     if 'VOT' in params['dataset_name']:
         save_sub_dir = osp.join(save_dir, 'baseline', video.name)
-        os.makedirs(save_sub_dir, exist_ok=True)
         num_repeat = params.get('num_repeat', 1)
-        for repeat_idx in range(1, num_repeat + 1):
-            save_path = osp.join(save_sub_dir,
-                                 video.name + '_{:03d}.txt'.format(repeat_idx))
+        return [
+            osp.join(save_sub_dir,
+                     video.name + '_{:03d}.txt'.format(repeat_idx))
+            for repeat_idx in range(1, num_repeat + 1)
+        ]
+    return [osp.join(save_dir, video.name + '.txt')]
+
+
+def is_finished(video, params):
+    return all(osp.exists(path) for path in get_save_paths(video, params))
+
+
+def get_timing_path(params, name):
+    # kept apart from the results that pysot globs
+    return osp.join(get_save_dir(params), 'timing', name + '.json')
+
+
+def run_one_sequence(video, params, tracker=None):
+    if tracker is None:
+        tracker = create_tracker(params)
+
+    timer = new_timer()
+    prefetch = params.get('prefetch', 16)
+    if 'VOT' in params['dataset_name']:
+        for save_path in get_save_paths(video, params):
             if osp.exists(save_path): continue
-            pred_bboxes = run_tracker(tracker, video, reset=True)
+            os.makedirs(osp.dirname(save_path), exist_ok=True)
+            pred_bboxes = run_tracker(
+                tracker, video, reset=True, timer=timer, prefetch=prefetch)
 
             # Save tracking results
             with open(save_path, 'w') as f:
@@ -176,10 +278,11 @@ def run_one_sequence(video, params, tracker=None):
                             2], res[3]))
                 f.write('\n'.join(outputs))
     else:
-        os.makedirs(save_dir, exist_ok=True)
-        save_path = osp.join(save_dir, video.name + '.txt')
-        if osp.exists(save_path): return
-        pred_bboxes = run_tracker(tracker, video, reset=False)
+        save_path = get_save_paths(video, params)[0]
+        if osp.exists(save_path): return None
+        os.makedirs(osp.dirname(save_path), exist_ok=True)
+        pred_bboxes = run_tracker(
+            tracker, video, reset=False, timer=timer, prefetch=prefetch)
 
         # Save tracking results
         with open(save_path, 'w') as f:
@@ -189,14 +292,87 @@ def run_one_sequence(video, params, tracker=None):
                     3]))
             f.write('\n'.join(outputs))
 
+    if timer['num_frames'] == 0:
+        return None
+    timer['fps'] = timer['num_frames'] / max(timer['track_time'], 1e-12)
+    timer['wall_fps'] = timer['num_frames'] / max(timer['total_time'], 1e-12)
+    timing_path = get_timing_path(params, video.name)
+    os.makedirs(osp.dirname(timing_path), exist_ok=True)
+    with open(timing_path, 'w') as f:
+        json.dump(timer, f)
+    return timer
+
+
+_worker = {}
+
+
+def init_worker(params, dataset):
+    gpus = [g for g in params.get('gpus', '').split(',') if g != '']
+    if len(gpus) > 0:
+        idt = multiprocessing.current_process()._identity[0]
+        os.environ["CUDA_VISIBLE_DEVICES"] = gpus[(idt - 1) % len(gpus)]
+    _worker['params'] = params
+    _worker['dataset'] = dataset
+    _worker['tracker'] = create_tracker(params)
+
+
+def run_sequence_in_worker(video_name):
+    video = _worker['dataset'].videos[video_name]
+    return run_one_sequence(
+        video, _worker['params'], tracker=_worker['tracker'])
+
 
 def run_one_dataset(dataset, params):
-    # use the same tracker for all sequences
-    tracker = create_tracker(params)
-    # create new tracker for each sequence
-    # tracker = None
-    for video in tqdm(list(dataset.videos.values())):
-        run_one_sequence(video, params, tracker=tracker)
+    videos = [
+        video for video in dataset.videos.values()
+        if not is_finished(video, params)
+    ]
+    print('=> {} of {} sequences to run'.format(
+        len(videos), len(dataset.videos)))
+    if len(videos) == 0:
+        return
+    num_workers = min(params.get('num_workers', 1), len(videos))
+    if num_workers <= 1:
+        # use the same tracker for all sequences
+        tracker = create_tracker(params)
+        for video in tqdm(videos):
+            run_one_sequence(video, params, tracker=tracker)
+        return
+
+    # shard sequences over workers, each worker keeps its own tracker
+    pool = multiprocessing.Pool(
+        num_workers, initializer=init_worker, initargs=(params, dataset))
+    try:
+        for _ in tqdm(
+                pool.imap_unordered(run_sequence_in_worker,
+                                    [video.name for video in videos]),
+                total=len(videos)):
+            pass
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def collect_timing(dataset, params):
+    """Per-sequence speed and its decode/track breakdown"""
+    sequences = {}
+    for name in dataset.videos:
+        timing_path = get_timing_path(params, name)
+        if osp.exists(timing_path):
+            with open(timing_path) as f:
+                sequences[name] = json.load(f)
+    timing = {'sequences': sequences}
+    if len(sequences) > 0:
+        for key in ['num_frames', 'decode_time', 'wait_time', 'track_time']:
+            timing[key] = sum(t[key] for t in sequences.values())
+        timing['fps'] = timing['num_frames'] / max(timing['track_time'],
+                                                   1e-12)
+        timing['mean_sequence_fps'] = float(
+            np.mean([t['fps'] for t in sequences.values()]))
+    return timing
 
 
 def compute_evaluation_metrics(dataset, params):
@@ -229,8 +405,7 @@ def compute_evaluation_metrics(dataset, params):
 
 
 def save_info(params, metrics):
-    save_dir = osp.join(params['result_dir'], params['save_dataset_name'],
-                        params['tracking_base_param'], params['exp_id'])
+    save_dir = get_save_dir(params)
     with open(osp.join(save_dir, 'params.pickle'), 'wb') as f:
         pickle.dump(params, f)
 
@@ -248,6 +423,7 @@ def run_tracking_and_evaluate(params):
 
     run_one_dataset(dataset, params)
     metrics = compute_evaluation_metrics(dataset, params)
+    metrics['timing'] = collect_timing(dataset, params)
 
     return metrics
 
@@ -298,6 +474,10 @@ def main():
             'exp_id': exp_id,
             'result_dir': env_settings().results_path,
             'save_dataset_name': save_dataset_name,
+            'num_workers': args.num_workers,
+            'gpus': args.gpus,
+            'prefetch': args.prefetch,
+            'fourier_backend': args.fourier_backend,
         }
 
         metrics = run_tracking_and_evaluate(params)
@@ -0,0 +1,180 @@
+"""Complex operations on native complex64 arrays.
+
+Same functions as pytracking.libs.complex, but the tensors are numpy complex
+arrays instead of real arrays with a trailing dimension of 2. Most functions
+take an optional `out` array so that results can be written into
+preallocated buffers."""
+
+import numpy as np
+from pytracking.libs.tensorlist import tensor_operation
+
+DTYPE = np.complex64
+
+
+def is_complex(a: np.array) -> bool:
+    return np.iscomplexobj(a)
+
+
+def is_real(a: np.array) -> bool:
+    return not is_complex(a)
+
+
+@tensor_operation
+def from_real(a: np.array):
+    """Convert a real tensor with trailing complex dimension of 2."""
+
+    if a.ndim < 1 or a.shape[-1] != 2:
+        raise ValueError('Last dimension must have length 2.')
+
+    if a.dtype == np.float32 and a.flags['C_CONTIGUOUS']:
+        # reinterpret the (re, im) pairs without a copy
+        return a.view(DTYPE)[..., 0]
+    return complex(a[..., 0], a[..., 1])
+
+
+@tensor_operation
+def to_real(a: np.array):
+    """Convert to a real tensor with trailing complex dimension of 2."""
+
+    a = np.ascontiguousarray(a, DTYPE)
+    return a.view(np.float32).reshape(a.shape + (2, ))
+
+
+@tensor_operation
+def mult(a: np.array, b: np.array, out=None):
+    """Pointwise complex multiplication of complex tensors."""
+
+    return np.multiply(a, b, out=out)
+
+
+@tensor_operation
+def mult_conj(a: np.array, b: np.array, out=None):
+    """Pointwise complex multiplication of complex tensors, with conjugate on b: a*conj(b)."""
+
+    if is_real(b):
+        return np.multiply(a, b, out=out)
+    out = np.conjugate(b, out=out)
+    out *= a
+    return out
+
+
+@tensor_operation
+def mult_real_cplx(a: np.array, b: np.array, out=None):
+    """Pointwise complex multiplication of real tensor a with complex tensor b."""
+
+    if is_real(b):
+        raise ValueError('b must be complex.')
+
+    return np.multiply(a, b, out=out)
+
+
+@tensor_operation
+def div(a: np.array, b: np.array, out=None):
+    """Pointwise complex division of complex tensors."""
+
+    return np.divide(a, b, out=out)
+
+
+@tensor_operation
+def div_cplx_real(a: np.array, b: np.array, out=None):
+    """Pointwise complex division of complex tensor a with real tensor b."""
+
+    if is_real(a):
+        raise ValueError('a must be complex.')
+
+    return np.divide(a, b, out=out)
+
+
+@tensor_operation
+def abs_sqr(a: np.array, out=None):
+    """Squared absolute value."""
+
+    out = np.multiply(a.real, a.real, out=out)
+    out += a.imag * a.imag
+    return out
+
+
+@tensor_operation
+def abs(a: np.array, out=None):
+    """Absolute value."""
+
+    return np.absolute(a, out=out)
+
+
+@tensor_operation
+def conj(a: np.array, out=None):
+    """Complex conjugate."""
+
+    return np.conjugate(a, out=out)
+
+
+@tensor_operation
+def real(a: np.array):
+    """Real part."""
+
+    return a.real
+
+
+@tensor_operation
+def imag(a: np.array):
+    """Imaginary part."""
+
+    return a.imag
+
+
+@tensor_operation
+def complex(a: np.array, b: np.array=None):
+    """Create complex tensor from real and imaginary part."""
+
+    shape = a.shape if a is not None else b.shape
+    c = np.empty(shape, DTYPE)
+    c.real = 0 if a is None else a
+    c.imag = 0 if b is None else b
+    return c
+
+
+@tensor_operation
+def mtimes(a: np.array, b: np.array, conj_a=False, conj_b=False, out=None):
+    """Complex matrix multiplication of complex tensors.
+    The dimensions (-2, -1) are matrix multiplied."""
+
+    if conj_a and is_complex(a):
+        a = np.conjugate(a)
+    if conj_b and is_complex(b):
+        b = np.conjugate(b)
+    return np.matmul(a, b, out=out)
+
+
+@tensor_operation
+def mtimes_real_complex(a: np.array, b: np.array, conj_b=False, out=None):
+    """Matrix multiplication of real tensor a with complex tensor b."""
+
+    if is_real(b):
+        raise ValueError('Incorrect dimensions.')
+
+    if conj_b:
+        b = np.conjugate(b)
+    return np.matmul(a, b, out=out)
+
+
+@tensor_operation
+def mtimes_complex_real(a: np.array, b: np.array, conj_a=False, out=None):
+    """Matrix multiplication of complex tensor a with real tensor b."""
+
+    if is_real(a):
+        raise ValueError('Incorrect dimensions.')
+
+    if conj_a:
+        a = np.conjugate(a)
+    return np.matmul(a, b, out=out)
+
+
+@tensor_operation
+def exp_imag(a: np.array, out=None):
+    """Complex exponential with imaginary input: e^(i*a)"""
+
+    if out is None:
+        out = np.empty(a.shape, DTYPE)
+    out.real = np.cos(a)
+    out.imag = np.sin(a)
+    return out
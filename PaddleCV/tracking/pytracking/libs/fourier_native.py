@@ -0,0 +1,148 @@
+"""Fourier operations on native complex64 spectra.
+
+Drop-in replacement of pytracking.libs.fourier: the functions have the same
+names and arguments, but Fourier coefficients are complex64 arrays of shape
+[N, C, H, W // 2 + 1] instead of real arrays with a trailing dimension of 2.
+shift_fs works in place and the phase factors and padding buffers are cached,
+since the sizes are fixed for a whole sequence."""
+
+import functools
+
+import numpy as np
+
+from pytracking.libs import complex_native, TensorList
+from pytracking.libs.tensorlist import tensor_operation
+from pytracking.libs.fourier import rfftshift2, irfftshift2, get_frequency_coord
+
+DTYPE = complex_native.DTYPE
+
+_pad_buffers = {}
+
+
+@tensor_operation
+def cfft2(a):
+    """Do FFT and center the low frequency component.
+    Always produces odd (full) output sizes."""
+    return rfftshift2(np.fft.rfft2(a)).astype(DTYPE, copy=False)
+
+
+@tensor_operation
+def cifft2(a, signal_sizes=None):
+    """Do inverse FFT corresponding to cfft2."""
+    return np.fft.irfft2(irfftshift2(a), s=signal_sizes).astype(
+        np.float32, copy=False)
+
+
+def _pad_buffer(shape, sz, top):
+    """Zero padded buffer of the given shape. Only the region
+    [top:top + sz[0], :sz[1]] is ever written, so the border stays zero."""
+    key = (shape, sz, top)
+    buf = _pad_buffers.get(key)
+    if buf is None:
+        buf = np.zeros(shape, DTYPE)
+        _pad_buffers[key] = buf
+    return buf
+
+
+@tensor_operation
+def sample_fs(a: np.array, grid_sz: np.array=None, rescale=True):
+    """Samples the Fourier series."""
+
+    # Size of the fourier series
+    sz = np.array([a.shape[2], 2 * a.shape[3] - 1], 'float32')
+
+    # Default grid
+    if grid_sz is None or sz[0] == grid_sz[0] and sz[1] == grid_sz[1]:
+        out = cifft2(a)
+        if rescale:
+            out *= np.prod(sz)
+        return out
+
+    if sz[0] > grid_sz[0] or sz[1] > grid_sz[1]:
+        raise ValueError(
+            "Only grid sizes that are smaller than the Fourier series size are supported."
+        )
+
+    tot_pad = (grid_sz - sz).tolist()
+    is_even = [s % 2 == 0 for s in sz]
+
+    # Compute paddings
+    pad_top = int((tot_pad[0] + 1) / 2) if is_even[0] else int(tot_pad[0] / 2)
+    pad_bottom = int(tot_pad[0] - pad_top)
+    pad_right = int((tot_pad[1] + 1) / 2)
+
+    shape = a.shape[:2] + (a.shape[2] + pad_top + pad_bottom,
+                           a.shape[3] + pad_right)
+    padded = _pad_buffer(shape, a.shape[2:], pad_top)
+    padded[:, :, pad_top:pad_top + a.shape[2], :a.shape[3]] = a
+
+    out = cifft2(padded, signal_sizes=grid_sz.astype('long').tolist())
+    if rescale:
+        out *= np.prod(grid_sz)
+    return out
+
+
+@functools.lru_cache(maxsize=64)
+def _shift_phase(sz, shift):
+    ky, kx = get_frequency_coord(sz)
+    return complex_native.exp_imag(shift[0] * ky) * complex_native.exp_imag(
+        shift[1] * kx)
+
+
+@tensor_operation
+def shift_fs(a: np.array, shift: np.array):
+    """Shift a sample a in the Fourier domain. The shift is done in place.
+    Params:
+        a : The fourier coefficiens of the sample.
+        shift : The shift to be performed normalized to the range [-pi, pi]."""
+
+    if a.ndim != 4:
+        raise ValueError(
+            'a must be the Fourier coefficients, a 4-dimensional complex tensor.'
+        )
+
+    if shift[0] == 0 and shift[1] == 0:
+        return a
+
+    a *= _shift_phase((a.shape[2], 2 * a.shape[3] - 1),
+                      (float(shift[0]), float(shift[1])))
+    return a
+
+
+def sum_fs(a: TensorList, out=None) -> np.array:
+    """Sum a list of Fourier series expansions."""
+
+    s = None
+    mid = None
+
+    for e in sorted(a, key=lambda elem: elem.shape[-2], reverse=True):
+        if s is None:
+            if out is None:
+                s = e.copy()
+            else:
+                s = out
+                s[...] = e
+            mid = int((s.shape[-2] - 1) / 2)
+        else:
+            # Compute coordinates
+            top = mid - int((e.shape[-2] - 1) / 2)
+            bottom = mid + int(e.shape[-2] / 2) + 1
+            right = e.shape[-1]
+
+            # Add the data
+            s[..., top:bottom, :right] += e
+
+    return s
+
+
+@tensor_operation
+def inner_prod_fs(a: np.array, b: np.array):
+    if complex_native.is_complex(a) and complex_native.is_complex(b):
+        # real part of <a, b> over the full (hermitian) spectrum
+        ab = np.vdot(b, a).real
+        return 2 * ab - np.vdot(b[:, :, :, 0], a[:, :, :, 0]).real
+    elif complex_native.is_real(a) and complex_native.is_real(b):
+        return 2 * (a.flatten() @b.flatten()
+                    ) - a[:, :, :, 0].flatten() @b[:, :, :, 0].flatten()
+    else:
+        raise NotImplementedError('Not implemented for mixed real and complex.')
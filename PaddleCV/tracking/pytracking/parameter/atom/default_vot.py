@@ -58,6 +58,7 @@ def parameters():
         [1], dtype='float32'
     )  # What scales to use for localization (only one scale if IoUNet is used)
     params.score_upsample_factor = 1  # How much Fourier upsampling to use
+    params.fourier_backend = 'native'  # Keep spectra as complex64 arrays ('native') or as real arrays with a complex dimension ('real')
 
     # Init data augmentation parameters
     params.augmentation = {
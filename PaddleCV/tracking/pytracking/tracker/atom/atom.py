@@ -7,7 +7,7 @@ from paddle import fluid
 from paddle.fluid import layers
 
 from pytracking.features import augmentation
-from pytracking.libs import dcf, operation, fourier
+from pytracking.libs import dcf, operation, fourier, fourier_native
 from pytracking.libs.optimization import ConjugateGradient, GaussNewtonCG, GradientDescentL2
 from pytracking.libs.paddle_utils import mod, n2p, \
     leaky_relu, dropout2d
@@ -38,6 +38,15 @@ class ATOM(BaseTracker):
         # Get feature specific params
         self.fparams = self.params.features.get_fparams('feature_params')
 
+        # Complex64 spectra ('native') or real arrays with a trailing complex dimension ('real')
+        fourier_backend = getattr(self.params, 'fourier_backend', 'native')
+        if fourier_backend == 'native':
+            self.fourier = fourier_native
+        elif fourier_backend == 'real':
+            self.fourier = fourier
+        else:
+            raise ValueError('Unknown fourier backend')
+
         self.time = 0
         tic = time.time()
 
@@ -296,14 +305,14 @@ class ATOM(BaseTracker):
         # Weighted sum (if multiple features) with interpolation in fourier domain
         weight = self.fparams.attribute('translation_weight', 1.0)
         scores_raw = weight * scores_raw
-        sf_weighted = fourier.cfft2(scores_raw) / (scores_raw.size(2) *
-                                                   scores_raw.size(3))
+        sf_weighted = self.fourier.cfft2(scores_raw)
+        sf_weighted /= scores_raw.size(2) * scores_raw.size(3)
         for i, (sz, ksz) in enumerate(zip(self.feature_sz, self.kernel_size)):
-            sf_weighted[i] = fourier.shift_fs(sf_weighted[i], math.pi * (
+            sf_weighted[i] = self.fourier.shift_fs(sf_weighted[i], math.pi * (
                 1 - np.array([ksz[0] % 2, ksz[1] % 2]) / sz))
 
-        scores_fs = fourier.sum_fs(sf_weighted)
-        scores = fourier.sample_fs(scores_fs, self.output_sz)
+        scores_fs = self.fourier.sum_fs(sf_weighted)
+        scores = self.fourier.sample_fs(scores_fs, self.output_sz)
 
         if self.output_window is not None and not getattr(
                 self.params, 'perform_hn_without_windowing', False):
@@ -0,0 +1,77 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+import sys
+import time
+import glob
+import random
+import argparse
+import cv2
+from PIL import Image
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../..'))
+from reader.kinetics_reader import mp4_loader, sample_frame_indices
+
+# example command line:
+# python benchmark_mp4_loader.py --video_dir /path/to/mp4s --seg_num 8 --seglen 1
+
+
+def full_decode_loader(filepath, nsample, seglen, mode):
+    """the former mp4_loader: decode every frame, then keep the sampled ones"""
+    cap = cv2.VideoCapture(filepath)
+    videolen = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    sampledFrames = []
+    for i in range(videolen):
+        ret, frame = cap.read()
+        if ret == False:
+            continue
+        sampledFrames.append(frame[:, :, ::-1])
+    cap.release()
+    indices = sample_frame_indices(len(sampledFrames), nsample, seglen, mode)
+    return [
+        Image.fromarray(sampledFrames[idx], mode='RGB') for idx in indices
+    ]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('benchmark mp4 frame decoding')
+    parser.add_argument('--video_dir', type=str, required=True)
+    parser.add_argument('--seg_num', type=int, default=8)
+    parser.add_argument('--seglen', type=int, default=1)
+    parser.add_argument('--mode', type=str, default='test')
+    parser.add_argument('--max_videos', type=int, default=100)
+    return parser.parse_args()
+
+
+def run(name, loader, files, args):
+    random.seed(0)
+    start = time.time()
+    for f in files:
+        imgs = loader(f, args.seg_num, args.seglen, args.mode)
+        assert len(imgs) == args.seg_num * args.seglen, f
+    cost = time.time() - start
+    print('{}: {} clips in {:.2f}s, {:.2f} clips/sec'.format(
+        name, len(files), cost, len(files) / cost))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    files = sorted(glob.glob(os.path.join(args.video_dir, '*.mp4')))
+    files = files[:args.max_videos]
+    run('full decode', full_decode_loader, files, args)
+    run('grab only',
+        lambda *a: mp4_loader(*a, seek=False), files, args)
+    run('seek', lambda *a: mp4_loader(*a, seek=True), files, args)
@@ -0,0 +1,51 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+import sys
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+sys.path.insert(0,
+                os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)), '../../../reader'))
+from frame_store import FrameStoreWriter
+
+# pack the pkl files of a list generated by video2pkl.py into one frame store
+# example command line: python pkl2pack.py train.list train.npz
+# the frames are written to train.bin next to train.npz, set the filelist
+# of the config to train.npz and format to "pack"
+
+assert (len(sys.argv) == 3)
+
+python_ver = sys.version_info
+writer = FrameStoreWriter(sys.argv[2])
+with open(sys.argv[1]) as flist:
+    pickle_paths = [line.strip() for line in flist if line.strip()]
+
+for i, pickle_path in enumerate(pickle_paths):
+    with open(pickle_path, 'rb') as f:
+        if python_ver < (3, 0):
+            vid, label, frames = pickle.load(f)
+        else:
+            vid, label, frames = pickle.load(f, encoding='bytes')
+    if isinstance(vid, bytes):
+        vid = vid.decode('utf-8')
+    writer.add(vid, label, frames)
+    if (i + 1) % 1000 == 0:
+        print("packed {} / {} videos".format(i + 1, len(pickle_paths)))
+writer.close()
+print("packed {} videos into {}".format(len(pickle_paths), sys.argv[2]))
@@ -0,0 +1,51 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+import sys
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+sys.path.insert(0,
+                os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)), '../../../reader'))
+from feature_store import FeatureStoreWriter
+
+# convert the pkl files of a list generated by tf2pkl.py into one feature store
+# example command line: python pkl2store.py train.list ./store/train
+# set the filelist of the config to ./store/train and format to "store"
+
+assert (len(sys.argv) == 3)
+
+python_ver = sys.version_info
+writer = FeatureStoreWriter(sys.argv[2])
+with open(sys.argv[1]) as flist:
+    pickle_paths = [line.strip() for line in flist if line.strip()]
+
+num_videos = 0
+for i, pickle_path in enumerate(pickle_paths):
+    with open(pickle_path, 'rb') as f:
+        if python_ver < (3, 0):
+            data = pickle.load(f)
+        else:
+            data = pickle.load(f, encoding='bytes')
+    for record in data:
+        writer.add(record[b'video'], int(record[b'nframes']),
+                   record[b'feature'], record[b'audio'], record[b'label'])
+    num_videos += len(data)
+    print("converted {} / {} files".format(i + 1, len(pickle_paths)))
+writer.close()
+print("saved {} videos into {}".format(num_videos, sys.argv[2]))
@@ -32,14 +32,13 @@ class MetricsCalculator():
         self.anno_file = cfg["MODEL"]["anno_file"]
         self.file_list = cfg["INFER"]["filelist"]
         self.get_dataset_dict()
-        self.cols = ["xmin", "xmax", "score"]
-        self.snippet_xmins = [1.0 / self.tscale * i for i in range(self.tscale)]
-        self.snippet_xmaxs = [
-            1.0 / self.tscale * i for i in range(1, self.tscale + 1)
-        ]
+        self.snippet_xmins = np.array(
+            [1.0 / self.tscale * i for i in range(self.tscale)])
+        self.snippet_xmaxs = np.array(
+            [1.0 / self.tscale * i for i in range(1, self.tscale + 1)])
         if self.mode == "test" or self.mode == "infer":
-            self.output_path = cfg[self.mode.upper()]["output_path"]
             self.result_path = cfg[self.mode.upper()]["result_path"]
+            self.pp_num = cfg[self.mode.upper()].get("pp_num", 12)
         self.reset()
 
     def get_dataset_dict(self):
@@ -65,9 +64,7 @@ class MetricsCalculator():
         self.aggr_pem_reg_loss = 0.0
         self.aggr_pem_cls_loss = 0.0
         self.aggr_batch_size = 0
-        if self.mode == 'test' or self.mode == "infer":
-            if not os.path.exists(self.output_path):
-                os.makedirs(self.output_path)
+        self.proposals = {}
 
     def gen_props(self, pred_bm, pred_start, pred_end, fid):
         video_name = self.video_list[fid]
@@ -76,25 +73,17 @@ class MetricsCalculator():
         start_mask[0] = 1.
         end_mask = boundary_choose(pred_end)
         end_mask[-1] = 1.
-        score_vector_list = []
-        for idx in range(self.dscale):
-            for jdx in range(self.tscale):
-                start_index = jdx
-                end_index = start_index + idx
-                if end_index < self.tscale and start_mask[
-                        start_index] == 1 and end_mask[end_index] == 1:
-                    xmin = self.snippet_xmins[start_index]
-                    xmax = self.snippet_xmaxs[end_index]
-                    xmin_score = pred_start[start_index]
-                    xmax_score = pred_end[end_index]
-                    bm_score = pred_bm[idx, jdx]
-                    conf_score = xmin_score * xmax_score * bm_score
-                    score_vector_list.append([xmin, xmax, conf_score])
-
-        score_vector_list = np.stack(score_vector_list)
-        video_df = pd.DataFrame(score_vector_list, columns=self.cols)
-        video_df.to_csv(
-            os.path.join(self.output_path, "%s.csv" % video_name), index=False)
+        # proposal (idx, jdx) starts at jdx and ends at jdx + idx
+        start_index = np.arange(self.tscale)[None, :]
+        end_index = start_index + np.arange(self.dscale)[:, None]
+        valid = (end_index < self.tscale) & (start_mask[start_index] == 1)
+        valid[valid] = end_mask[end_index[valid]] == 1
+        idx, jdx = np.nonzero(valid)
+        end_index = jdx + idx
+        xmin = self.snippet_xmins[jdx]
+        xmax = self.snippet_xmaxs[end_index]
+        conf_score = pred_start[jdx] * pred_end[end_index] * pred_bm[idx, jdx]
+        self.proposals[video_name] = np.stack([xmin, xmax, conf_score], axis=1)
 
     def accumulate(self, fetch_list):
         cur_batch_size = 1  # iteration counter,for test and inference, batch_size=1
@@ -129,12 +118,12 @@ class MetricsCalculator():
         self.avg_pem_reg_loss = self.aggr_pem_reg_loss / self.aggr_batch_size
         self.avg_pem_cls_loss = self.aggr_pem_cls_loss / self.aggr_batch_size
         if self.mode == 'test':
-            bmn_post_processing(self.video_dict, self.subset, self.output_path,
-                                self.result_path)
+            bmn_post_processing(self.video_dict, self.subset, self.proposals,
+                                self.result_path, self.pp_num)
 
     def finalize_infer_metrics(self):
-        bmn_post_processing(self.video_dict, self.subset, self.output_path,
-                            self.result_path)
+        bmn_post_processing(self.video_dict, self.subset, self.proposals,
+                            self.result_path, self.pp_num)
 
     def get_computed_metrics(self):
         json_stats = {}
@@ -32,8 +32,8 @@ class MetricsCalculator():
         self.file_list = cfg["INFER"]["filelist"]
         self.get_dataset_dict()
         if self.mode == "test" or self.mode == "infer":
-            self.output_path_pem = cfg[self.mode.upper()]["output_path_pem"]
             self.result_path_pem = cfg[self.mode.upper()]["result_path_pem"]
+            self.pp_num = cfg[self.mode.upper()].get("pp_num", 12)
         self.reset()
 
     def get_dataset_dict(self):
@@ -56,24 +56,17 @@ class MetricsCalculator():
         logger.info('Resetting {} metrics...'.format(self.mode))
         self.aggr_loss = 0.0
         self.aggr_batch_size = 0
-        if self.mode == 'test' or self.mode == 'infer':
-            if not os.path.exists(self.output_path_pem):
-                os.makedirs(self.output_path_pem)
+        self.proposals = {}
 
     def save_results(self, pred_iou, props_info, fid):
         if self.mode == 'infer':
             video_name = self.video_list[fid[0]]
         else:
             video_name = self.video_list[fid[0][0]]
-        df = pd.DataFrame()
-        df["xmin"] = props_info[0, :, 0]
-        df["xmax"] = props_info[0, :, 1]
-        df["xmin_score"] = props_info[0, :, 2]
-        df["xmax_score"] = props_info[0, :, 3]
-        df["iou_score"] = pred_iou.squeeze()
-        df.to_csv(
-            os.path.join(self.output_path_pem, video_name + ".csv"),
-            index=False)
+        score = props_info[0, :, 2] * props_info[0, :, 3] * pred_iou.reshape(
+            [-1])
+        self.proposals[video_name] = np.stack(
+            [props_info[0, :, 0], props_info[0, :, 1], score], axis=1)
 
     def accumulate(self, fetch_list):
         cur_batch_size = 1  # iteration counter
@@ -97,12 +90,12 @@ class MetricsCalculator():
     def finalize_metrics(self):
         self.avg_loss = self.aggr_loss / self.aggr_batch_size
         if self.mode == 'test':
-            bsn_post_processing(self.video_dict, self.subset,
-                                self.output_path_pem, self.result_path_pem)
+            bsn_post_processing(self.video_dict, self.subset, self.proposals,
+                                self.result_path_pem, self.pp_num)
 
     def finalize_infer_metrics(self):
-        bsn_post_processing(self.video_dict, self.subset, self.output_path_pem,
-                            self.result_path_pem)
+        bsn_post_processing(self.video_dict, self.subset, self.proposals,
+                            self.result_path_pem, self.pp_num)
 
     def get_computed_metrics(self):
         json_stats = {}
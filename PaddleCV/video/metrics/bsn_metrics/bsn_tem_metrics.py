@@ -16,7 +16,7 @@ import datetime
 import logging
 import json
 import pandas as pd
-from models.bsn.bsn_utils import pgm_gen_proposal, pgm_gen_feature
+from models.bsn.bsn_utils import pgm_gen_store
 import time
 logger = logging.getLogger(__name__)
 import os
@@ -39,11 +39,7 @@ class MetricsCalculator():
             1.0 / self.tscale * i for i in range(1, self.tscale + 1)
         ]
         if self.mode == "test" or self.mode == "infer":
-            self.output_path_tem = cfg[self.mode.upper()]["output_path_tem"]
-            self.output_path_pgm_feature = cfg[self.mode.upper()][
-                "output_path_pgm_feature"]
-            self.output_path_pgm_proposal = cfg[self.mode.upper()][
-                "output_path_pgm_proposal"]
+            self.output_path_pgm = cfg[self.mode.upper()]["output_path_pgm"]
         self.reset()
 
     def get_dataset_dict(self):
@@ -91,13 +87,7 @@ class MetricsCalculator():
         self.aggr_end_loss = 0.0
         self.aggr_action_loss = 0.0
         self.aggr_batch_size = 0
-        if self.mode == 'test' or self.mode == 'infer':
-            if not os.path.exists(self.output_path_tem):
-                os.makedirs(self.output_path_tem)
-            if not os.path.exists(self.output_path_pgm_feature):
-                os.makedirs(self.output_path_pgm_feature)
-            if not os.path.exists(self.output_path_pgm_proposal):
-                os.makedirs(self.output_path_pgm_proposal)
+        self.tem_results = {}
 
     def save_results(self, pred_tem, fid):
         batch_size = pred_tem.shape[0]
@@ -106,15 +96,8 @@ class MetricsCalculator():
                 video_name = self.video_list[fid[i][0]]
             elif self.mode == 'infer':
                 video_name = self.video_list[fid[i]]
-            pred_start = pred_tem[i, 0, :]
-            pred_end = pred_tem[i, 1, :]
-            pred_action = pred_tem[i, 2, :]
-            output_tem = np.stack([pred_start, pred_end, pred_action], axis=1)
-            video_df = pd.DataFrame(
-                output_tem, columns=["start", "end", "action"])
-            video_df.to_csv(
-                os.path.join(self.output_path_tem, video_name + ".csv"),
-                index=False)
+            # [tscale, 3] of start, end, action
+            self.tem_results[video_name] = pred_tem[i].T.copy()
 
     def accumulate(self, fetch_list):
         cur_batch_size = 1  # iteration counter
@@ -145,28 +128,18 @@ class MetricsCalculator():
         self.avg_end_loss = self.aggr_end_loss / self.aggr_batch_size
         self.avg_action_loss = self.aggr_action_loss / self.aggr_batch_size
         if self.mode == 'test':
-            print("start generate proposals of %s subset" % self.subset)
-            pgm_gen_proposal(self.video_dict, self.pgm_config,
-                             self.output_path_tem,
-                             self.output_path_pgm_proposal)
-            print("finish generate proposals of %s subset" % self.subset)
-            print("start generate proposals feature of %s subset" % self.subset)
-            pgm_gen_feature(self.video_dict, self.pgm_config,
-                            self.output_path_tem, self.output_path_pgm_proposal,
-                            self.output_path_pgm_feature)
-            print("finish generate proposals feature of %s subset" %
-                  self.subset)
+            self.gen_pgm()
 
     def finalize_infer_metrics(self):
-        print("start generate proposals of %s subset" % self.subset)
-        pgm_gen_proposal(self.video_dict, self.pgm_config, self.output_path_tem,
-                         self.output_path_pgm_proposal)
-        print("finish generate proposals of %s subset" % self.subset)
-        print("start generate proposals feature of %s subset" % self.subset)
-        pgm_gen_feature(self.video_dict, self.pgm_config, self.output_path_tem,
-                        self.output_path_pgm_proposal,
-                        self.output_path_pgm_feature)
-        print("finish generate proposals feature of %s subset" % self.subset)
+        self.gen_pgm()
+
+    def gen_pgm(self):
+        print("start generate proposals and features of %s subset" %
+              self.subset)
+        pgm_gen_store(self.video_dict, self.pgm_config, self.tem_results,
+                      self.output_path_pgm)
+        print("finish generate proposals and features of %s subset" %
+              self.subset)
 
     def get_computed_metrics(self):
         json_stats = {}
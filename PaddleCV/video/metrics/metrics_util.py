@@ -17,6 +17,7 @@ from __future__ import unicode_literals
 from __future__ import print_function
 from __future__ import division
 
+import os
 import logging
 
 import numpy as np
@@ -127,6 +128,10 @@ class Kinetics400Metrics(Metrics):
             self.infer_results = []
             self.kinetics_labels = metrics_args['INFER']['kinetics_labels']
             self.labels_list = json.load(open(self.kinetics_labels))
+            # sliding windows of a single long video, see KineticsReader
+            self.stream = metrics_args['INFER'].get('window_size', 0) > 0 and \
+                    metrics_args['INFER'].get('video_path', '') != ''
+            self.window_results = []
 
     def calculate_and_log_out(self, fetch_list, info=''):
         if len(fetch_list) == 3:
@@ -153,6 +158,8 @@ class Kinetics400Metrics(Metrics):
                 preds = predictions[i][topk_inds]
                 self.infer_results.append(
                     (video_id[i], topk_inds.tolist(), preds.tolist()))
+                if self.stream:
+                    self.window_results.append((video_id[i], predictions[i]))
         else:
             if len(fetch_list) == 3:
                 loss = fetch_list[0]
@@ -174,6 +181,8 @@ class Kinetics400Metrics(Metrics):
                     logger.info('\t    class: {},  probability:  {} \n'.format(
                         self.labels_list[item[1][i]], item[2][i]))
             # save infer results
+            if self.stream and len(self.window_results) > 0:
+                self.save_window_results(savedir)
         else:
             self.calculator.finalize_metrics()
             metrics_dict = self.calculator.get_computed_metrics()
@@ -183,10 +192,44 @@ class Kinetics400Metrics(Metrics):
             logger.info(info + '\tLoss: {},\ttop1_acc: {}, \ttop5_acc: {}'.format('%.6f' % loss, \
                        '%.2f' % acc1, '%.2f' % acc5))
 
+    def save_window_results(self, savedir):
+        """
+        save the scores of every window and a per-frame score track, the mean
+        score of the windows covering each frame, of the streamed video
+        """
+        video_path = self.window_results[0][0][0]
+        windows = np.array([item[0][1:] for item in self.window_results])
+        scores = np.stack([item[1] for item in self.window_results])
+        # add the scores of each window to its frames [start, end) by a
+        # cumulative sum over the score changes at the window borders
+        nframes = windows[:, 1].max()
+        delta = np.zeros((nframes + 1, scores.shape[1]), dtype=np.float64)
+        np.add.at(delta, windows[:, 0], scores)
+        np.subtract.at(delta, windows[:, 1], scores)
+        count = np.zeros(nframes + 1, dtype=np.int64)
+        np.add.at(count, windows[:, 0], 1)
+        np.subtract.at(count, windows[:, 1], 1)
+        track = np.cumsum(delta, axis=0)[:-1] / np.maximum(
+            np.cumsum(count)[:-1], 1)[:, None]
+
+        if not os.path.isdir(savedir):
+            os.makedirs(savedir)
+        save_file = os.path.join(
+            savedir,
+            os.path.splitext(os.path.basename(video_path))[0] + '_stream.npz')
+        np.savez(
+            save_file,
+            windows=windows,
+            scores=scores,
+            track=track.astype(np.float32))
+        logger.info('save scores of {} windows and score track of {} frames '
+                    'to {}'.format(len(windows), nframes, save_file))
+
     def reset(self):
         self.calculator.reset()
         if self.mode == 'infer':
             self.infer_results = []
+            self.window_results = []
 
 
 class MulticropMetrics(Metrics):
@@ -203,6 +246,9 @@ class MulticropMetrics(Metrics):
                 'checkpoint_dir']
             args['num_classes'] = metrics_args.MODEL.num_classes
             args['labels_list'] = metrics_args.INFER.kinetics_labels
+            args['checkpoint_interval'] = metrics_args[mode.upper()].get(
+                'checkpoint_interval', 0)
+            args['resume'] = metrics_args[mode.upper()].get('resume', False)
             self.calculator = multicrop_test_metrics.MetricsCalculator(
                 name, mode.lower(), **args)
         else:
@@ -38,6 +38,10 @@ class MetricsCalculator():
                         filename_gt,    a file with each line stores the groud truth of each video
                         checkpoint_dir, dir where to store the test results
                         num_classes,    number of classes of the dataset
+                        checkpoint_interval, save partial test results every
+                                        checkpoint_interval batches, 0 to disable
+                        resume,         restore partial test results saved in
+                                        checkpoint_dir before testing
         """
         self.name = name
         self.mode = mode  # 'train', 'val', 'test'
@@ -49,7 +53,20 @@ class MetricsCalculator():
         self.checkpoint_dir = metrics_args['checkpoint_dir']
         self.num_classes = metrics_args['num_classes']
         self.labels_list = json.load(open(metrics_args['labels_list']))
+        self.checkpoint_interval = metrics_args.get('checkpoint_interval', 0)
+        self.resume = metrics_args.get('resume', False)
+        self.checkpoint_file = get_checkpoint_file(self.checkpoint_dir,
+                                                   self.name)
+        if self.mode == 'test' and self.filename_gt is not None:
+            self.gt_labels = np.array(read_groundtruth(self.filename_gt))
+            assert (len(self.gt_labels) == self.dataset_size), \
+                    "the number of gt_labels({}) should be the same with sample_num({})".format(
+                        len(self.gt_labels), self.dataset_size)
+        else:
+            self.gt_labels = None
         self.reset()
+        if self.mode == 'test' and self.resume:
+            self.load_checkpoint()
 
     def reset(self):
         logger.info('Resetting {} metrics...'.format(self.mode))
@@ -57,50 +74,127 @@ class MetricsCalculator():
         self.aggr_acc5 = 0.0
         self.aggr_loss = 0.0
         self.aggr_batch_size = 0
-        self.seen_inds = defaultdict(int)
-        self.results = []
+        if self.mode == 'test':
+            # clip scores are summed per video into preallocated arrays, the
+            # clip accuracies are also kept per video so that unfinished
+            # videos can be dropped from a checkpoint
+            self.probs = np.zeros(
+                (self.dataset_size, self.num_classes), dtype=np.float32)
+            self.counts = np.zeros(self.dataset_size, dtype=np.int32)
+            self.clip_correct = np.zeros(self.dataset_size, dtype=np.int32)
+            self.clip1_correct = np.zeros(self.dataset_size, dtype=np.int32)
+        else:
+            self.seen_inds = defaultdict(int)
+            self.infer_probs = {}
 
     def calculate_metrics(self, loss, pred, labels):
         pass
 
     def accumulate(self, pred, labels):
-        labels = labels.astype(int)
-        labels = labels[:, 0]
-        for i in range(pred.shape[0]):
-            probs = pred[i, :].tolist()
-            vid = labels[i]
-            self.seen_inds[vid] += 1
-            if self.seen_inds[vid] > self.num_test_clips:
-                logger.warning('Video id {} have been seen. Skip.'.format(vid,
-                                                                          ))
-                continue
-            save_pairs = [vid, probs]
-            self.results.append(save_pairs)
-            logger.info("({0} / {1}) videos".format(\
-                        len(self.seen_inds), self.dataset_size))
+        pred = np.asarray(pred)[:, :self.num_classes]
+        vids = np.asarray(labels).astype(int)[:, 0]
+        # order of every clip among the clips of its video seen so far
+        order = np.argsort(vids, kind='mergesort')
+        sorted_vids = vids[order]
+        first = np.searchsorted(sorted_vids, sorted_vids)
+        clip_index = np.empty_like(vids)
+        clip_index[order] = np.arange(len(vids)) - first
+        clip_index += self.counts[vids]
+
+        keep = clip_index < self.num_test_clips
+        for vid in np.unique(vids[~keep]):
+            logger.warning('Video id {} have been seen. Skip.'.format(vid))
+        vids = vids[keep]
+        pred = pred[keep]
+        clip_index = clip_index[keep]
+
+        np.add.at(self.probs, vids, pred)
+        self.counts += np.bincount(
+            vids, minlength=self.dataset_size).astype(np.int32)
+        if self.gt_labels is not None:
+            correct = pred.argmax(axis=1) == self.gt_labels[vids]
+            np.add.at(self.clip_correct, vids, correct)
+            self.clip1_correct[vids[(clip_index == 0) & correct]] = 1
+
+        self.aggr_batch_size += 1
+        logger.info("({0} / {1}) videos".format(
+            np.count_nonzero(self.counts), self.dataset_size))
+        if self.checkpoint_interval > 0 and \
+                self.aggr_batch_size % self.checkpoint_interval == 0:
+            self.save_checkpoint()
 
     def accumulate_infer_results(self, pred, labels):
         for i in range(pred.shape[0]):
             vid = labels[i][0]
-            probs = pred[i, :].tolist()
             self.seen_inds[vid] += 1
             if self.seen_inds[vid] > self.num_test_clips:
                 logger.warning('Video id {} have been seen. Skip.'.format(vid,
                                                                           ))
                 continue
-            save_pairs = [vid, probs]
-            self.results.append(save_pairs)
+            if vid in self.infer_probs:
+                self.infer_probs[vid] += pred[i]
+            else:
+                self.infer_probs[vid] = np.array(pred[i], dtype=np.float64)
+
+    def save_checkpoint(self):
+        if not os.path.isdir(self.checkpoint_dir):
+            os.makedirs(self.checkpoint_dir)
+        tmp_file = self.checkpoint_file + '.tmp.npz'
+        np.savez(
+            tmp_file,
+            probs=self.probs,
+            counts=self.counts,
+            clip_correct=self.clip_correct,
+            clip1_correct=self.clip1_correct)
+        os.rename(tmp_file, self.checkpoint_file)
+        logger.info('Save partial test results of {} videos to {}'.format(
+            np.count_nonzero(self.counts), self.checkpoint_file))
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file):
+            logger.info('No partial test results found in {}'.format(
+                self.checkpoint_file))
+            return
+        data = np.load(self.checkpoint_file)
+        assert data['probs'].shape == self.probs.shape, \
+                "shape of partial test results {} mismatch [{}, {}]".format(
+                    data['probs'].shape, self.dataset_size, self.num_classes)
+        # the reader tests unfinished videos again from their first clip
+        finished = data['counts'] >= self.num_test_clips
+        self.probs[finished] = data['probs'][finished]
+        self.counts[finished] = data['counts'][finished]
+        self.clip_correct[finished] = data['clip_correct'][finished]
+        self.clip1_correct[finished] = data['clip1_correct'][finished]
+        logger.info('Resume from partial test results of {} videos'.format(
+            np.count_nonzero(finished)))
 
     def finalize_metrics(self):
+        if self.checkpoint_interval > 0:
+            self.save_checkpoint()
         if self.filename_gt is not None:
-            evaluate_results(self.results, self.filename_gt, self.dataset_size, \
-                             self.num_classes, self.num_test_clips)
+            evaluate_results(self.probs, self.counts, self.clip_correct,
+                             self.clip1_correct, self.gt_labels,
+                             self.num_test_clips)
 
     def finalize_infer_metrics(self):
-        evaluate_infer_results(self.results, self.num_classes,
+        evaluate_infer_results(self.infer_probs, self.seen_inds,
                                self.num_test_clips, self.labels_list)
 
 
+def get_checkpoint_file(checkpoint_dir, name):
+    return os.path.join(checkpoint_dir,
+                        '{}_test_results.npz'.format(name.lower()))
+
+
+def get_finished_videos(checkpoint_dir, name, num_test_clips):
+    """ids of the videos with all clips tested in the saved partial results"""
+    checkpoint_file = get_checkpoint_file(checkpoint_dir, name)
+    if not os.path.exists(checkpoint_file):
+        return set()
+    counts = np.load(checkpoint_file)['counts']
+    return set(np.nonzero(counts >= num_test_clips)[0].tolist())
+
+
 def read_groundtruth(filename_gt):
     f = open(filename_gt, 'r')
     labels = []
@@ -111,59 +205,31 @@ def read_groundtruth(filename_gt):
     return labels
 
 
-def evaluate_results(results, filename_gt, test_dataset_size, num_classes,
+def evaluate_results(probs, counts, clip_correct, clip1_correct, gt_labels,
                      num_test_clips):
-    gt_labels = read_groundtruth(filename_gt)
-    sample_num = test_dataset_size
-    class_num = num_classes
-    sample_video_times = num_test_clips
-    counts = np.zeros(sample_num, dtype=np.int32)
-    probs = np.zeros((sample_num, class_num))
-
-    assert (len(gt_labels) == sample_num), \
-             "the number of gt_labels({}) should be the same with sample_num({})".format(
-                         len(gt_labels), sample_num)
+    """
+    probs:         [sample_num, class_num] summed clip scores of every video
+    counts:        number of clips of every video
+    clip_correct:  number of correctly classified clips of every video
+    clip1_correct: whether the 1st clip of every video is correct
+    """
+    sample_num = len(counts)
     """
     clip_accuracy: the (e.g.) 10*19761 clips' average accuracy
     clip1_accuracy: the 1st clip's accuracy (starting from frame 0)
     """
-    clip_accuracy = 0
-    clip1_accuracy = 0
-    clip1_count = 0
-    seen_inds = defaultdict(int)
-
-    # evaluate
-    for entry in results:
-        vid = entry[0]
-        prob = np.array(entry[1])
-        probs[vid] += prob[0:class_num]
-        counts[vid] += 1
-
-        idx = prob.argmax()
-        if idx == gt_labels[vid]:
-            # clip accuracy
-            clip_accuracy += 1
-
-        # clip1 accuracy
-        seen_inds[vid] += 1
-        if seen_inds[vid] == 1:
-            clip1_count += 1
-            if idx == gt_labels[vid]:
-                clip1_accuracy += 1
-
-    # sanity checkcnt = 0
-    max_clips = 0
-    min_clips = sys.maxsize
-    count_empty = 0
-    count_corrupted = 0
-    for i in range(sample_num):
-        max_clips = max(max_clips, counts[i])
-        min_clips = min(min_clips, counts[i])
-        if counts[i] != sample_video_times:
-            count_corrupted += 1
-            logger.warning('Id: {} count: {}'.format(i, counts[i]))
-        if counts[i] == 0:
-            count_empty += 1
+    clip_count = int(counts.sum())
+    clip_accuracy = int(clip_correct.sum())
+    clip1_count = int(np.count_nonzero(counts))
+    clip1_accuracy = int(clip1_correct.sum())
+
+    # sanity check
+    for i in np.nonzero(counts != num_test_clips)[0]:
+        logger.warning('Id: {} count: {}'.format(i, counts[i]))
+    count_empty = int(np.sum(counts == 0))
+    count_corrupted = int(np.sum(counts != num_test_clips))
+    max_clips = counts.max() if sample_num > 0 else 0
+    min_clips = counts.min() if sample_num > 0 else sys.maxsize
 
     logger.info('Num of empty videos: {}'.format(count_empty))
     logger.info('Num of corrupted videos: {}'.format(count_corrupted))
@@ -176,24 +242,14 @@ def evaluate_results(results, filename_gt, test_dataset_size, num_classes,
 
     # clip accuracy for sanity
     logger.info('Clip accuracy: {:.2f} percent ({}/{})'.format(
-        100. * clip_accuracy / len(results), clip_accuracy, len(results)))
+        100. * clip_accuracy / clip_count, clip_accuracy, clip_count))
 
-    # compute accuracy
-    accuracy = 0
-    accuracy_top5 = 0
-    for i in range(sample_num):
-        prob = probs[i]
-
-        # top-1
-        idx = prob.argmax()
-        if idx == gt_labels[i] and counts[i] > 0:
-            accuracy = accuracy + 1
-
-        ids = np.argsort(prob)[::-1]
-        for j in range(5):
-            if ids[j] == gt_labels[i] and counts[i] > 0:
-                accuracy_top5 = accuracy_top5 + 1
-                break
+    # compute accuracy, videos without any clip count as wrong
+    seen = counts > 0
+    gt_probs = probs[np.arange(sample_num), gt_labels]
+    rank = np.sum(probs > gt_probs[:, None], axis=1)
+    accuracy = np.sum(seen & (probs.argmax(axis=1) == gt_labels))
+    accuracy_top5 = np.sum(seen & (rank < 5))
 
     accuracy = float(accuracy) / float(sample_num)
     accuracy_top5 = float(accuracy_top5) / float(sample_num)
@@ -206,25 +262,11 @@ def evaluate_results(results, filename_gt, test_dataset_size, num_classes,
     return
 
 
-def evaluate_infer_results(results, num_classes, num_test_clips, labels_list):
-    probs = {}
-    counts = {}
-    for entry in results:
-        vid = entry[0]
-        pred = entry[1]
-        if vid in probs.keys():
-            assert vid in counts.keys(
-            ), "If vid in probs, it should be in counts"
-            probs[vid] = (probs[vid] * counts[vid] + pred) / (counts[vid] + 1)
-            counts[vid] += 1
-        else:
-            probs[vid] = np.copy(pred)
-            counts[vid] = 1
-
+def evaluate_infer_results(probs, counts, num_test_clips, labels_list):
     topk = 20
 
     for vid in probs.keys():
-        pred = probs[vid]
+        pred = probs[vid] / min(counts[vid], num_test_clips)
         sorted_inds = np.argsort(pred)[::-1]
         topk_inds = sorted_inds[:topk]
         logger.info('video {}, topk({}) preds: \n'.format(vid, topk))
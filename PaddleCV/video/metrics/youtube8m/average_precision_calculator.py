@@ -50,12 +50,12 @@ ap3 = calculator.peek_ap_at_n()
 ```
 """
 
-import heapq
-import random
 import numbers
 
 import numpy
 
+INITIAL_CAPACITY = 1024
+
 
 class AveragePrecisionCalculator(object):
     """Calculate the average precision and average precision at n."""
@@ -77,12 +77,16 @@ class AveragePrecisionCalculator(object):
 
         self._top_n = top_n  # average precision at n
         self._total_positives = 0  # total number of positives have seen
-        self._heap = []  # max heap of (prediction, actual)
+        # buffers of (prediction, actual), only the first _size are valid;
+        # with top_n they are cut back to the top_n best when 2 * top_n full
+        self._size = 0
+        self._predictions = numpy.zeros(INITIAL_CAPACITY)
+        self._actuals = numpy.zeros(INITIAL_CAPACITY)
 
     @property
     def heap_size(self):
-        """Gets the heap size maintained in the class."""
-        return len(self._heap)
+        """Gets the number of predictions kept in the class."""
+        return self._size
 
     @property
     def num_accumulated_positives(self):
@@ -119,24 +123,40 @@ class AveragePrecisionCalculator(object):
                     "'num_positives' was provided but it wan't a nonzero number."
                 )
 
+        predictions = numpy.asarray(predictions, dtype=numpy.float64).ravel()
+        actuals = numpy.asarray(actuals, dtype=numpy.float64).ravel()
         if not num_positives is None:
             self._total_positives += num_positives
         else:
             self._total_positives += numpy.size(numpy.where(actuals > 0))
-        topk = self._top_n
-        heap = self._heap
 
-        for i in range(numpy.size(predictions)):
-            if topk is None or len(heap) < topk:
-                heapq.heappush(heap, (predictions[i], actuals[i]))
-            else:
-                if predictions[i] > heap[0][0]:  # heap[0] is the smallest
-                    heapq.heappop(heap)
-                    heapq.heappush(heap, (predictions[i], actuals[i]))
+        size = self._size + numpy.size(predictions)
+        if size > len(self._predictions):
+            self._predictions = self._grow(self._predictions, size)
+            self._actuals = self._grow(self._actuals, size)
+        self._predictions[self._size:size] = predictions
+        self._actuals[self._size:size] = actuals
+        self._size = size
+        if self._top_n and self._size >= 2 * self._top_n:
+            self._keep_top_n()
+
+    def _grow(self, buf, size):
+        new_buf = numpy.zeros(max(size, 2 * len(buf)))
+        new_buf[:self._size] = buf[:self._size]
+        return new_buf
+
+    def _keep_top_n(self):
+        """Drop all but the top_n largest predictions from the buffers."""
+        keep = numpy.argpartition(-self._predictions[:self._size],
+                                  self._top_n - 1)[:self._top_n]
+        keep.sort()
+        self._predictions[:self._top_n] = self._predictions[keep]
+        self._actuals[:self._top_n] = self._actuals[keep]
+        self._size = self._top_n
 
     def clear(self):
         """Clear the accumulated predictions."""
-        self._heap = []
+        self._size = 0
         self._total_positives = 0
 
     def peek_ap_at_n(self):
@@ -149,11 +169,10 @@ class AveragePrecisionCalculator(object):
     """
         if self.heap_size <= 0:
             return 0
-        predlists = numpy.array(list(zip(*self._heap)))
 
         ap = self.ap_at_n(
-            predlists[0],
-            predlists[1],
+            self._predictions[:self._size],
+            self._actuals[:self._size],
             n=self._top_n,
             total_num_positives=self._total_positives)
         return ap
@@ -219,8 +238,7 @@ class AveragePrecisionCalculator(object):
         # add a shuffler to avoid overestimating the ap
         predictions, actuals = AveragePrecisionCalculator._shuffle(predictions,
                                                                    actuals)
-        sortidx = sorted(
-            range(len(predictions)), key=lambda k: predictions[k], reverse=True)
+        sortidx = numpy.argsort(-predictions, kind='mergesort')
 
         if total_num_positives is None:
             numpos = numpy.size(numpy.where(actuals > 0))
@@ -233,22 +251,20 @@ class AveragePrecisionCalculator(object):
         if n is not None:
             numpos = min(numpos, n)
         delta_recall = 1.0 / numpos
-        poscount = 0.0
 
         # calculate the ap
         r = len(sortidx)
         if n is not None:
             r = min(r, n)
-        for i in range(r):
-            if actuals[sortidx[i]] > 0:
-                poscount += 1
-                ap += poscount / (i + 1) * delta_recall
-        return ap
+        hits = actuals[sortidx[:r]] > 0
+        poscount = numpy.cumsum(hits)
+        ap = numpy.sum(poscount[hits] /
+                       (numpy.arange(1, r + 1)[hits])) * delta_recall
+        return float(ap)
 
     @staticmethod
     def _shuffle(predictions, actuals):
-        random.seed(0)
-        suffidx = random.sample(range(len(predictions)), len(predictions))
+        suffidx = numpy.random.RandomState(0).permutation(len(predictions))
         predictions = predictions[suffidx]
         actuals = actuals[suffidx]
         return predictions, actuals
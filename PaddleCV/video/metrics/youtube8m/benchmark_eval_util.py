@@ -0,0 +1,131 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Benchmark of EvaluationMetrics at YouTube-8M scale against the former
+heap based accumulation, run from PaddleCV/video:
+
+    python -m metrics.youtube8m.benchmark_eval_util --num_batches 20
+"""
+
+import time
+import heapq
+import argparse
+import numpy
+
+from . import eval_util
+
+
+class HeapAPCalculator(object):
+    """the former AveragePrecisionCalculator, one heap push per prediction"""
+
+    def __init__(self):
+        self.heap = []
+        self.total_positives = 0
+
+    def accumulate(self, predictions, actuals, num_positives):
+        self.total_positives += float(num_positives)
+        for i in range(len(predictions)):
+            heapq.heappush(self.heap, (predictions[i], actuals[i]))
+
+    def peek_ap_at_n(self):
+        if len(self.heap) == 0 or self.total_positives == 0:
+            return 0
+        predictions, actuals = zip(*self.heap)
+        sortidx = sorted(
+            range(len(predictions)), key=lambda k: predictions[k], reverse=True)
+        ap = 0.0
+        poscount = 0.0
+        for i in range(len(sortidx)):
+            if actuals[sortidx[i]] > 0:
+                poscount += 1
+                ap += poscount / (i + 1) / self.total_positives
+        return ap
+
+
+def heap_accumulate(calculators, global_calculator, predictions, labels, k):
+    num_classes = predictions.shape[1]
+    out_predictions = [[] for _ in range(num_classes)]
+    out_labels = [[] for _ in range(num_classes)]
+    for video_index in range(predictions.shape[0]):
+        for index, prediction, label in eval_util.top_k_triplets(
+                predictions[video_index], labels[video_index], k):
+            out_predictions[index].append(prediction)
+            out_labels[index].append(label)
+    num_positives = [numpy.sum(labels[:, i]) for i in range(num_classes)]
+    for i in range(num_classes):
+        calculators[i].accumulate(out_predictions[i], out_labels[i],
+                                  num_positives[i])
+    global_calculator.accumulate(
+        eval_util.flatten(out_predictions),
+        eval_util.flatten(out_labels), sum(num_positives))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('benchmark youtube8m metrics')
+    parser.add_argument('--num_classes', type=int, default=3862)
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--num_batches', type=int, default=20)
+    parser.add_argument('--top_k', type=int, default=20)
+    parser.add_argument(
+        '--skip_reference',
+        action='store_true',
+        help='only time the array based metrics')
+    return parser.parse_args()
+
+
+def make_batches(args):
+    rng = numpy.random.RandomState(0)
+    batches = []
+    for _ in range(args.num_batches):
+        labels = (rng.rand(args.batch_size, args.num_classes) <
+                  3.0 / args.num_classes).astype('float32')
+        labels[numpy.arange(args.batch_size),
+               rng.randint(args.num_classes, size=args.batch_size)] = 1
+        predictions = numpy.clip(
+            rng.rand(args.batch_size, args.num_classes) * 0.5 + labels * 0.4,
+            0, 1).astype('float32')
+        batches.append((predictions, labels))
+    return batches
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    batches = make_batches(args)
+    loss = numpy.zeros(args.batch_size)
+
+    metrics = eval_util.EvaluationMetrics(args.num_classes, args.top_k)
+    start = time.time()
+    for predictions, labels in batches:
+        metrics.accumulate(loss, predictions, labels)
+    accumulate_cost = time.time() - start
+    result = metrics.get()
+    print('array: accumulate {:.3f}s/batch, get {:.3f}s, GAP {:.6f}, mAP {:.6f}'.
+          format(accumulate_cost / args.num_batches, time.time() - start -
+                 accumulate_cost, result['gap'], numpy.mean(result['aps'])))
+
+    if not args.skip_reference:
+        calculators = [HeapAPCalculator() for _ in range(args.num_classes)]
+        global_calculator = HeapAPCalculator()
+        start = time.time()
+        for predictions, labels in batches:
+            heap_accumulate(calculators, global_calculator, predictions,
+                            labels, args.top_k)
+        accumulate_cost = time.time() - start
+        gap = global_calculator.peek_ap_at_n()
+        aps = [c.peek_ap_at_n() for c in calculators]
+        print('heap:  accumulate {:.3f}s/batch, get {:.3f}s, GAP {:.6f}, mAP {:.6f}'.
+              format(accumulate_cost / args.num_batches, time.time() - start -
+                     accumulate_cost, gap, numpy.mean(aps)))
+        print('max abs diff: GAP {:.2e}, AP {:.2e}'.format(
+            abs(gap - result['gap']),
+            numpy.max(numpy.abs(numpy.array(aps) - result['aps']))))
@@ -53,19 +53,25 @@ def calculate_precision_at_equal_recall_rate(predictions, actuals):
   Returns:
     float: The average precision at equal recall rate across the entire batch.
   """
-    aggregated_precision = 0.0
-    num_videos = actuals.shape[0]
-    for row in numpy.arange(num_videos):
-        num_labels = int(numpy.sum(actuals[row]))
-        top_indices = numpy.argpartition(predictions[row],
-                                         -num_labels)[-num_labels:]
-        item_precision = 0.0
-        for label_index in top_indices:
-            if predictions[row][label_index] > 0:
-                item_precision += actuals[row][label_index]
-        item_precision /= top_indices.size
-        aggregated_precision += item_precision
-    aggregated_precision /= num_videos
+    num_videos, num_classes = actuals.shape
+    num_labels = numpy.sum(actuals, axis=1).astype(numpy.int64)
+    max_labels = int(num_labels.max()) if num_videos > 0 else 0
+    if max_labels == 0:
+        return 0.0
+    max_labels = min(max_labels, num_classes)
+    # the num_labels best predictions of every row are among its max_labels best
+    top_indices = numpy.argpartition(predictions, -max_labels,
+                                     axis=1)[:, -max_labels:]
+    top_predictions = numpy.take_along_axis(predictions, top_indices, axis=1)
+    order = numpy.argsort(-top_predictions, axis=1, kind='mergesort')
+    top_indices = numpy.take_along_axis(top_indices, order, axis=1)
+    top_predictions = numpy.take_along_axis(top_predictions, order, axis=1)
+    top_actuals = numpy.take_along_axis(actuals, top_indices, axis=1)
+    in_top = numpy.arange(max_labels)[None, :] < num_labels[:, None]
+    hits = numpy.sum(
+        top_actuals * ((top_predictions > 0) & in_top), axis=1)
+    item_precision = hits / numpy.maximum(num_labels, 1)
+    aggregated_precision = numpy.sum(item_precision) / num_videos
     return aggregated_precision
 
 
@@ -85,10 +91,10 @@ def calculate_gap(predictions, actuals, top_k=20):
     float: The global average precision.
   """
     gap_calculator = ap_calculator.AveragePrecisionCalculator()
-    sparse_predictions, sparse_labels, num_positives = top_k_by_class(
+    _, sparse_predictions, sparse_labels, num_positives = top_k_flat(
         predictions, actuals, top_k)
-    gap_calculator.accumulate(
-        flatten(sparse_predictions), flatten(sparse_labels), sum(num_positives))
+    gap_calculator.accumulate(sparse_predictions, sparse_labels,
+                              numpy.sum(num_positives))
     return gap_calculator.peek_ap_at_n()
 
 
@@ -109,25 +115,43 @@ def top_k_by_class(predictions, labels, k=20):
     those predictions. The entries in 'true_positives' are the number of true
     positives for each class in the ground truth.
 
+  Raises:
+    ValueError: An error occurred when the k is not a positive integer.
+  """
+    num_classes = predictions.shape[1]
+    class_ids, flat_predictions, flat_labels, out_true_positives = top_k_flat(
+        predictions, labels, k)
+    order = numpy.argsort(class_ids, kind='mergesort')
+    splits = numpy.cumsum(numpy.bincount(
+        class_ids, minlength=num_classes))[:-1]
+    out_predictions = [
+        p.tolist() for p in numpy.split(flat_predictions[order], splits)
+    ]
+    out_labels = [p.tolist() for p in numpy.split(flat_labels[order], splits)]
+
+    return out_predictions, out_labels, out_true_positives.tolist()
+
+
+def top_k_flat(predictions, labels, k=20):
+    """Extracts the top k predictions of every video of a batch at once.
+
+  Returns:
+    A tuple (class_ids, predictions, labels, true_positives), the first three
+    are flat numpy arrays of the batch_size * k selected predictions, and
+    'true_positives' is the number of positives of every class in the batch.
+
   Raises:
     ValueError: An error occurred when the k is not a positive integer.
   """
     if k <= 0:
         raise ValueError("k must be a positive integer.")
     k = min(k, predictions.shape[1])
-    num_classes = predictions.shape[1]
-    prediction_triplets = []
-    for video_index in range(predictions.shape[0]):
-        prediction_triplets.extend(
-            top_k_triplets(predictions[video_index], labels[video_index], k))
-    out_predictions = [[] for v in range(num_classes)]
-    out_labels = [[] for v in range(num_classes)]
-    for triplet in prediction_triplets:
-        out_predictions[triplet[0]].append(triplet[1])
-        out_labels[triplet[0]].append(triplet[2])
-    out_true_positives = [numpy.sum(labels[:, i]) for i in range(num_classes)]
-
-    return out_predictions, out_labels, out_true_positives
+    indices = numpy.argpartition(predictions, -k, axis=1)[:, -k:]
+    out_predictions = numpy.take_along_axis(predictions, indices, axis=1)
+    out_labels = numpy.take_along_axis(labels, indices, axis=1)
+    out_true_positives = numpy.sum(labels, axis=0)
+    return (indices.ravel(), out_predictions.ravel(), out_labels.ravel(),
+            out_true_positives)
 
 
 def top_k_triplets(predictions, labels, k=20):
@@ -187,13 +211,12 @@ class EvaluationMetrics(object):
         mean_loss = numpy.mean(loss)
 
         # Take the top 20 predictions.
-        sparse_predictions, sparse_labels, num_positives = top_k_by_class(
-            predictions, labels, self.top_k)
-        self.map_calculator.accumulate(sparse_predictions, sparse_labels,
-                                       num_positives)
+        class_ids, sparse_predictions, sparse_labels, num_positives = \
+            top_k_flat(predictions, labels, self.top_k)
+        self.map_calculator.accumulate_sparse(class_ids, sparse_predictions,
+                                              sparse_labels, num_positives)
         self.global_ap_calculator.accumulate(
-            flatten(sparse_predictions),
-            flatten(sparse_labels), sum(num_positives))
+            sparse_predictions, sparse_labels, numpy.sum(num_positives))
 
         self.num_examples += batch_size
         self.sum_hit_at_one += mean_hit_at_one * batch_size
@@ -42,6 +42,10 @@ from . import average_precision_calculator
 
 class MeanAveragePrecisionCalculator(object):
     """This class is to calculate mean average precision.
+
+  The (class, prediction, actual) triplets of all classes are kept in one set
+  of flat buffers, and the average precisions of all classes are computed
+  together by one sort and segmented sums in peek_map_at_n.
   """
 
     def __init__(self, num_class):
@@ -49,23 +53,20 @@ class MeanAveragePrecisionCalculator(object):
 
     Args:
       num_class: A positive Integer specifying the number of classes.
-      top_n_array: A list of positive integers specifying the top n for each
-      class. The top n in each class will be used to calculate its average
-      precision at n.
-      The size of the array must be num_class.
 
     Raises:
-      ValueError: An error occurred when num_class is not a positive integer;
-      or the top_n_array is not a list of positive integers.
+      ValueError: An error occurred when num_class is not a positive integer.
     """
         if not isinstance(num_class, int) or num_class <= 1:
             raise ValueError("num_class must be a positive integer.")
 
-        self._ap_calculators = []  # member of AveragePrecisionCalculator
         self._num_class = num_class  # total number of classes
-        for i in range(num_class):
-            self._ap_calculators.append(
-                average_precision_calculator.AveragePrecisionCalculator())
+        self._num_positives = numpy.zeros(num_class)
+        self._size = 0
+        capacity = average_precision_calculator.INITIAL_CAPACITY
+        self._class_ids = numpy.zeros(capacity, dtype=numpy.int64)
+        self._predictions = numpy.zeros(capacity)
+        self._actuals = numpy.zeros(capacity)
 
     def accumulate(self, predictions, actuals, num_positives=None):
         """Accumulate the predictions and their ground truth labels.
@@ -84,21 +85,62 @@ class MeanAveragePrecisionCalculator(object):
       ValueError: An error occurred when the shape of predictions and actuals
       does not match.
     """
-        if not num_positives:
-            num_positives = [None for i in predictions.shape[1]]
+        lengths = [len(p) for p in predictions]
+        if lengths != [len(a) for a in actuals]:
+            raise ValueError(
+                "the shape of predictions and actuals does not match.")
+        class_ids = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        self.accumulate_sparse(class_ids,
+                               numpy.concatenate(predictions)
+                               if lengths else [],
+                               numpy.concatenate(actuals)
+                               if lengths else [], num_positives)
+
+    def accumulate_sparse(self,
+                          class_ids,
+                          predictions,
+                          actuals,
+                          num_positives=None):
+        """Accumulate flat arrays of (class, prediction, actual) triplets.
 
-        calculators = self._ap_calculators
-        for i in range(len(predictions)):
-            calculators[i].accumulate(predictions[i], actuals[i],
-                                      num_positives[i])
+    Args:
+      class_ids: a numpy 1-D array of the class of every prediction.
+      predictions: a numpy 1-D array of prediction scores.
+      actuals: a numpy 1-D array of ground truth labels, values larger than 0
+      are positives.
+      num_positives: If provided, an array of the number of true positives
+      for each class, otherwise inferred from 'actuals'.
+    """
+        class_ids = numpy.asarray(class_ids, dtype=numpy.int64).ravel()
+        predictions = numpy.asarray(predictions, dtype=numpy.float64).ravel()
+        actuals = numpy.asarray(actuals, dtype=numpy.float64).ravel()
+        if not (len(class_ids) == len(predictions) == len(actuals)):
+            raise ValueError(
+                "the shape of predictions and actuals does not match.")
+        if num_positives is None:
+            num_positives = numpy.bincount(
+                class_ids[actuals > 0], minlength=self._num_class)
+        self._num_positives += numpy.asarray(num_positives)
+
+        size = self._size + len(class_ids)
+        if size > len(self._predictions):
+            capacity = max(size, 2 * len(self._predictions))
+            for name in ['_class_ids', '_predictions', '_actuals']:
+                buf = getattr(self, name)
+                new_buf = numpy.zeros(capacity, dtype=buf.dtype)
+                new_buf[:self._size] = buf[:self._size]
+                setattr(self, name, new_buf)
+        self._class_ids[self._size:size] = class_ids
+        self._predictions[self._size:size] = predictions
+        self._actuals[self._size:size] = actuals
+        self._size = size
 
     def clear(self):
-        for calculator in self._ap_calculators:
-            calculator.clear()
+        self._size = 0
+        self._num_positives[:] = 0
 
     def is_empty(self):
-        return ([calculator.heap_size for calculator in self._ap_calculators] ==
-                [0 for _ in range(self._num_class)])
+        return self._size == 0
 
     def peek_map_at_n(self):
         """Peek the non-interpolated mean average precision at n.
@@ -107,8 +149,26 @@ class MeanAveragePrecisionCalculator(object):
       An array of non-interpolated average precision at n (default 0) for each
       class.
     """
-        aps = [
-            self._ap_calculators[i].peek_ap_at_n()
-            for i in range(self._num_class)
-        ]
-        return aps
+        aps = numpy.zeros(self._num_class)
+        if self._size > 0:
+            # shuffle as AveragePrecisionCalculator.ap_at_n does, then rank
+            # the predictions of every class in descending order
+            shuffle = numpy.random.RandomState(0).permutation(self._size)
+            class_ids = self._class_ids[shuffle]
+            order = numpy.lexsort((-self._predictions[shuffle], class_ids))
+            class_ids = class_ids[order]
+            hits = self._actuals[shuffle][order] > 0
+
+            counts = numpy.bincount(class_ids, minlength=self._num_class)
+            starts = numpy.cumsum(counts) - counts
+            # rank and number of positives so far inside the class
+            rank = numpy.arange(self._size) - starts[class_ids] + 1
+            poscount = numpy.cumsum(hits)
+            poscount -= (poscount - hits)[starts[class_ids]]
+            aps = numpy.bincount(
+                class_ids[hits],
+                weights=poscount[hits] / rank[hits],
+                minlength=self._num_class)
+            numpos = self._num_positives
+            aps = numpy.where(numpos > 0, aps / numpy.maximum(numpos, 1), 0)
+        return aps.tolist()
@@ -61,35 +61,8 @@ def soft_nms(df, alpha, t1, t2):
     alpha: alpha value of Gaussian decaying function;
     t1, t2: threshold for soft nms.
     '''
-    df = df.sort_values(by="score", ascending=False)
-    tstart = list(df.xmin.values[:])
-    tend = list(df.xmax.values[:])
-    tscore = list(df.score.values[:])
-
-    rstart = []
-    rend = []
-    rscore = []
-
-    while len(tscore) > 1 and len(rscore) < 101:
-        max_index = tscore.index(max(tscore))
-        tmp_iou_list = iou_with_anchors(
-            np.array(tstart),
-            np.array(tend), tstart[max_index], tend[max_index])
-        for idx in range(0, len(tscore)):
-            if idx != max_index:
-                tmp_iou = tmp_iou_list[idx]
-                tmp_width = tend[max_index] - tstart[max_index]
-                if tmp_iou > t1 + (t2 - t1) * tmp_width:
-                    tscore[idx] = tscore[idx] * np.exp(-np.square(tmp_iou) /
-                                                       alpha)
-
-        rstart.append(tstart[max_index])
-        rend.append(tend[max_index])
-        rscore.append(tscore[max_index])
-        tstart.pop(max_index)
-        tend.pop(max_index)
-        tscore.pop(max_index)
-
+    rscore, rstart, rend = soft_nms_array(df.xmin.values, df.xmax.values,
+                                          df.score.values, alpha, t1, t2)
     newDf = pd.DataFrame()
     newDf['score'] = rscore
     newDf['xmin'] = rstart
@@ -97,57 +70,78 @@ def soft_nms(df, alpha, t1, t2):
     return newDf
 
 
-def video_process(video_list,
-                  video_dict,
-                  output_path,
-                  result_dict,
+def soft_nms_array(tstart, tend, tscore, alpha, t1, t2, max_keep=101):
+    '''
+    soft nms on arrays of proposals, returns the kept (score, xmin, xmax)
+    in the order they are selected, at most max_keep of them.
+    '''
+    tscore = np.asarray(tscore, dtype='float64')
+    order = np.argsort(-tscore, kind='mergesort')
+    tstart = np.asarray(tstart, dtype='float64')[order]
+    tend = np.asarray(tend, dtype='float64')[order]
+    tscore = tscore[order]
+    alive = np.ones(len(tscore), dtype=bool)
+
+    keep = []
+    num_left = len(tscore)
+    while num_left > 1 and len(keep) < max_keep:
+        max_index = np.argmax(np.where(alive, tscore, -np.inf))
+        alive[max_index] = False
+        num_left -= 1
+        tmp_iou = iou_with_anchors(tstart, tend, tstart[max_index],
+                                   tend[max_index])
+        tmp_width = tend[max_index] - tstart[max_index]
+        decay = alive & (tmp_iou > t1 + (t2 - t1) * tmp_width)
+        tscore[decay] *= np.exp(-np.square(tmp_iou[decay]) / alpha)
+        keep.append(max_index)
+
+    keep = np.array(keep, dtype='int64')
+    return tscore[keep], tstart[keep], tend[keep]
+
+
+def video_process(video_info,
                   snms_alpha=0.4,
                   snms_t1=0.55,
                   snms_t2=0.9):
-
-    for video_name in video_list:
-        df = pd.read_csv(os.path.join(output_path, video_name + ".csv"))
-        if len(df) > 1:
-            df = soft_nms(df, snms_alpha, snms_t1, snms_t2)
-
-        video_duration = video_dict[video_name]["duration_second"]
-        proposal_list = []
-        for idx in range(min(100, len(df))):
-            tmp_prop={"score":df.score.values[idx],\
-                      "segment":[max(0,df.xmin.values[idx])*video_duration,\
-                                 min(1,df.xmax.values[idx])*video_duration]}
-            proposal_list.append(tmp_prop)
-        result_dict[video_name[2:]] = proposal_list
-
-
-def bmn_post_processing(video_dict, subset, output_path, result_path):
-    video_list = video_dict.keys()
-    video_list = list(video_dict.keys())
-    global result_dict
-    result_dict = mp.Manager().dict()
-    pp_num = 12
-
-    num_videos = len(video_list)
-    num_videos_per_thread = int(num_videos / pp_num)
-    processes = []
-    for tid in range(pp_num - 1):
-        tmp_video_list = video_list[tid * num_videos_per_thread:(tid + 1) *
-                                    num_videos_per_thread]
-        p = mp.Process(
-            target=video_process,
-            args=(tmp_video_list, video_dict, output_path, result_dict))
-        p.start()
-        processes.append(p)
-    tmp_video_list = video_list[(pp_num - 1) * num_videos_per_thread:]
-    p = mp.Process(
-        target=video_process,
-        args=(tmp_video_list, video_dict, output_path, result_dict))
-    p.start()
-    processes.append(p)
-    for p in processes:
-        p.join()
-
-    result_dict = dict(result_dict)
+    '''
+    video_info: (video_name, proposals, video_duration), proposals is a
+    [N, 3] array of xmin, xmax, score.
+    '''
+    video_name, proposals, video_duration = video_info
+    xmin, xmax, score = proposals[:, 0], proposals[:, 1], proposals[:, 2]
+    if len(proposals) > 1:
+        score, xmin, xmax = soft_nms_array(xmin, xmax, score, snms_alpha,
+                                           snms_t1, snms_t2)
+    num = min(100, len(score))
+    xmin = np.maximum(0, xmin[:num]) * video_duration
+    xmax = np.minimum(1, xmax[:num]) * video_duration
+    proposal_list = [{
+        "score": float(score[idx]),
+        "segment": [float(xmin[idx]), float(xmax[idx])]
+    } for idx in range(num)]
+    return video_name[2:], proposal_list
+
+
+def bmn_post_processing(video_dict, subset, proposals, result_path, pp_num=12):
+    '''
+    proposals: dict of video_name -> [N, 3] array of xmin, xmax, score,
+    as collected in memory by the metrics during test or infer.
+    '''
+    video_list = [name for name in video_dict.keys() if name in proposals]
+    video_infos = [(name, proposals[name], video_dict[name]["duration_second"])
+                   for name in video_list]
+    if pp_num > 1 and len(video_infos) > 1:
+        pool = mp.Pool(pp_num)
+        results = pool.map(
+            video_process,
+            video_infos,
+            chunksize=max(1, len(video_infos) // (pp_num * 4)))
+        pool.close()
+        pool.join()
+    else:
+        results = [video_process(info) for info in video_infos]
+
+    result_dict = dict(results)
     output_dict = {
         "version": "VERSION 1.3",
         "results": result_dict,
@@ -155,6 +149,5 @@ def bmn_post_processing(video_dict, subset, output_path, result_path):
     }
     outfile = open(
         os.path.join(result_path, "bmn_results_%s.json" % subset), "w")
-
     json.dump(output_dict, outfile)
     outfile.close()
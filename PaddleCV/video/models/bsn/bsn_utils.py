@@ -13,13 +13,9 @@
 
 import numpy as np
 from paddle.fluid.initializer import Uniform
-from scipy.interpolate import interp1d
 import pandas as pd
 import multiprocessing as mp
 import json
-import pandas
-import numpy
-import random
 import os
 
 
@@ -65,35 +61,8 @@ def soft_nms(df, alpha, t1, t2):
     alpha: alpha value of Gaussian decaying function;
     t1, t2: threshold for soft nms.
     '''
-    df = df.sort_values(by="score", ascending=False)
-    tstart = list(df.xmin.values[:])
-    tend = list(df.xmax.values[:])
-    tscore = list(df.score.values[:])
-
-    rstart = []
-    rend = []
-    rscore = []
-
-    while len(tscore) > 1 and len(rscore) < 101:
-        max_index = tscore.index(max(tscore))
-        tmp_iou_list = iou_with_anchors(
-            np.array(tstart),
-            np.array(tend), tstart[max_index], tend[max_index])
-        for idx in range(0, len(tscore)):
-            if idx != max_index:
-                tmp_iou = tmp_iou_list[idx]
-                tmp_width = tend[max_index] - tstart[max_index]
-                if tmp_iou > t1 + (t2 - t1) * tmp_width:
-                    tscore[idx] = tscore[idx] * np.exp(-np.square(tmp_iou) /
-                                                       alpha)
-
-        rstart.append(tstart[max_index])
-        rend.append(tend[max_index])
-        rscore.append(tscore[max_index])
-        tstart.pop(max_index)
-        tend.pop(max_index)
-        tscore.pop(max_index)
-
+    rscore, rstart, rend = soft_nms_array(df.xmin.values, df.xmax.values,
+                                          df.score.values, alpha, t1, t2)
     newDf = pd.DataFrame()
     newDf['score'] = rscore
     newDf['xmin'] = rstart
@@ -101,58 +70,82 @@ def soft_nms(df, alpha, t1, t2):
     return newDf
 
 
-def video_process(video_list,
-                  video_dict,
-                  output_path_pem,
-                  result_dict,
+def soft_nms_array(tstart, tend, tscore, alpha, t1, t2, max_keep=101):
+    '''
+    soft nms on arrays of proposals, returns the kept (score, xmin, xmax)
+    in the order they are selected, at most max_keep of them.
+    '''
+    tscore = np.asarray(tscore, dtype='float64')
+    order = np.argsort(-tscore, kind='mergesort')
+    tstart = np.asarray(tstart, dtype='float64')[order]
+    tend = np.asarray(tend, dtype='float64')[order]
+    tscore = tscore[order]
+    alive = np.ones(len(tscore), dtype=bool)
+
+    keep = []
+    num_left = len(tscore)
+    while num_left > 1 and len(keep) < max_keep:
+        max_index = np.argmax(np.where(alive, tscore, -np.inf))
+        alive[max_index] = False
+        num_left -= 1
+        tmp_iou = iou_with_anchors(tstart, tend, tstart[max_index],
+                                   tend[max_index])
+        tmp_width = tend[max_index] - tstart[max_index]
+        decay = alive & (tmp_iou > t1 + (t2 - t1) * tmp_width)
+        tscore[decay] *= np.exp(-np.square(tmp_iou[decay]) / alpha)
+        keep.append(max_index)
+
+    keep = np.array(keep, dtype='int64')
+    return tscore[keep], tstart[keep], tend[keep]
+
+
+def video_process(video_info,
                   snms_alpha=0.75,
                   snms_t1=0.65,
                   snms_t2=0.9):
-
-    for video_name in video_list:
-        df = pd.read_csv(os.path.join(output_path_pem, video_name + ".csv"))
-        df["score"] = df.xmin_score.values[:] * df.xmax_score.values[:] * df.iou_score.values[:]
-        if len(df) > 1:
-            df = soft_nms(df, snms_alpha, snms_t1, snms_t2)
-
-        video_duration = video_dict[video_name]["duration_second"]
-        proposal_list = []
-        for idx in range(min(100, len(df))):
-            tmp_prop={"score":df.score.values[idx],\
-                      "segment":[max(0,df.xmin.values[idx])*video_duration,\
-                                 min(1,df.xmax.values[idx])*video_duration]}
-            proposal_list.append(tmp_prop)
-        result_dict[video_name[2:]] = proposal_list
-
-
-def bsn_post_processing(video_dict, subset, output_path_pem, result_path_pem):
-    video_list = video_dict.keys()
-    video_list = list(video_dict.keys())
-    global result_dict
-    result_dict = mp.Manager().dict()
-    pp_num = 12
-
-    num_videos = len(video_list)
-    num_videos_per_thread = int(num_videos / pp_num)
-    processes = []
-    for tid in range(pp_num - 1):
-        tmp_video_list = video_list[tid * num_videos_per_thread:(tid + 1) *
-                                    num_videos_per_thread]
-        p = mp.Process(
-            target=video_process,
-            args=(tmp_video_list, video_dict, output_path_pem, result_dict))
-        p.start()
-        processes.append(p)
-    tmp_video_list = video_list[(pp_num - 1) * num_videos_per_thread:]
-    p = mp.Process(
-        target=video_process,
-        args=(tmp_video_list, video_dict, output_path_pem, result_dict))
-    p.start()
-    processes.append(p)
-    for p in processes:
-        p.join()
-
-    result_dict = dict(result_dict)
+    '''
+    video_info: (video_name, proposals, video_duration), proposals is a
+    [N, 3] array of xmin, xmax, score.
+    '''
+    video_name, proposals, video_duration = video_info
+    xmin, xmax, score = proposals[:, 0], proposals[:, 1], proposals[:, 2]
+    if len(proposals) > 1:
+        score, xmin, xmax = soft_nms_array(xmin, xmax, score, snms_alpha,
+                                           snms_t1, snms_t2)
+    num = min(100, len(score))
+    xmin = np.maximum(0, xmin[:num]) * video_duration
+    xmax = np.minimum(1, xmax[:num]) * video_duration
+    proposal_list = [{
+        "score": float(score[idx]),
+        "segment": [float(xmin[idx]), float(xmax[idx])]
+    } for idx in range(num)]
+    return video_name[2:], proposal_list
+
+
+def bsn_post_processing(video_dict,
+                        subset,
+                        proposals,
+                        result_path_pem,
+                        pp_num=12):
+    '''
+    proposals: dict of video_name -> [N, 3] array of xmin, xmax, score,
+    as collected in memory by the metrics during test or infer.
+    '''
+    video_list = [name for name in video_dict.keys() if name in proposals]
+    video_infos = [(name, proposals[name], video_dict[name]["duration_second"])
+                   for name in video_list]
+    if pp_num > 1 and len(video_infos) > 1:
+        pool = mp.Pool(pp_num)
+        results = pool.map(
+            video_process,
+            video_infos,
+            chunksize=max(1, len(video_infos) // (pp_num * 4)))
+        pool.close()
+        pool.join()
+    else:
+        results = [video_process(info) for info in video_infos]
+
+    result_dict = dict(results)
     output_dict = {
         "version": "VERSION 1.3",
         "results": result_dict,
@@ -164,100 +157,80 @@ def bsn_post_processing(video_dict, subset, output_path_pem, result_path_pem):
     outfile.close()
 
 
-def generate_props(pgm_config, video_list, video_dict, output_path_tem,
-                   output_path_pgm_proposal):
+# arrays of a PGM store directory, one .npy file each; video i owns the
+# proposals offsets[i]:offsets[i + 1] of props, match_iou, match_ioa, feats
+PGM_STORE_ARRAYS = [
+    'video', 'offsets', 'tem', 'props', 'match_iou', 'match_ioa', 'feats'
+]
+
+
+def generate_props(pgm_config, video_info, tem_result):
+    """
+    Candidate proposals of one video from its TEM result [tscale, 3]
+    (start, end, action), returns the top_K proposals as an array of
+    xmin, xmax, xmin_score, xmax_score with their best iou and ioa with
+    the annotations (zeros if the video has none).
+    """
     tscale = pgm_config["tscale"]
     peak_thres = pgm_config["pgm_threshold"]
-    anchor_xmin = [1.0 / tscale * i for i in range(tscale)]
-    anchor_xmax = [1.0 / tscale * i for i in range(1, tscale + 1)]
-
-    for video_name in video_list:
-        video_info = video_dict[video_name]
-        if video_info["subset"] == "training":
-            top_K = pgm_config["pgm_top_K_train"]
-        else:
-            top_K = pgm_config["pgm_top_K"]
-
-        tdf = pandas.read_csv(
-            os.path.join(output_path_tem, video_name + ".csv"))
-        start_scores = tdf.start.values[:]
-        end_scores = tdf.end.values[:]
-
-        start_mask = boundary_choose(start_scores, peak_thres)
-        start_mask[0] = 1.
-        end_mask = boundary_choose(end_scores, peak_thres)
-        end_mask[-1] = 1.
-
-        score_vector_list = []
-        for idx in range(tscale):
-            for jdx in range(tscale):
-                start_index = jdx
-                end_index = start_index + idx
-                if end_index < tscale and start_mask[
-                        start_index] == 1 and end_mask[end_index] == 1:
-                    xmin = anchor_xmin[start_index]
-                    xmax = anchor_xmax[end_index]
-                    xmin_score = start_scores[start_index]
-                    xmax_score = end_scores[end_index]
-                    score_vector_list.append(
-                        [xmin, xmax, xmin_score, xmax_score])
-        num_data = len(score_vector_list)
-        if num_data < top_K:
-            for idx in range(top_K - num_data):
-                start_index = random.randint(0, tscale - 1)
-                end_index = random.randint(start_index, tscale - 1)
-                xmin = anchor_xmin[start_index]
-                xmax = anchor_xmax[end_index]
-                xmin_score = start_scores[start_index]
-                xmax_score = end_scores[end_index]
-                score_vector_list.append([xmin, xmax, xmin_score, xmax_score])
-
-        score_vector_list = np.stack(score_vector_list)
-        col_name = ["xmin", "xmax", "xmin_score", "xmax_score"]
-        new_df = pandas.DataFrame(score_vector_list, columns=col_name)
-        new_df["score"] = new_df.xmin_score * new_df.xmax_score
-        new_df = new_df.sort_values(by="score", ascending=False)
-        new_df = new_df[:top_K]
-
+    anchor_xmin = np.array([1.0 / tscale * i for i in range(tscale)])
+    anchor_xmax = np.array([1.0 / tscale * i for i in range(1, tscale + 1)])
+    if video_info["subset"] == "training":
+        top_K = pgm_config["pgm_top_K_train"]
+    else:
+        top_K = pgm_config["pgm_top_K"]
+
+    start_scores = tem_result[:, 0]
+    end_scores = tem_result[:, 1]
+    start_mask = boundary_choose(start_scores, peak_thres)
+    start_mask[0] = 1.
+    end_mask = boundary_choose(end_scores, peak_thres)
+    end_mask[-1] = 1.
+
+    # proposal (idx, jdx) starts at jdx and ends at jdx + idx
+    start_index = np.arange(tscale)[None, :]
+    end_index = start_index + np.arange(tscale)[:, None]
+    valid = (end_index < tscale) & (start_mask[start_index] == 1)
+    valid[valid] = end_mask[end_index[valid]] == 1
+    idx, start_index = np.nonzero(valid)
+    end_index = start_index + idx
+    num_data = len(start_index)
+    if num_data < top_K:
+        rand_start = np.random.randint(0, tscale, size=top_K - num_data)
+        rand_end = rand_start + (np.random.random(top_K - num_data) *
+                                 (tscale - rand_start)).astype('int64')
+        start_index = np.concatenate([start_index, rand_start])
+        end_index = np.concatenate([end_index, rand_end])
+
+    props = np.stack(
+        [
+            anchor_xmin[start_index], anchor_xmax[end_index],
+            start_scores[start_index], end_scores[end_index]
+        ],
+        axis=1)
+    score = props[:, 2] * props[:, 3]
+    props = props[np.argsort(-score, kind='mergesort')[:top_K]]
+
+    match_iou = np.zeros(len(props))
+    match_ioa = np.zeros(len(props))
+    annotations = video_info.get("annotations", [])
+    if len(annotations) > 0:
         video_second = video_info['duration_second']
-
-        try:
-            gt_xmins = []
-            gt_xmaxs = []
-            for idx in range(len(video_info["annotations"])):
-                gt_xmins.append(video_info["annotations"][idx]["segment"][0] /
-                                video_second)
-                gt_xmaxs.append(video_info["annotations"][idx]["segment"][1] /
-                                video_second)
-
-            new_iou_list = []
-            for j in range(len(gt_xmins)):
-                tmp_new_iou = iou_with_anchors(new_df.xmin.values[:],
-                                               new_df.xmax.values[:],
-                                               gt_xmins[j], gt_xmaxs[j])
-                new_iou_list.append(tmp_new_iou)
-            new_iou_list = numpy.stack(new_iou_list)
-            new_iou_list = numpy.max(new_iou_list, axis=0)
-
-            new_ioa_list = []
-            for j in range(len(gt_xmins)):
-                tmp_new_ioa = ioa_with_anchors(new_df.xmin.values[:],
-                                               new_df.xmax.values[:],
-                                               gt_xmins[j], gt_xmaxs[j])
-                new_ioa_list.append(tmp_new_ioa)
-            new_ioa_list = numpy.stack(new_ioa_list)
-            new_ioa_list = numpy.max(new_ioa_list, axis=0)
-            new_df["match_iou"] = new_iou_list
-            new_df["match_ioa"] = new_ioa_list
-        except:
-            pass
-        new_df.to_csv(
-            os.path.join(output_path_pgm_proposal, video_name + ".csv"),
-            index=False)
-
-
-def generate_feats(pgm_config, video_list, video_dict, output_path_tem,
-                   output_path_pgm_proposal, output_path_pgm_feature):
+        gt_bbox = np.array([gt["segment"] for gt in annotations]) / video_second
+        # [num_gt, num_props] against every annotation at once
+        match_iou = np.max(iou_with_anchors(
+            props[None, :, 0], props[None, :, 1], gt_bbox[:, :1],
+            gt_bbox[:, 1:]),
+                           axis=0)
+        match_ioa = np.max(ioa_with_anchors(
+            props[None, :, 0], props[None, :, 1], gt_bbox[:, :1],
+            gt_bbox[:, 1:]),
+                           axis=0)
+    return props, match_iou, match_ioa
+
+
+def generate_feats(pgm_config, tem_result, props):
+    """BSP features [num_props, action + start + end samples] of one video"""
     num_sample_start = pgm_config["num_sample_start"]
     num_sample_end = pgm_config["num_sample_end"]
     num_sample_action = pgm_config["num_sample_action"]
@@ -266,144 +239,116 @@ def generate_feats(pgm_config, video_list, video_dict, output_path_tem,
     seg_xmins = [1.0 / tscale * i for i in range(tscale)]
     seg_xmaxs = [1.0 / tscale * i for i in range(1, tscale + 1)]
 
-    for video_name in video_list:
-        adf = pandas.read_csv(
-            os.path.join(output_path_tem, video_name + ".csv"))
-        score_action = adf.action.values[:]
-        video_scale = len(adf)
-        video_gap = seg_xmaxs[0] - seg_xmins[0]
-        video_extend = int(video_scale / 4 + 10)
-        pdf = pandas.read_csv(
-            os.path.join(output_path_pgm_proposal, video_name + ".csv"))
-        tmp_zeros = numpy.zeros([video_extend])
-        score_action = numpy.concatenate((tmp_zeros, score_action, tmp_zeros))
-        tmp_cell = video_gap
-        tmp_x = [-tmp_cell / 2 - (video_extend - 1 - ii) * tmp_cell for ii in range(video_extend)] + \
-                [tmp_cell / 2 + ii * tmp_cell for ii in range(video_scale)] + \
-                [tmp_cell / 2 + seg_xmaxs[-1] + ii * tmp_cell for ii in range(video_extend)]
-        f_action = interp1d(tmp_x, score_action, axis=0)
-        feature_bsp = []
-
-        for idx in range(len(pdf)):
-            xmin = pdf.xmin.values[idx]
-            xmax = pdf.xmax.values[idx]
-            xlen = xmax - xmin
-            xmin_0 = xmin - xlen * pgm_config["bsp_boundary_ratio"]
-            xmin_1 = xmin + xlen * pgm_config["bsp_boundary_ratio"]
-            xmax_0 = xmax - xlen * pgm_config["bsp_boundary_ratio"]
-            xmax_1 = xmax + xlen * pgm_config["bsp_boundary_ratio"]
-            # start
-            plen_start = (xmin_1 - xmin_0) / (num_sample_start - 1)
-            plen_sample = plen_start / num_sample_perbin
-            tmp_x_new = [
-                xmin_0 - plen_start / 2 + plen_sample * ii
-                for ii in range(num_sample_start * num_sample_perbin + 1)
-            ]
-            tmp_y_new_start_action = f_action(tmp_x_new)
-            tmp_y_new_start = [
-                numpy.mean(tmp_y_new_start_action[ii * num_sample_perbin:(ii + 1) * num_sample_perbin + 1]) \
-                for ii in range(num_sample_start)]
-            # end
-            plen_end = (xmax_1 - xmax_0) / (num_sample_end - 1)
-            plen_sample = plen_end / num_sample_perbin
-            tmp_x_new = [
-                xmax_0 - plen_end / 2 + plen_sample * ii
-                for ii in range(num_sample_end * num_sample_perbin + 1)
-            ]
-            tmp_y_new_end_action = f_action(tmp_x_new)
-            tmp_y_new_end = [
-                numpy.mean(tmp_y_new_end_action[ii * num_sample_perbin:(ii + 1) * num_sample_perbin + 1]) \
-                for ii in range(num_sample_end)]
-            # action
-            plen_action = (xmax - xmin) / (num_sample_action - 1)
-            plen_sample = plen_action / num_sample_perbin
-            tmp_x_new = [
-                xmin - plen_action / 2 + plen_sample * ii
-                for ii in range(num_sample_action * num_sample_perbin + 1)
-            ]
-            tmp_y_new_action = f_action(tmp_x_new)
-            tmp_y_new_action = [
-                numpy.mean(tmp_y_new_action[ii * num_sample_perbin:(ii + 1) * num_sample_perbin + 1]) \
-                for ii in range(num_sample_action)]
-            tmp_feature = numpy.concatenate(
-                [tmp_y_new_action, tmp_y_new_start, tmp_y_new_end])
-            feature_bsp.append(tmp_feature)
-        feature_bsp = numpy.array(feature_bsp)
-        numpy.save(
-            os.path.join(output_path_pgm_feature, video_name), feature_bsp)
-
-
-def pgm_gen_proposal(video_dict, pgm_config, output_path_tem,
-                     output_path_pgm_proposal):
-    video_list = list(video_dict.keys())
-    video_list.sort()
-    num_videos = len(video_list)
-    num_videos_per_thread = int(num_videos / pgm_config["pgm_thread"])
-    processes = []
-    for tid in range(pgm_config["pgm_thread"] - 1):
-        tmp_video_list = video_list[tid * num_videos_per_thread:(tid + 1) *
-                                    num_videos_per_thread]
-        p = mp.Process(
-            target=generate_props,
-            args=(
-                pgm_config,
-                tmp_video_list,
-                video_dict,
-                output_path_tem,
-                output_path_pgm_proposal, ))
-        p.start()
-        processes.append(p)
-    tmp_video_list = video_list[(pgm_config["pgm_thread"] - 1) *
-                                num_videos_per_thread:]
-    p = mp.Process(
-        target=generate_props,
-        args=(
-            pgm_config,
-            tmp_video_list,
-            video_dict,
-            output_path_tem,
-            output_path_pgm_proposal, ))
-    p.start()
-    processes.append(p)
-    for p in processes:
-        p.join()
-
-
-def pgm_gen_feature(video_dict, pgm_config, output_path_tem,
-                    output_path_pgm_proposal, output_path_pgm_feature):
-    video_list = list(video_dict.keys())
-    video_list.sort()
-    num_videos = len(video_list)
-    num_videos_per_thread = int(num_videos / pgm_config["pgm_thread"])
-    processes = []
-    for tid in range(pgm_config["pgm_thread"] - 1):
-        tmp_video_list = video_list[tid * num_videos_per_thread:(tid + 1) *
-                                    num_videos_per_thread]
-        p = mp.Process(
-            target=generate_feats,
-            args=(
-                pgm_config,
-                tmp_video_list,
-                video_dict,
-                output_path_tem,
-                output_path_pgm_proposal,
-                output_path_pgm_feature, ))
-        p.start()
-        processes.append(p)
-
-    tmp_video_list = video_list[(pgm_config["pgm_thread"] - 1) *
-                                num_videos_per_thread:]
-    p = mp.Process(
-        target=generate_feats,
-        args=(
-            pgm_config,
-            tmp_video_list,
-            video_dict,
-            output_path_tem,
-            output_path_pgm_proposal,
-            output_path_pgm_feature, ))
-    p.start()
-    processes.append(p)
-
-    for p in processes:
-        p.join()
+    score_action = tem_result[:, 2]
+    video_scale = len(score_action)
+    video_gap = seg_xmaxs[0] - seg_xmins[0]
+    video_extend = int(video_scale / 4 + 10)
+    tmp_zeros = np.zeros([video_extend])
+    score_action = np.concatenate((tmp_zeros, score_action, tmp_zeros))
+    tmp_cell = video_gap
+    tmp_x = np.concatenate([
+        -tmp_cell / 2 - (video_extend - 1 - np.arange(video_extend)) * tmp_cell,
+        tmp_cell / 2 + np.arange(video_scale) * tmp_cell,
+        tmp_cell / 2 + seg_xmaxs[-1] + np.arange(video_extend) * tmp_cell
+    ])
+
+    def sample(begin, plen, num_sample):
+        # num_sample bins of num_sample_perbin + 1 points, neighbours share one
+        plen_sample = plen / num_sample_perbin
+        tmp_x_new = begin[:, None] - plen[:, None] / 2 + plen_sample[:, None] * \
+            np.arange(num_sample * num_sample_perbin + 1)
+        tmp_y_new = np.interp(tmp_x_new, tmp_x, score_action)
+        bins = np.arange(num_sample)[:, None] * num_sample_perbin + \
+            np.arange(num_sample_perbin + 1)
+        return tmp_y_new[:, bins].mean(axis=2)
+
+    xmin = props[:, 0]
+    xmax = props[:, 1]
+    xlen = xmax - xmin
+    xmin_0 = xmin - xlen * pgm_config["bsp_boundary_ratio"]
+    xmin_1 = xmin + xlen * pgm_config["bsp_boundary_ratio"]
+    xmax_0 = xmax - xlen * pgm_config["bsp_boundary_ratio"]
+    xmax_1 = xmax + xlen * pgm_config["bsp_boundary_ratio"]
+    feat_start = sample(xmin_0, (xmin_1 - xmin_0) / (num_sample_start - 1),
+                        num_sample_start)
+    feat_end = sample(xmax_0, (xmax_1 - xmax_0) / (num_sample_end - 1),
+                      num_sample_end)
+    feat_action = sample(xmin, (xmax - xmin) / (num_sample_action - 1),
+                         num_sample_action)
+    return np.concatenate([feat_action, feat_start, feat_end], axis=1)
+
+
+def pgm_process(args):
+    pgm_config, video_info, tem_result = args
+    props, match_iou, match_ioa = generate_props(pgm_config, video_info,
+                                                 tem_result)
+    feats = generate_feats(pgm_config, tem_result, props)
+    return props, match_iou, match_ioa, feats
+
+
+def pgm_gen_store(video_dict, pgm_config, tem_results, output_path_pgm):
+    """
+    Run PGM on the TEM results (dict of video_name -> [tscale, 3]) of all
+    videos of video_dict and write proposals and BSP features of the whole
+    split into one store directory, see PGM_STORE_ARRAYS.
+    """
+    video_list = sorted(name for name in video_dict if name in tem_results)
+    top_Ks = [
+        pgm_config["pgm_top_K_train"] if video_dict[name]["subset"] ==
+        "training" else pgm_config["pgm_top_K"] for name in video_list
+    ]
+    offsets = np.zeros(len(video_list) + 1, dtype='int64')
+    np.cumsum(top_Ks, out=offsets[1:])
+    num_feat = pgm_config["num_sample_start"] + pgm_config[
+        "num_sample_end"] + pgm_config["num_sample_action"]
+
+    if not os.path.exists(output_path_pgm):
+        os.makedirs(output_path_pgm)
+    np.save(os.path.join(output_path_pgm, 'video.npy'), np.array(video_list))
+    np.save(os.path.join(output_path_pgm, 'offsets.npy'), offsets)
+    tem = np.stack([tem_results[name] for name in video_list]).astype(
+        'float32') if video_list else np.zeros((0, pgm_config["tscale"], 3))
+    np.save(os.path.join(output_path_pgm, 'tem.npy'), tem)
+
+    def open_array(name, shape):
+        return np.lib.format.open_memmap(
+            os.path.join(output_path_pgm, name + '.npy'),
+            mode='w+',
+            dtype='float32',
+            shape=shape)
+
+    num_props = int(offsets[-1])
+    store = {
+        'props': open_array('props', (num_props, 4)),
+        'match_iou': open_array('match_iou', (num_props, )),
+        'match_ioa': open_array('match_ioa', (num_props, )),
+        'feats': open_array('feats', (num_props, num_feat)),
+    }
+    tasks = ((pgm_config, video_dict[name], tem_results[name])
+             for name in video_list)
+    pool = None
+    if pgm_config["pgm_thread"] > 1:
+        pool = mp.Pool(pgm_config["pgm_thread"])
+        results = pool.imap(pgm_process, tasks, chunksize=16)
+    else:
+        results = map(pgm_process, tasks)
+    for idx, result in enumerate(results):
+        begin, end = offsets[idx], offsets[idx + 1]
+        for name, value in zip(['props', 'match_iou', 'match_ioa', 'feats'],
+                               result):
+            store[name][begin:end] = value
+    if pool is not None:
+        pool.close()
+        pool.join()
+    for array in store.values():
+        array.flush()
+
+
+def load_pgm_store(output_path_pgm):
+    """PGM store written by pgm_gen_store, large arrays are memory-mapped"""
+    store = {}
+    for name in PGM_STORE_ARRAYS:
+        mmap_mode = None if name in ['video', 'offsets'] else 'r'
+        store[name] = np.load(
+            os.path.join(output_path_pgm, name + '.npy'), mmap_mode=mmap_mode)
+    return store
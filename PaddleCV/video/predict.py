@@ -91,6 +91,17 @@ def parse_args():
         type=str,
         default=None,
         help='directory to store results')
+    parser.add_argument(
+        '--window_size',
+        type=int,
+        default=None,
+        help='frames of the sliding windows to predict video_path in, only for TSN, TSM and StNet.'
+    )
+    parser.add_argument(
+        '--window_stride',
+        type=int,
+        default=None,
+        help='frames between the starts of two sliding windows.')
     args = parser.parse_args()
     return args
 
@@ -25,7 +25,7 @@ import paddle.fluid as fluid
 
 logger = logging.getLogger(__name__)
 
-from .reader_utils import DataReader
+from .reader_utils import DataReader, load_label_cache
 from models.bmn.bmn_utils import iou_with_anchors, ioa_with_anchors
 
 
@@ -37,6 +37,7 @@ class BMNReader(DataReader):
                  tscale, temporal length of BM map,
                  dscale, duration scale of BM map,
                  anchor_xmin, anchor_xmax, the range of each point in the feature sequence,
+                 label_cache_path, directory of the label cache, feat_path/label_cache by default,
                  batch_size, batch size of input data,
                  num_threads, number of threads of data processing   
     """
@@ -52,8 +53,13 @@ class BMNReader(DataReader):
         self.tgap = 1. / self.tscale
         self.feat_path = cfg.MODEL.feat_path
 
+        self.label_cache_path = cfg.MODEL.get(
+            'label_cache_path', os.path.join(self.feat_path, 'label_cache'))
+
         self.get_dataset_dict()
         self.get_match_map()
+        if self.mode != 'infer':
+            self.get_label_cache()
 
         self.batch_size = cfg[mode.upper()]['batch_size']
         self.num_threads = cfg[mode.upper()]['num_threads']
@@ -93,51 +99,50 @@ class BMNReader(DataReader):
         self.anchor_xmin = [self.tgap * i for i in range(self.tscale)]
         self.anchor_xmax = [self.tgap * i for i in range(1, self.tscale + 1)]
 
+    def get_label_cache(self):
+        """labels only depend on annotations and scales, compute them once"""
+        self.label_index = dict(
+            (video_name, idx) for idx, video_name in enumerate(self.video_list))
+        self.labels = load_label_cache(
+            self.label_cache_path, 'bmn_' + self.subset, self.video_list,
+            self.video_dict, [self.tscale, self.dscale], 3,
+            self.compute_video_label)
+
     def get_video_label(self, video_name):
+        idx = self.label_index[video_name]
+        return tuple(np.array(label[idx]) for label in self.labels)
+
+    def compute_video_label(self, video_name):
         video_info = self.video_dict[video_name]
         video_second = video_info['duration_second']
         video_labels = video_info['annotations']
 
-        gt_bbox = []
-        gt_iou_map = []
-        for gt in video_labels:
-            tmp_start = max(min(1, gt["segment"][0] / video_second), 0)
-            tmp_end = max(min(1, gt["segment"][1] / video_second), 0)
-            gt_bbox.append([tmp_start, tmp_end])
-            tmp_gt_iou_map = iou_with_anchors(
-                self.match_map[:, 0], self.match_map[:, 1], tmp_start, tmp_end)
-            tmp_gt_iou_map = np.reshape(tmp_gt_iou_map,
-                                        [self.dscale, self.tscale])
-            gt_iou_map.append(tmp_gt_iou_map)
-        gt_iou_map = np.array(gt_iou_map)
-        gt_iou_map = np.max(gt_iou_map, axis=0)
-
-        gt_bbox = np.array(gt_bbox)
+        gt_bbox = np.array([[
+            max(min(1, gt["segment"][0] / video_second), 0),
+            max(min(1, gt["segment"][1] / video_second), 0)
+        ] for gt in video_labels])
         gt_xmins = gt_bbox[:, 0]
         gt_xmaxs = gt_bbox[:, 1]
-        gt_lens = gt_xmaxs - gt_xmins
+
+        # [num_gt, dscale * tscale] iou of every gt with every match window
+        gt_iou_map = iou_with_anchors(self.match_map[None, :, 0],
+                                      self.match_map[None, :, 1],
+                                      gt_xmins[:, None], gt_xmaxs[:, None])
+        gt_iou_map = np.max(gt_iou_map, axis=0)
+        gt_iou_map = np.reshape(gt_iou_map, [self.dscale, self.tscale])
+
         gt_len_small = 3 * self.tgap
         # gt_len_small=np.maximum(temporal_gap,boundary_ratio*gt_lens)
-        gt_start_bboxs = np.stack(
-            (gt_xmins - gt_len_small / 2, gt_xmins + gt_len_small / 2), axis=1)
-        gt_end_bboxs = np.stack(
-            (gt_xmaxs - gt_len_small / 2, gt_xmaxs + gt_len_small / 2), axis=1)
-
-        match_score_start = []
-        for jdx in range(len(self.anchor_xmin)):
-            match_score_start.append(
-                np.max(
-                    ioa_with_anchors(self.anchor_xmin[jdx], self.anchor_xmax[
-                        jdx], gt_start_bboxs[:, 0], gt_start_bboxs[:, 1])))
-        match_score_end = []
-        for jdx in range(len(self.anchor_xmin)):
-            match_score_end.append(
-                np.max(
-                    ioa_with_anchors(self.anchor_xmin[jdx], self.anchor_xmax[
-                        jdx], gt_end_bboxs[:, 0], gt_end_bboxs[:, 1])))
-
-        gt_start = np.array(match_score_start)
-        gt_end = np.array(match_score_end)
+        anchor_xmin = np.array(self.anchor_xmin)[:, None]
+        anchor_xmax = np.array(self.anchor_xmax)[:, None]
+        gt_start = np.max(ioa_with_anchors(anchor_xmin, anchor_xmax,
+                                           gt_xmins - gt_len_small / 2,
+                                           gt_xmins + gt_len_small / 2),
+                          axis=1)
+        gt_end = np.max(ioa_with_anchors(anchor_xmin, anchor_xmax,
+                                         gt_xmaxs - gt_len_small / 2,
+                                         gt_xmaxs + gt_len_small / 2),
+                        axis=1)
         return gt_iou_map, gt_start, gt_end
 
     def load_file(self, video_name):
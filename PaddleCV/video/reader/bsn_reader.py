@@ -25,8 +25,8 @@ import paddle
 import paddle.fluid as fluid
 logger = logging.getLogger(__name__)
 
-from .reader_utils import DataReader
-from models.bsn.bsn_utils import iou_with_anchors, ioa_with_anchors
+from .reader_utils import DataReader, load_label_cache
+from models.bsn.bsn_utils import iou_with_anchors, ioa_with_anchors, load_pgm_store
 
 
 class BSNVideoReader(DataReader):
@@ -37,6 +37,7 @@ class BSNVideoReader(DataReader):
                  file_list, file list for infer,
                  tscale, temporal length of input,
                  anchor_xmin, anchor_xmax, the range of each point in the feature sequence,
+                 label_cache_path, directory of the label cache, feat_path/label_cache by default,
                  batch_size, batch size of input data,
                  num_threads, number of threads of data processing
 
@@ -54,7 +55,11 @@ class BSNVideoReader(DataReader):
         self.feat_path = cfg.MODEL.feat_path
         self.anchor_xmin = [self.tgap * i for i in range(self.tscale)]
         self.anchor_xmax = [self.tgap * i for i in range(1, self.tscale + 1)]
+        self.label_cache_path = cfg.MODEL.get(
+            'label_cache_path', os.path.join(self.feat_path, 'label_cache'))
         self.get_dataset_dict()
+        if self.mode != 'infer':
+            self.get_label_cache()
 
         self.batch_size = cfg[mode.upper()]['batch_size']
         self.num_threads = cfg[mode.upper()]['num_threads']
@@ -82,49 +87,47 @@ class BSNVideoReader(DataReader):
         print("%s subset video numbers: %d" %
               (self.subset, len(self.video_list)))
 
+    def get_label_cache(self):
+        """labels only depend on annotations and scales, compute them once"""
+        self.label_index = dict(
+            (video_name, idx) for idx, video_name in enumerate(self.video_list))
+        self.labels = load_label_cache(
+            self.label_cache_path, 'bsn_tem_' + self.subset, self.video_list,
+            self.video_dict, [self.tscale, self.gt_boundary_ratio], 3,
+            self.compute_video_label)
+
     def get_video_label(self, video_name):
+        idx = self.label_index[video_name]
+        return tuple(np.array(label[idx]) for label in self.labels)
+
+    def compute_video_label(self, video_name):
         video_info = self.video_dict[video_name]
         video_second = video_info['duration_second']
         video_labels = video_info['annotations']
 
-        gt_bbox = []
-        for gt in video_labels:
-            tmp_start = max(min(1, gt["segment"][0] / video_second), 0)
-            tmp_end = max(min(1, gt["segment"][1] / video_second), 0)
-            gt_bbox.append([tmp_start, tmp_end])
-
-        gt_bbox = np.array(gt_bbox)
+        gt_bbox = np.array([[
+            max(min(1, gt["segment"][0] / video_second), 0),
+            max(min(1, gt["segment"][1] / video_second), 0)
+        ] for gt in video_labels])
         gt_xmins = gt_bbox[:, 0]
         gt_xmaxs = gt_bbox[:, 1]
         gt_lens = gt_xmaxs - gt_xmins
         gt_len_small = np.maximum(self.tgap, self.gt_boundary_ratio * gt_lens)
-        gt_start_bboxs = np.stack(
-            (gt_xmins - gt_len_small / 2, gt_xmins + gt_len_small / 2), axis=1)
-        gt_end_bboxs = np.stack(
-            (gt_xmaxs - gt_len_small / 2, gt_xmaxs + gt_len_small / 2), axis=1)
-
-        match_score_action = []
-        for jdx in range(len(self.anchor_xmin)):
-            match_score_action.append(
-                np.max(
-                    ioa_with_anchors(self.anchor_xmin[jdx], self.anchor_xmax[
-                        jdx], gt_xmins, gt_xmaxs)))
-        match_score_start = []
-        for jdx in range(len(self.anchor_xmin)):
-            match_score_start.append(
-                np.max(
-                    ioa_with_anchors(self.anchor_xmin[jdx], self.anchor_xmax[
-                        jdx], gt_start_bboxs[:, 0], gt_start_bboxs[:, 1])))
-        match_score_end = []
-        for jdx in range(len(self.anchor_xmin)):
-            match_score_end.append(
-                np.max(
-                    ioa_with_anchors(self.anchor_xmin[jdx], self.anchor_xmax[
-                        jdx], gt_end_bboxs[:, 0], gt_end_bboxs[:, 1])))
-
-        gt_start = np.array(match_score_start)
-        gt_end = np.array(match_score_end)
-        gt_action = np.array(match_score_action)
+
+        # [tscale, num_gt] ioa of every anchor with every gt
+        anchor_xmin = np.array(self.anchor_xmin)[:, None]
+        anchor_xmax = np.array(self.anchor_xmax)[:, None]
+        gt_action = np.max(
+            ioa_with_anchors(anchor_xmin, anchor_xmax, gt_xmins, gt_xmaxs),
+            axis=1)
+        gt_start = np.max(ioa_with_anchors(anchor_xmin, anchor_xmax,
+                                           gt_xmins - gt_len_small / 2,
+                                           gt_xmins + gt_len_small / 2),
+                          axis=1)
+        gt_end = np.max(ioa_with_anchors(anchor_xmin, anchor_xmax,
+                                         gt_xmaxs - gt_len_small / 2,
+                                         gt_xmaxs + gt_len_small / 2),
+                        axis=1)
         return gt_start, gt_end, gt_action
 
     def load_file(self, video_name):
@@ -296,8 +299,7 @@ class BSNProposalReader(DataReader):
     dataset cfg: anno_file, annotation file path,
                  file_list, file list for infer,
                  top_K, number of proposals during training/test,
-                 feat_path, feature path generated by PGM,
-                 prop_path, proposal path generated by PGM,
+                 pgm_path, proposal and feature store generated by PGM,
                  batch_size, batch size of input data,
                  num_threads, number of threads of data processing.
     """
@@ -312,12 +314,13 @@ class BSNProposalReader(DataReader):
         self.subset = cfg[mode.upper()]['subset']
 
         if mode == 'infer':
-            self.feat_path = cfg[mode.upper()]['feat_path']
-            self.prop_path = cfg[mode.upper()]['prop_path']
+            self.pgm_path = cfg[mode.upper()]['pgm_path']
         else:
-            self.feat_path = cfg.MODEL.feat_path
-            self.prop_path = cfg.MODEL.prop_path
+            self.pgm_path = cfg.MODEL.pgm_path
         self.get_dataset_dict()
+        self.pgm_store = load_pgm_store(self.pgm_path)
+        self.pgm_index = dict((video_name, idx) for idx, video_name in
+                              enumerate(self.pgm_store['video']))
 
         self.batch_size = cfg[mode.upper()]['batch_size']
         self.num_threads = cfg[mode.upper()]['num_threads']
@@ -341,27 +344,24 @@ class BSNProposalReader(DataReader):
         print("%s subset video numbers: %d" %
               (self.subset, len(self.video_list)))
 
+    def get_prop_range(self, video_name):
+        idx = self.pgm_index[video_name]
+        begin = self.pgm_store['offsets'][idx]
+        end = min(self.pgm_store['offsets'][idx + 1], begin + self.top_K)
+        return begin, end
+
     def get_props(self, video_name):
-        pdf = pd.read_csv(self.prop_path + video_name + ".csv")
-        pdf = pdf[:self.top_K]
-        props_start = pdf.xmin.values[:]
-        props_end = pdf.xmax.values[:]
-        props_start_score = pdf.xmin_score.values[:]
-        props_end_score = pdf.xmax_score.values[:]
-        props_info = np.hstack([
-            props_start[:, np.newaxis], props_end[:, np.newaxis],
-            props_start_score[:, np.newaxis], props_end_score[:, np.newaxis]
-        ])
+        begin, end = self.get_prop_range(video_name)
+        props_info = np.array(self.pgm_store['props'][begin:end])
         if self.mode == "infer":
             return props_info
         else:
-            props_iou = pdf.match_iou.values[:]
+            props_iou = np.array(self.pgm_store['match_iou'][begin:end])
             return props_iou, props_info
 
     def load_file(self, video_name):
-        video_feat = np.load(self.feat_path + video_name + ".npy")
-        video_feat = video_feat[:self.top_K, :]
-        video_feat = video_feat.astype("float32")
+        begin, end = self.get_prop_range(video_name)
+        video_feat = np.array(self.pgm_store['feats'][begin:end])
         return video_feat
 
     def create_reader(self):
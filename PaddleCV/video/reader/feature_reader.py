@@ -14,6 +14,7 @@
 
 import sys
 from .reader_utils import DataReader
+from .feature_store import FeatureStore
 try:
     import cPickle as pickle
     from cStringIO import StringIO
@@ -34,6 +35,8 @@ class FeatureReader(DataReader):
     dataset cfg: num_classes
                  batch_size
                  list
+                 format: pkl (default) or store, for store the list is the
+                         directory written by data/dataset/youtube8m/pkl2store.py
                  NextVlad only: eigen_file
     """
 
@@ -47,8 +50,12 @@ class FeatureReader(DataReader):
         self.filelist = cfg[mode.upper()]['filelist']
         self.eigen_file = cfg.MODEL.get('eigen_file', None)
         self.seg_num = cfg.MODEL.get('seg_num', None)
+        self.format = cfg.MODEL.get('format', 'pkl')
 
     def create_reader(self):
+        if self.format == 'store':
+            return self.create_store_reader()
+
         fl = open(self.filelist).readlines()
         fl = [line.strip() for line in fl if line.strip() != '']
         if self.mode == 'train':
@@ -102,6 +109,53 @@ class FeatureReader(DataReader):
 
         return reader
 
+    def create_store_reader(self):
+        """
+        read batches from a FeatureStore: the uint8 frames of a whole batch
+        are gathered and dequantized at once in float32, and labels become
+        multi-hot only per batch
+        """
+        store = FeatureStore(self.filelist)
+
+        def reader():
+            indexes = np.arange(len(store))
+            if self.mode == 'train':
+                np.random.shuffle(indexes)
+            for begin in range(0, len(indexes) - self.batch_size + 1,
+                               self.batch_size):
+                batch = indexes[begin:begin + self.batch_size]
+                nframes = store.nframes(batch)
+                if self.name == 'ATTENTIONCLUSTER':
+                    rows = store.frame_offsets[batch][:, None] + \
+                        generate_random_idx_batch(nframes, self.seg_num)
+                    rows = rows.reshape(-1)
+                    nframes = np.full_like(nframes, self.seg_num)
+                else:
+                    rows = store.frame_rows(batch)
+                rgb = store.rgb[rows]
+                audio = store.audio[rows]
+
+                if self.name != 'NEXTVLAD':
+                    rgb = dequantize(
+                        rgb.astype(np.float32),
+                        max_quantized_value=2.,
+                        min_quantized_value=-2.)
+                    audio = dequantize(
+                        audio.astype(np.float32),
+                        max_quantized_value=2.,
+                        min_quantized_value=-2.)
+
+                splits = np.cumsum(nframes)[:-1]
+                rgb = np.split(rgb, splits)
+                audio = np.split(audio, splits)
+                if self.mode != 'infer':
+                    third = store.multi_hot(batch, self.num_classes)
+                else:
+                    third = store.video[batch]
+                yield list(zip(rgb, audio, third))
+
+        return reader
+
 
 def dequantize(feat_vector, max_quantized_value=2., min_quantized_value=-2.):
     """
@@ -131,3 +185,11 @@ def generate_random_idx(feature_len, seg_num):
         pos = (i + np.random.random()) * stride
         idxs.append(min(feature_len - 1, int(pos)))
     return idxs
+
+
+def generate_random_idx_batch(feature_lens, seg_num):
+    """generate_random_idx for a batch of videos, [len(feature_lens), seg_num]"""
+    stride = feature_lens.astype(np.float64)[:, None] / seg_num
+    pos = (np.arange(seg_num) + np.random.random(
+        (len(feature_lens), seg_num))) * stride
+    return np.minimum(feature_lens[:, None] - 1, pos.astype(np.int64))
@@ -0,0 +1,112 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+import numpy as np
+
+# arrays of a feature store directory, one .npy file each
+STORE_ARRAYS = [
+    'rgb', 'audio', 'frame_offsets', 'label_values', 'label_offsets', 'video'
+]
+
+
+class FeatureStore(object):
+    """
+    Columnar store of quantized YouTube-8M frame features:
+        rgb, audio: uint8 [total_frames, dim], frames of video i are rows
+                    frame_offsets[i]:frame_offsets[i + 1]
+        label_values, label_offsets: labels of every video as index lists
+        video: id of every video
+    The feature arrays are memory-mapped, only the rows of a batch are read.
+    """
+
+    def __init__(self, path):
+        for name in STORE_ARRAYS:
+            mmap_mode = 'r' if name in ['rgb', 'audio'] else None
+            setattr(self, name,
+                    np.load(
+                        os.path.join(path, name + '.npy'),
+                        mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.frame_offsets) - 1
+
+    def nframes(self, indexes):
+        return self.frame_offsets[indexes + 1] - self.frame_offsets[indexes]
+
+    def frame_rows(self, indexes):
+        """rows of all frames of the videos indexes, concatenated"""
+        nframes = self.nframes(indexes)
+        starts = np.repeat(self.frame_offsets[indexes] - np.cumsum(nframes) +
+                           nframes, nframes)
+        return starts + np.arange(int(nframes.sum()))
+
+    def multi_hot(self, indexes, num_classes):
+        """dense [len(indexes), num_classes] float32 labels of a batch"""
+        begins = self.label_offsets[indexes]
+        counts = self.label_offsets[indexes + 1] - begins
+        rows = np.repeat(np.arange(len(indexes)), counts)
+        cols = self.label_values[np.repeat(begins - np.cumsum(counts) + counts,
+                                           counts) + np.arange(counts.sum())]
+        label = np.zeros((len(indexes), num_classes), dtype=np.float32)
+        label[rows, cols] = 1
+        return label
+
+
+class FeatureStoreWriter(object):
+    """append pickled YouTube-8M records to a FeatureStore directory"""
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.fout = {
+            name: open(os.path.join(path, name + '.raw'), 'wb')
+            for name in ['rgb', 'audio']
+        }
+        self.dims = {}
+        self.nframes = []
+        self.labels = []
+        self.video = []
+
+    def add(self, video, nframes, rgb, audio, label):
+        for name, feat in [('rgb', rgb), ('audio', audio)]:
+            feat = np.ascontiguousarray(feat[:nframes], dtype=np.uint8)
+            self.dims[name] = feat.shape[1]
+            self.fout[name].write(feat.tobytes())
+        self.nframes.append(nframes)
+        self.labels.append(np.asarray(label, dtype=np.int32).reshape(-1))
+        self.video.append(video)
+
+    def close(self):
+        total = int(np.sum(self.nframes))
+        for name, fout in self.fout.items():
+            fout.close()
+            raw = os.path.join(self.path, name + '.raw')
+            feat = np.memmap(
+                raw, dtype=np.uint8, mode='r', shape=(total, self.dims[name]))
+            np.save(os.path.join(self.path, name + '.npy'), feat)
+            del feat
+            os.remove(raw)
+        frame_offsets = np.zeros(len(self.nframes) + 1, dtype=np.int64)
+        np.cumsum(self.nframes, out=frame_offsets[1:])
+        label_offsets = np.zeros(len(self.labels) + 1, dtype=np.int64)
+        np.cumsum([len(l) for l in self.labels], out=label_offsets[1:])
+        np.save(os.path.join(self.path, 'frame_offsets.npy'), frame_offsets)
+        np.save(os.path.join(self.path, 'label_offsets.npy'), label_offsets)
+        np.save(
+            os.path.join(self.path, 'label_values.npy'),
+            np.concatenate(self.labels) if self.labels else np.zeros(
+                0, dtype=np.int32))
+        np.save(os.path.join(self.path, 'video.npy'), np.array(self.video))
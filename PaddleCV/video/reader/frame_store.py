@@ -0,0 +1,105 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+import numpy as np
+
+
+class PackedVideo(object):
+    """
+    frames of one video in a FrameStore, indexing returns the encoded bytes
+    of a single frame, so only the frames actually used are read
+    """
+
+    def __init__(self, data, frame_offsets):
+        self.data = data
+        self.frame_offsets = frame_offsets
+
+    def __len__(self):
+        return len(self.frame_offsets) - 1
+
+    def __getitem__(self, idx):
+        return self.data[self.frame_offsets[idx]:self.frame_offsets[idx +
+                                                                    1]].tobytes()
+
+
+class FrameStore(object):
+    """
+    Packed frame container: one data file with the encoded frames of all
+    videos back to back, and an index (.npz) with
+        frame_offsets: byte offset of every frame in the data file, [F + 1]
+        video_offsets: first frame of every video, [V + 1]
+        labels, vids: label and name of every video
+    The data file is memory-mapped lazily, so that every reader process
+    maps it on its own.
+    """
+
+    def __init__(self, index_path):
+        index = np.load(index_path)
+        self.frame_offsets = index['frame_offsets']
+        self.video_offsets = index['video_offsets']
+        self.labels = index['labels']
+        self.vids = index['vids']
+        self.data_path = os.path.join(
+            os.path.dirname(index_path), str(index['data_file']))
+        self._data = None
+
+    def __len__(self):
+        return len(self.video_offsets) - 1
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.memmap(self.data_path, dtype=np.uint8, mode='r')
+        return self._data
+
+    def video(self, idx):
+        begin, end = self.video_offsets[idx], self.video_offsets[idx + 1]
+        return PackedVideo(self.data, self.frame_offsets[begin:end + 1])
+
+
+class FrameStoreWriter(object):
+    """write videos one by one into a FrameStore data file and index"""
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.data_file = os.path.splitext(os.path.basename(index_path))[
+            0] + '.bin'
+        self.fout = open(
+            os.path.join(os.path.dirname(index_path), self.data_file), 'wb')
+        self.frame_offsets = [0]
+        self.video_offsets = [0]
+        self.labels = []
+        self.vids = []
+
+    def add(self, vid, label, frames):
+        for frame in frames:
+            self.fout.write(frame)
+            self.frame_offsets.append(self.frame_offsets[-1] + len(frame))
+        self.video_offsets.append(len(self.frame_offsets) - 1)
+        self.labels.append(label)
+        self.vids.append(vid)
+
+    def close(self):
+        self.fout.close()
+        np.savez(
+            self.index_path,
+            frame_offsets=np.array(
+                self.frame_offsets, dtype=np.int64),
+            video_offsets=np.array(
+                self.video_offsets, dtype=np.int64),
+            labels=np.array(
+                self.labels, dtype=np.int64),
+            vids=np.array(self.vids),
+            data_file=np.array(self.data_file))
@@ -41,6 +41,7 @@ from PIL import Image, ImageEnhance
 import logging
 
 from .reader_utils import DataReader
+from .frame_store import FrameStore
 
 logger = logging.getLogger(__name__)
 python_ver = sys.version_info
@@ -48,9 +49,11 @@ python_ver = sys.version_info
 
 class KineticsReader(DataReader):
     """
-    Data reader for kinetics dataset of two format mp4 and pkl.
+    Data reader for kinetics dataset of three format mp4, pkl and pack.
     1. mp4, the original format of kinetics400
     2. pkl, the mp4 was decoded previously and stored as pkl
+    3. pack, the frames of all pkl packed into one memory-mapped file, the
+       list is then the .npz index of the FrameStore
     In both case, load the data, and then get the frame data in the form of numpy and label as an integer.
      dataset cfg: format
                   num_classes
@@ -63,6 +66,12 @@ class KineticsReader(DataReader):
                   image_std
                   batch_size
                   list
+                  seek_decode, seek to the sampled frames of mp4 videos
+                  when the stream seeks exactly, grab all frames otherwise
+     infer cfg:   video_path
+                  window_size, window_stride, frames of the sliding windows
+                  when streaming a long video_path, window_size 0 to predict
+                  it once, window_stride 0 for half of window_size
     """
 
     def __init__(self, name, mode, cfg):
@@ -91,6 +100,8 @@ class KineticsReader(DataReader):
         self.num_trainers = self.get_config_from_sec(mode, 'num_trainers', 1)
         self.trainer_id = self.get_config_from_sec(mode, 'trainer_id', 0)
         self.use_dali = self.get_config_from_sec(mode, 'use_dali', False)
+        # seek to the sampled frames of mp4 videos instead of grabbing all
+        self.seek_decode = self.get_config_from_sec(mode, 'seek_decode', False)
         self.dali_mean = cfg.MODEL.image_mean * (self.seg_num * self.seglen)
         self.dali_std = cfg.MODEL.image_std * (self.seg_num * self.seglen)
 
@@ -98,6 +109,11 @@ class KineticsReader(DataReader):
             self.video_path = cfg[mode.upper()]['video_path']
         else:
             self.video_path = ''
+        self.window_size = self.get_config_from_sec(mode, 'window_size', 0)
+        self.window_stride = self.get_config_from_sec(mode, 'window_stride', 0)
+        if self.window_stride <= 0:
+            # overlap windows by half by default
+            self.window_stride = max(self.window_size // 2, 1)
         if self.fix_random_seed:
             random.seed(0)
             np.random.seed(0)
@@ -108,8 +124,23 @@ class KineticsReader(DataReader):
         if self.use_dali:
             return self.build_dali_reader()
 
+        # if set video_path and window_size for inference mode, predict
+        # sliding windows of this single video
+        if (self.mode == 'infer') and (self.video_path != '') and \
+                self.window_size > 0:
+            _reader = self._stream_reader_creator(
+                self.video_path,
+                self.mode,
+                seg_num=self.seg_num,
+                seglen=self.seglen,
+                short_size=self.short_size,
+                target_size=self.target_size,
+                img_mean=self.img_mean,
+                img_std=self.img_std,
+                window_size=self.window_size,
+                window_stride=self.window_stride)
         # if set video_path for inference mode, just load this single video
-        if (self.mode == 'infer') and (self.video_path != ''):
+        elif (self.mode == 'infer') and (self.video_path != ''):
             # load video from file stored at video_path
             _reader = self._inference_reader_creator(
                 self.video_path,
@@ -146,7 +177,8 @@ class KineticsReader(DataReader):
                                   short_size, target_size, img_mean, img_std):
         def reader():
             try:
-                imgs = mp4_loader(video_path, seg_num, seglen, mode)
+                imgs = mp4_loader(video_path, seg_num, seglen, mode,
+                                  self.seek_decode)
                 if len(imgs) < 1:
                     logger.error('{} frame length {} less than 1.'.format(
                         video_path, len(imgs)))
@@ -163,6 +195,48 @@ class KineticsReader(DataReader):
 
         return reader
 
+    def _stream_reader_creator(self, video_path, mode, seg_num, seglen,
+                               short_size, target_size, img_mean, img_std,
+                               window_size, window_stride):
+        """
+        Sliding windows of window_size frames every window_stride frames of
+        a long video, the label of every window is (video_path, start, end).
+        The video is decoded once, each frame sampled by at least one window
+        is transformed once into a ring buffer of window_size frames, which
+        the overlapping windows then gather from.
+        """
+
+        def transform(img):
+            return imgs_transform([img], mode, 1, 1, short_size, target_size,
+                                  img_mean, img_std)[0]
+
+        def reader():
+            cap = cv2.VideoCapture(video_path)
+            videolen = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            stream = stream_windows(
+                cap, transform, seg_num, seglen, window_size, window_stride,
+                (3, target_size, target_size))
+            nwindows = 0
+            for imgs, start in stream:
+                nwindows += 1
+                yield imgs, (video_path, start, start + window_size)
+            cap.release()
+            if nwindows == 0:
+                # shorter than one window, predict the whole video once
+                imgs = mp4_loader(video_path, seg_num, seglen, mode,
+                                  self.seek_decode)
+                if len(imgs) < 1:
+                    logger.error('{} frame length {} less than 1.'.format(
+                        video_path, len(imgs)))
+                    yield None, None
+                    return
+                imgs = imgs_transform(imgs, mode, seg_num, seglen,
+                                      short_size, target_size, img_mean,
+                                      img_std)
+                yield imgs, (video_path, 0, videolen)
+
+        return reader
+
     def _reader_creator(self,
                         pickle_list,
                         mode,
@@ -183,7 +257,8 @@ class KineticsReader(DataReader):
             # when infer, we store vid as label
             label = int(sample[1])
             try:
-                imgs = mp4_loader(mp4_path, seg_num, seglen, mode)
+                imgs = mp4_loader(mp4_path, seg_num, seglen, mode,
+                                  self.seek_decode)
                 if len(imgs) < 1:
                     logger.error('{} frame length {} less than 1.'.format(
                         mp4_path, len(imgs)))
@@ -223,43 +298,66 @@ class KineticsReader(DataReader):
             return imgs_transform(imgs, mode, seg_num, seglen, \
                          short_size, target_size, img_mean, img_std, name = self.name), ret_label
 
-        def reader_():
-            with open(pickle_list) as flist:
-                full_lines = [line.strip() for line in flist]
-                if self.mode == 'train':
-                    if (not hasattr(reader_, 'seed')):
-                        reader_.seed = 0
-                    random.Random(reader_.seed).shuffle(full_lines)
-                    print("reader shuffle seed", reader_.seed)
-                    if reader_.seed is not None:
-                        reader_.seed += 1
+        def decode_pack(sample, mode, seg_num, seglen, short_size,
+                        target_size, img_mean, img_std):
+            idx = sample[0]
+            frames = store.video(idx)
+            if len(frames) < 1:
+                logger.error('{} frame length {} less than 1.'.format(
+                    store.vids[idx], len(frames)))
+                return None, None
 
-                per_node_lines = int(
-                    math.ceil(len(full_lines) * 1.0 / self.num_trainers))
-                total_lines = per_node_lines * self.num_trainers
+            if mode == 'train' or mode == 'valid' or mode == 'test':
+                ret_label = int(store.labels[idx])
+            elif mode == 'infer':
+                ret_label = str(store.vids[idx])
 
-                # aligned full_lines so that it can evenly divisible
-                full_lines += full_lines[:(total_lines - len(full_lines))]
-                assert len(full_lines) == total_lines
+            imgs = video_loader(frames, seg_num, seglen, mode)
+            return imgs_transform(imgs, mode, seg_num, seglen, \
+                         short_size, target_size, img_mean, img_std, name = self.name), ret_label
 
-                # trainer get own sample
-                lines = full_lines[self.trainer_id:total_lines:
-                                   self.num_trainers]
-                logger.info("trainerid %d, trainer_count %d" %
-                            (self.trainer_id, self.num_trainers))
-                logger.info(
-                    "read images from %d, length: %d, lines length: %d, total: %d"
-                    % (self.trainer_id * per_node_lines, per_node_lines,
-                       len(lines), len(full_lines)))
-                assert len(lines) == per_node_lines
-                for line in lines:
-                    pickle_path = line.strip()
-                    yield [pickle_path]
+        def reader_():
+            if format == 'pack':
+                full_lines = list(range(len(store)))
+            else:
+                with open(pickle_list) as flist:
+                    full_lines = [line.strip() for line in flist]
+            if self.mode == 'train':
+                if (not hasattr(reader_, 'seed')):
+                    reader_.seed = 0
+                random.Random(reader_.seed).shuffle(full_lines)
+                print("reader shuffle seed", reader_.seed)
+                if reader_.seed is not None:
+                    reader_.seed += 1
+
+            per_node_lines = int(
+                math.ceil(len(full_lines) * 1.0 / self.num_trainers))
+            total_lines = per_node_lines * self.num_trainers
+
+            # aligned full_lines so that it can evenly divisible
+            full_lines += full_lines[:(total_lines - len(full_lines))]
+            assert len(full_lines) == total_lines
+
+            # trainer get own sample
+            lines = full_lines[self.trainer_id:total_lines:
+                               self.num_trainers]
+            logger.info("trainerid %d, trainer_count %d" %
+                        (self.trainer_id, self.num_trainers))
+            logger.info(
+                "read images from %d, length: %d, lines length: %d, total: %d"
+                % (self.trainer_id * per_node_lines, per_node_lines,
+                   len(lines), len(full_lines)))
+            assert len(lines) == per_node_lines
+            for line in lines:
+                yield [line]
 
         if format == 'pkl':
             decode_func = decode_pickle
         elif format == 'mp4':
             decode_func = decode_mp4
+        elif format == 'pack':
+            store = FrameStore(pickle_list)
+            decode_func = decode_pack
         else:
             raise "Not implemented format {}".format(format)
 
@@ -731,19 +829,13 @@ def video_loader(frames, nsample, seglen, mode):
     return imgs
 
 
-def mp4_loader(filepath, nsample, seglen, mode):
-    cap = cv2.VideoCapture(filepath)
-    videolen = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    sampledFrames = []
-    for i in range(videolen):
-        ret, frame = cap.read()
-        # maybe first frame is empty
-        if ret == False:
-            continue
-        img = frame[:, :, ::-1]
-        sampledFrames.append(img)
-    average_dur = int(len(sampledFrames) / nsample)
-    imgs = []
+def sample_frame_indices(videolen, nsample, seglen, mode):
+    """
+    indices of the nsample * seglen frames sampled from a video of videolen
+    frames, in sampling order
+    """
+    average_dur = int(videolen / nsample)
+    indices = []
     for i in range(nsample):
         idx = 0
         if mode == 'train':
@@ -764,8 +856,161 @@ def mp4_loader(filepath, nsample, seglen, mode):
                 idx = i
 
         for jj in range(idx, idx + seglen):
-            imgbuf = sampledFrames[int(jj % len(sampledFrames))]
-            img = Image.fromarray(imgbuf, mode='RGB')
-            imgs.append(img)
+            indices.append(int(jj % videolen))
+    return indices
+
 
+def stream_windows(cap, transform, nsample, seglen, window_size,
+                   window_stride, frame_shape):
+    """
+    decode cap sequentially and yield (imgs, start) for every window of
+    window_size frames starting at multiples of window_stride. The frames of
+    a window are sampled like a whole video in inference mode, only sampled
+    frames are retrieved and transformed, once, into a ring buffer of
+    window_size slots, so a frame shared by overlapping windows is reused.
+    """
+    offsets = np.array(
+        sample_frame_indices(window_size, nsample, seglen, 'infer'))
+    sampled = np.zeros(window_size, dtype=bool)
+    sampled[offsets] = True
+    ring = np.zeros((window_size, ) + frame_shape, dtype=np.float32)
+    last = None
+    idx = 0
+    while cap.grab():
+        # windows starting in (idx - window_size, idx] which sample idx
+        first = max(0, (idx - window_size) // window_stride + 1)
+        starts = np.arange(first, idx // window_stride + 1) * window_stride
+        if sampled[idx - starts].any():
+            ret, frame = cap.retrieve()
+            if ret:
+                img = Image.fromarray(frame[:, :, ::-1], mode='RGB')
+                last = transform(img)
+            if last is not None:
+                ring[idx % window_size] = last
+        start = idx + 1 - window_size
+        if start >= 0 and start % window_stride == 0:
+            imgs = ring[(start + offsets) % window_size]
+            yield imgs.reshape((nsample, seglen * frame_shape[0]) +
+                               frame_shape[1:]), start
+        idx += 1
+
+
+def _decode_frames_seek(cap, wanted, max_grab_gap=16):
+    """
+    decode the sorted frame indices wanted, seeking when the next wanted
+    frame is more than max_grab_gap frames ahead and grabbing without
+    retrieving otherwise. The timestamp of the frame decoded after a seek
+    is checked against its index, since many backends snap the seek to a
+    keyframe but still report the requested position. Return None if the
+    stream can not seek exactly or a frame fails to decode.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps > 0:
+        return None
+    frames = {}
+    pos = 0
+    for idx in wanted:
+        seeked = False
+        if idx - pos > max_grab_gap:
+            if not cap.set(cv2.CAP_PROP_POS_FRAMES, idx):
+                return None
+            pos = idx
+            seeked = True
+        while pos < idx:
+            if not cap.grab():
+                return None
+            pos += 1
+        ret, frame = cap.read()
+        if not ret:
+            return None
+        if seeked and int(round(cap.get(cv2.CAP_PROP_POS_MSEC) * fps /
+                                1000.)) != idx:
+            return None
+        frames[idx] = frame[:, :, ::-1]
+        pos += 1
+    return frames
+
+
+def _decode_frames_sequential(cap, videolen, wanted, failed=()):
+    """
+    grab videolen frames but retrieve only the wanted ones. Like a full
+    cap.read() loop, frames that fail to grab or retrieve are skipped and
+    do not count, so the indices are those of the decodable frames. The
+    positions in failed are known to fail and skipped without retrieving,
+    the other frames that are not retrieved are assumed to decode. Return
+    the decoded frames, the number of decodable frames and the positions
+    of the frames that failed so far.
+    """
+    wanted = set(wanted)
+    failed = set(failed)
+    frames = {}
+    count = 0
+    for pos in range(videolen):
+        if not cap.grab():
+            failed.add(pos)
+            continue
+        if pos in failed:
+            continue
+        if count in wanted:
+            ret, frame = cap.retrieve()
+            if not ret:
+                failed.add(pos)
+                continue
+            frames[count] = frame[:, :, ::-1]
+        count += 1
+    return frames, count, failed
+
+
+def _nearest_frame(frames, idx):
+    if idx in frames:
+        return frames[idx]
+    return frames[min(frames, key=lambda k: (abs(k - idx), k))]
+
+
+def mp4_loader(filepath, nsample, seglen, mode, seek=False, max_retry=3):
+    """
+    decode only the frames sampled for nsample segments of seglen frames,
+    always nsample * seglen images unless no frame can be decoded. The frame
+    indices are computed from the frame count first, then the frames are
+    reached by grab() without retrieve(), or by seeking if seek is set and
+    the stream seeks exactly. If fewer frames decode than the header
+    counts, the indices are sampled again from the decodable frames like in
+    a full decode, at most max_retry times. A frame still missing then is
+    replaced by the nearest decoded one.
+    """
+    cap = cv2.VideoCapture(filepath)
+    videolen = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if videolen < 1:
+        cap.release()
+        return []
+    rand_state = random.getstate()
+    indices = sample_frame_indices(videolen, nsample, seglen, mode)
+    frames = _decode_frames_seek(cap, sorted(set(indices))) if seek else None
+    if frames is None:
+        if seek:
+            cap.release()
+            cap = cv2.VideoCapture(filepath)
+        frames, count, failed = _decode_frames_sequential(cap, videolen,
+                                                          indices)
+        sampled_len = videolen
+        retry = 0
+        while 0 < count != sampled_len and retry < max_retry:
+            # the frame count of the header is wrong or frames fail to
+            # decode, sample again from the decodable frames with the same
+            # random draws
+            random.setstate(rand_state)
+            indices = sample_frame_indices(count, nsample, seglen, mode)
+            sampled_len = count
+            cap.release()
+            cap = cv2.VideoCapture(filepath)
+            frames, count, failed = _decode_frames_sequential(
+                cap, videolen, indices, failed)
+            retry += 1
+    cap.release()
+    if len(frames) == 0:
+        return []
+
+    imgs = []
+    for idx in indices:
+        imgs.append(Image.fromarray(_nearest_frame(frames, idx), mode='RGB'))
     return imgs
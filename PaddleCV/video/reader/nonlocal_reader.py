@@ -21,6 +21,7 @@ import cv2
 import logging
 
 from .reader_utils import DataReader
+from metrics.multicrop_test.multicrop_test_metrics import get_finished_videos
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +42,8 @@ class NonlocalReader(DataReader):
                 jitter_scales
                 Test only cfg: num_test_clips
                                use_multi_crop
+                               resume, skip the videos finished in the
+                                       partial results of checkpoint_dir
     """
 
     def __init__(self, name, mode, cfg):
@@ -74,6 +77,12 @@ class NonlocalReader(DataReader):
         if (self.mode == 'infer') and (cfg['INFER']['video_path'] != ''):
             filelist = create_tmp_inference_file(cfg['INFER']['video_path'])
 
+        if (self.mode == 'test') and cfg['TEST'].get('resume', False):
+            finished = get_finished_videos(cfg['TEST']['checkpoint_dir'],
+                                           self.name,
+                                           cfg['TEST']['num_test_clips'])
+            filelist = create_tmp_resume_file(filelist, finished)
+
         if self.mode == 'train':
             sample_times = 1
             return reader_func(filelist, batch_size, sample_times, True, True,
@@ -105,6 +114,21 @@ def create_tmp_inference_file(video_path,
     return file_path
 
 
+def create_tmp_resume_file(filelist,
+                           finished,
+                           file_path='temp_nonlocal_resume_list'):
+    fl = open(filelist).readlines()
+    fl = [line.strip() for line in fl if line.strip() != '']
+    tmp_file = open(file_path, 'w')
+    for line in fl:
+        if int(line.split(' ')[1]) not in finished:
+            tmp_file.write(line + '\n')
+    tmp_file.close()
+    logger.info('Skip {} finished videos, test {} clips left'.format(
+        len(finished), len(open(file_path).readlines())))
+    return file_path
+
+
 def video_fast_get_frame(video_path,
                          sampling_rate=1,
                          length=64,
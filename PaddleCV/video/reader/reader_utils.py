@@ -12,11 +12,17 @@
 #See the License for the specific language governing permissions and
 #limitations under the License.
 
+import os
+import json
 import pickle
+import hashlib
+import logging
 import cv2
 import numpy as np
 import random
 
+logger = logging.getLogger(__name__)
+
 
 class ReaderNotFoundError(Exception):
     "Error: reader not found"
@@ -52,6 +58,56 @@ class DataReader(object):
         return self.cfg[sec.upper()].get(item, default)
 
 
+def load_label_cache(cache_dir, prefix, video_list, annos, params, label_num,
+                     get_label):
+    """
+    Labels of all videos of video_list, computed once with get_label(video_name)
+    and saved as label_num float32 .npy files [len(video_list), ...] in
+    cache_dir, which are memory-mapped when loaded again. The file names
+    contain a digest of the annotations and params, so a cache built for
+    other annotations or scales is never used.
+    """
+    digest = hashlib.md5(
+        json.dumps(
+            [video_list, [annos[name] for name in video_list], params],
+            sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    paths = [
+        os.path.join(cache_dir, '{}_{}_{}.npy'.format(prefix, digest, i))
+        for i in range(label_num)
+    ]
+    if all(os.path.exists(path) for path in paths):
+        return [np.load(path, mmap_mode='r') for path in paths]
+
+    logger.info('building label cache {} for {} videos'.format(
+        os.path.join(cache_dir, prefix + '_' + digest), len(video_list)))
+    labels = None
+    for idx, video_name in enumerate(video_list):
+        video_label = get_label(video_name)
+        if labels is None:
+            labels = [
+                np.zeros(
+                    (len(video_list), ) + np.shape(label), dtype='float32')
+                for label in video_label
+            ]
+        for label, value in zip(labels, video_label):
+            label[idx] = value
+    if labels is None:
+        return [np.zeros((0, ), dtype='float32') for _ in range(label_num)]
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        for path, label in zip(paths, labels):
+            tmp_path = path + '.{}.tmp'.format(os.getpid())
+            with open(tmp_path, 'wb') as f:
+                np.save(f, label)
+            os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        logger.warning('failed to save label cache to {}: {}'.format(
+            cache_dir, e))
+        return labels
+    return [np.load(path, mmap_mode='r') for path in paths]
+
+
 class ReaderZoo(object):
     def __init__(self):
         self.reader_zoo = {}
@@ -0,0 +1,179 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from __future__ import print_function
+
+import random
+import unittest
+import numpy as np
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import cv2
+from reader import kinetics_reader
+from reader.kinetics_reader import mp4_loader
+
+
+class StubCapture(object):
+    """
+    cv2.VideoCapture of a video of num_frames frames, the first two
+    channels of frame i hold i % 256 and i // 256.
+    grab() fails at the positions in bad_grab, retrieve() at those in
+    bad_retrieve, and a seek lands on the keyframe before the wanted frame
+    but reports the wanted position, like many backends do.
+    """
+
+    def __init__(self, num_frames, frame_count=None, bad_grab=(),
+                 bad_retrieve=(), keyint=1, fps=25.):
+        self.num_frames = num_frames
+        self.frame_count = num_frames if frame_count is None else frame_count
+        self.bad_grab = set(bad_grab)
+        self.bad_retrieve = set(bad_retrieve)
+        self.keyint = keyint
+        self.fps = fps
+        self.pos = 0
+        self.reported_pos = 0
+        self.grabbed = None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.reported_pos)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return (self.pos - 1) * 1000. / self.fps
+        return 0.
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self.pos = int(value) // self.keyint * self.keyint
+        self.reported_pos = int(value)
+        return True
+
+    def grab(self):
+        self.grabbed = None
+        if self.pos >= self.num_frames:
+            return False
+        pos = self.pos
+        self.pos += 1
+        self.reported_pos += 1
+        if pos in self.bad_grab:
+            return False
+        self.grabbed = pos
+        return True
+
+    def retrieve(self):
+        if self.grabbed is None or self.grabbed in self.bad_retrieve:
+            return False, None
+        frame = np.zeros((2, 2, 3), dtype=np.uint8)
+        frame[:, :, 0] = self.grabbed % 256
+        frame[:, :, 1] = self.grabbed // 256
+        return True, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        pass
+
+
+def frame_id(frame):
+    return int(frame[0, 0, 0]) + 256 * int(frame[0, 0, 1])
+
+
+def full_decode_loader(cap, nsample, seglen, mode):
+    """ frames sampled from a full cap.read() decode, as mp4_loader did """
+    frames = []
+    for i in range(int(cap.get(cv2.CAP_PROP_FRAME_COUNT))):
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame_id(frame))
+    return [
+        frames[idx]
+        for idx in kinetics_reader.sample_frame_indices(
+            len(frames), nsample, seglen, mode)
+    ]
+
+
+class TestMp4Loader(unittest.TestCase):
+    def load(self, nsample, seglen, mode, seek=False, seed=0, **kwargs):
+        random.seed(seed)
+        with mock.patch.object(kinetics_reader.cv2, 'VideoCapture',
+                               lambda path: StubCapture(**kwargs)):
+            imgs = mp4_loader('stub.mp4', nsample, seglen, mode, seek)
+        # the loader returns RGB images of the BGR frames
+        return [frame_id(np.array(img)[:, :, ::-1]) for img in imgs]
+
+    def expected(self, nsample, seglen, mode, seed=0, **kwargs):
+        random.seed(seed)
+        return full_decode_loader(StubCapture(**kwargs), nsample, seglen, mode)
+
+    def test_all_frames_decode(self):
+        for mode in ['train', 'infer']:
+            for seed in range(5):
+                self.assertEqual(
+                    self.load(3, 5, mode, seed=seed, num_frames=100),
+                    self.expected(3, 5, mode, seed=seed, num_frames=100))
+
+    def test_retrieve_fails_twice(self):
+        # the wrong frame count makes 50 sampled only after resampling
+        kwargs = dict(num_frames=100, frame_count=120, bad_retrieve=[50])
+        imgs = self.load(3, 5, 'infer', **kwargs)
+        self.assertEqual(len(imgs), 15)
+        self.assertEqual(imgs, self.expected(3, 5, 'infer', **kwargs))
+
+    def test_retrieve_fails(self):
+        # frame 50 is sampled in inference mode and fails to decode
+        imgs = self.load(3, 5, 'infer', num_frames=100, bad_retrieve=[50])
+        self.assertEqual(len(imgs), 15)
+        self.assertNotIn(50, imgs)
+        self.assertEqual(
+            imgs,
+            self.expected(3, 5, 'infer', num_frames=100, bad_retrieve=[50]))
+
+    def test_first_frame_empty(self):
+        for mode in ['train', 'infer']:
+            imgs = self.load(4, 3, mode, num_frames=30, bad_grab=[0])
+            self.assertEqual(len(imgs), 12)
+            self.assertEqual(
+                imgs, self.expected(4, 3, mode, num_frames=30, bad_grab=[0]))
+
+    def test_wrong_frame_count(self):
+        imgs = self.load(3, 5, 'train', num_frames=60, frame_count=90)
+        self.assertEqual(len(imgs), 15)
+        self.assertEqual(
+            imgs, self.expected(3, 5, 'train', num_frames=60, frame_count=90))
+
+    def test_no_frame_decodes(self):
+        self.assertEqual(
+            self.load(3, 5, 'infer', num_frames=10, bad_grab=range(10)), [])
+
+    def test_inexact_seek(self):
+        # seeks snap to every 10th frame, so seeking falls back to grabbing
+        for keyint in [1, 10]:
+            imgs = self.load(3, 5, 'infer', seek=True, num_frames=300,
+                             keyint=keyint)
+            self.assertEqual(imgs,
+                             self.expected(3, 5, 'infer', num_frames=300))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -67,7 +67,6 @@ def infer():
     args = parse_args()
     model_path = args.model_path
     use_cuda = True if args.use_cuda else False
-    data_reader, _ = reader.prepare_reader(args.test_path, 32 * 16)
 
     place = fluid.CUDAPlace(0) if use_cuda else fluid.CPUPlace()
     inference_scope = fluid.Scope()
@@ -78,13 +77,15 @@ def infer():
     [inference_program, feed_target_names,
      fetch_targets] = fluid.io.load_inference_model(model_path, exe)
 
+    data_reader, _ = reader.prepare_reader(
+        args.test_path, 32 * 16, "seq_len" in feed_target_names)
     loader = fluid.io.DataLoader.from_generator(
         feed_list=[
             inference_program.block(0).var(e) for e in feed_target_names
         ],
         capacity=10000,
         iterable=True)
-    loader.set_sample_list_generator(data_reader, places=place)
+    loader.set_batch_generator(data_reader, places=place)
 
     loss_sum = 0.0
     score = []
@@ -46,8 +46,11 @@ def din_attention(hist, target_expand, mask):
     return out
 
 
-def network(item_count, cat_count):
-    """network definition"""
+def network(item_count, cat_count, mask_from_length=False):
+    """
+    network definition, if mask_from_length is set the attention mask is
+    built from the fed history lengths "seq_len" instead of being fed
+    """
 
     seq_len = -1
     item_emb_size = 64
@@ -65,7 +68,11 @@ def network(item_count, cat_count):
     target_item = fluid.data(name="target_item", shape=[None], dtype="int64")
     target_cat = fluid.data(name="target_cat", shape=[None], dtype="int64")
     label = fluid.data(name="label", shape=[None, 1], dtype="float32")
-    mask = fluid.data(name="mask", shape=[None, seq_len, 1], dtype="float32")
+    if mask_from_length:
+        mask_input = fluid.data(name="seq_len", shape=[None], dtype="int64")
+    else:
+        mask_input = fluid.data(
+            name="mask", shape=[None, seq_len, 1], dtype="float32")
     target_item_seq = fluid.data(
         name="target_item_seq", shape=[None, seq_len], dtype="int64")
     target_cat_seq = fluid.data(
@@ -118,6 +125,15 @@ def network(item_count, cat_count):
     target_concat = fluid.layers.concat(
         [target_item_emb, target_cat_emb], axis=1)
 
+    if mask_from_length:
+        # 0 for history positions and -1e9 for padding
+        mask = fluid.layers.sequence_mask(
+            mask_input, maxlen=fluid.layers.shape(hist_item_seq)[1],
+            dtype="float32")
+        mask = fluid.layers.scale(mask, scale=1e9, bias=-1e9)
+        mask = fluid.layers.unsqueeze(mask, axes=[2])
+    else:
+        mask = mask_input
     out = din_attention(hist_seq_concat, target_seq_concat, mask)
     out_fc = fluid.layers.fc(name="out_fc",
                              input=out,
@@ -137,4 +153,4 @@ def network(item_count, cat_count):
     avg_loss = fluid.layers.mean(loss)
     return avg_loss, fluid.layers.sigmoid(logit), \
            [hist_item_seq, hist_cat_seq, target_item, \
-           target_cat, label, mask, target_item_seq, target_cat_seq]
+           target_cat, label, mask_input, target_item_seq, target_cat_seq]
@@ -13,79 +13,108 @@
 #limitations under the License.
 
 import os
-import random
+import itertools
 import numpy as np
-import paddle
-import pickle
 
 
-def pad_batch_data(input, max_len):
-    res = np.array([x + [0] * (max_len - len(x)) for x in input])
-    res = res.astype("int64").reshape([-1, max_len])
-    return res
+def make_data(data, idx, mask_as_length=False):
+    """
+    Assemble the batch of samples idx into padded arrays, in the order of
+    the network feed list. The attention mask is [B, max_len, 1] with 0 for
+    history positions and -1e9 for padding, or the [B] history lengths if
+    mask_as_length is set, so that the network builds the mask itself.
+    """
+    starts = data["offsets"][idx]
+    lens = data["offsets"][idx + 1] - starts
+    batch_size, max_len = len(idx), int(lens.max())
 
+    # flat positions of every history entry of the batch
+    rows = np.repeat(np.arange(batch_size), lens)
+    cols = np.arange(rows.shape[0]) - np.repeat(np.cumsum(lens) - lens, lens)
+    src = np.repeat(starts, lens) + cols
+    item = np.zeros((batch_size, max_len), dtype="int64")
+    cat = np.zeros((batch_size, max_len), dtype="int64")
+    item[rows, cols] = data["hist_item"][src]
+    cat[rows, cols] = data["hist_cat"][src]
 
-def make_data(b):
-    max_len = max(len(x[0]) for x in b)
-    item = pad_batch_data([x[0] for x in b], max_len)
-    cat = pad_batch_data([x[1] for x in b], max_len)
-    len_array = [len(x[0]) for x in b]
-    mask = np.array(
-        [[0] * x + [-1e9] * (max_len - x) for x in len_array]).reshape(
-            [-1, max_len, 1])
-    target_item_seq = np.array(
-        [[x[2]] * max_len for x in b]).astype("int64").reshape([-1, max_len])
-    target_cat_seq = np.array(
-        [[x[3]] * max_len for x in b]).astype("int64").reshape([-1, max_len])
-    res = []
-    for i in range(len(b)):
-        res.append([
-            item[i], cat[i], b[i][2], b[i][3], b[i][4], mask[i],
-            target_item_seq[i], target_cat_seq[i]
-        ])
-    return res
+    target_item = data["target_item"][idx]
+    target_cat = data["target_cat"][idx]
+    label = data["label"][idx].reshape([-1, 1])
+    if mask_as_length:
+        mask = lens
+    else:
+        mask = np.where(
+            np.arange(max_len) < lens[:, None], 0.0, -1e9).astype("float32")
+        mask = mask.reshape([-1, max_len, 1])
+    target_item_seq = np.repeat(target_item[:, None], max_len, axis=1)
+    target_cat_seq = np.repeat(target_cat[:, None], max_len, axis=1)
+    return [
+        item, cat, target_item, target_cat, label, mask, target_item_seq,
+        target_cat_seq
+    ]
 
 
-def batch_reader(reader, batch_size, group_size):
+def batch_reader(data, order, batch_size, group_size, mask_as_length=False):
+    """
+    Sort every group_size samples by history length and cut them into
+    batches, the incomplete batch of the last group is dropped.
+    """
+    lens = np.diff(data["offsets"])[order]
+
     def batch_reader():
-        bg = []
-        for line in reader:
-            bg.append(line)
-            if len(bg) == group_size:
-                sortb = sorted(bg, key=lambda x: len(x[0]), reverse=False)
-                bg = []
-                for i in range(0, group_size, batch_size):
-                    b = sortb[i:i + batch_size]
-                    yield make_data(b)
-        len_bg = len(bg)
-        if len_bg != 0:
-            sortb = sorted(bg, key=lambda x: len(x[0]), reverse=False)
-            bg = []
-            remain = len_bg % batch_size
-            for i in range(0, len_bg - remain, batch_size):
-                b = sortb[i:i + batch_size]
-                yield make_data(b)
+        for begin in range(0, len(order), group_size):
+            group = order[begin:begin + group_size]
+            group = group[np.argsort(
+                lens[begin:begin + group_size], kind="mergesort")]
+            for i in range(0, len(group) - batch_size + 1, batch_size):
+                yield make_data(data, group[i:i + batch_size], mask_as_length)
 
     return batch_reader
 
 
 def base_read(file_dir):
-    res = []
-    max_len = 0
+    """
+    Load the dataset into flat int64 history arrays with per-sample offsets,
+    history of sample i is hist_item[offsets[i]:offsets[i + 1]].
+    """
+    hist, cate, target_item, target_cat, label = [], [], [], [], []
+    lens = []
     with open(file_dir, "r") as fin:
         for line in fin:
             line = line.strip().split(';')
-            hist = line[0].split()
-            cate = line[1].split()
-            max_len = max(max_len, len(hist))
-            res.append([hist, cate, line[2], line[3], float(line[4])])
-    return res, max_len
+            hist_toks = line[0].split()
+            cate_toks = line[1].split()
+            n = len(hist_toks)
+            # the categories share the offsets of the history, padded with
+            # 0 like pad_batch_data did
+            cate_toks = cate_toks[:n] + ['0'] * (n - len(cate_toks))
+            hist.append(hist_toks)
+            cate.append(cate_toks)
+            lens.append(n)
+            target_item.append(line[2])
+            target_cat.append(line[3])
+            label.append(line[4])
+    offsets = np.zeros(len(lens) + 1, dtype="int64")
+    np.cumsum(lens, out=offsets[1:])
+    data = {
+        "hist_item": np.array(list(itertools.chain.from_iterable(hist)),
+                              dtype="int64"),
+        "hist_cat": np.array(list(itertools.chain.from_iterable(cate)),
+                             dtype="int64"),
+        "offsets": offsets,
+        "target_item": np.array(target_item, dtype="int64"),
+        "target_cat": np.array(target_cat, dtype="int64"),
+        "label": np.array(label, dtype="float32"),
+    }
+    max_len = int(max(lens)) if lens else 0
+    return data, max_len
 
 
-def prepare_reader(data_path, bs):
+def prepare_reader(data_path, bs, mask_as_length=False):
     data_set, max_len = base_read(data_path)
-    random.shuffle(data_set)
-    return batch_reader(data_set, bs, bs * 20), max_len
+    order = np.random.permutation(len(data_set["label"]))
+    return batch_reader(data_set, order, bs, bs * 20,
+                        mask_as_length), max_len
 
 
 def config_read(config_path):
@@ -62,6 +62,11 @@ def parse_args():
         '--base_lr', type=float, default=0.85, help='based learning rate')
     parser.add_argument(
         '--num_devices', type=int, default=1, help='Number of GPU devices')
+    parser.add_argument(
+        '--mask_from_length',
+        type=int,
+        default=0,
+        help='whether to feed history lengths and build the attention mask in the network')
     parser.add_argument(
         '--enable_ce',
         action='store_true',
@@ -87,11 +92,12 @@ def train():
 
     logger.info("reading data begins")
     user_count, item_count, cat_count = reader.config_read(config_path)
-    data_reader, max_len = reader.prepare_reader(train_path, args.batch_size *
-                                                 args.num_devices)
+    data_reader, max_len = reader.prepare_reader(
+        train_path, args.batch_size * args.num_devices, args.mask_from_length)
     logger.info("reading data completes")
 
-    avg_cost, pred, feed_list = network.network(item_count, cat_count)
+    avg_cost, pred, feed_list = network.network(
+        item_count, cat_count, args.mask_from_length)
 
     clip = fluid.clip.GradientClipByGlobalNorm(clip_norm=5.0)
     base_lr = args.base_lr
@@ -110,7 +116,7 @@ def train():
 
     loader = fluid.io.DataLoader.from_generator(
         feed_list=feed_list, capacity=10000, iterable=True)
-    loader.set_sample_list_generator(data_reader, places=place)
+    loader.set_batch_generator(data_reader, places=place)
     if use_parallel:
         train_exe = fluid.ParallelExecutor(
             use_cuda=use_cuda, loss_name=avg_cost.name)
@@ -149,11 +155,7 @@ def train():
                         global_step <= 400000 and global_step % 50000 == 0):
                     save_dir = os.path.join(args.model_dir,
                                             "global_step_" + str(global_step))
-                    feed_var_name = [
-                        "hist_item_seq", "hist_cat_seq", "target_item",
-                        "target_cat", "label", "mask", "target_item_seq",
-                        "target_cat_seq"
-                    ]
+                    feed_var_name = [var.name for var in feed_list]
                     fetch_vars = [avg_cost, pred]
                     fluid.io.save_inference_model(save_dir, feed_var_name,
                                                   fetch_vars, exe)
@@ -34,6 +34,13 @@ def parse_args():
         help="model_type [static|padding|cudnn]")
     parser.add_argument(
         "--data_path", type=str, help="all the data for train,valid,test")
+    parser.add_argument(
+        "--train_store",
+        type=str,
+        default="",
+        help="train session store, used instead of data_path if set")
+    parser.add_argument(
+        "--test_store", type=str, default="", help="test session store")
     parser.add_argument('--para_init', action='store_true')
     parser.add_argument(
         '--use_gpu', type=bool, default=False, help='whether using gpu')
@@ -296,7 +296,14 @@ def train_ptb_lm():
 
         data_path = args.data_path
         print("begin to load data")
-        ptb_data = reader.get_ptb_data(data_path)
+        if args.train_store:
+            ptb_data, eos = reader.get_store_data(args.train_store,
+                                                  args.test_store)
+            if eos >= vocab_size:
+                raise ValueError("vocab_size %d has no room for the end of "
+                                 "session id %d" % (vocab_size, eos))
+        else:
+            ptb_data = reader.get_ptb_data(data_path)
         print("finished load data")
         train_data, valid_data, test_data = ptb_data
 
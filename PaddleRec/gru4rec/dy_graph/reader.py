@@ -20,6 +20,11 @@ import os
 import sys
 import numpy as np
 
+LOCAL_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(LOCAL_PATH, ".."))
+
+from session_store import SessionStore
+
 EOS = "</eos>"
 
 
@@ -68,6 +73,20 @@ def get_ptb_data(data_path=None):
     return train_ids, valid_ids, test_ids
 
 
+def get_store_data(train_store, test_store):
+    """
+    id streams of session stores made by ../session_store.py. The item ids
+    start at 0, so the sessions are separated by the id after the largest
+    item id instead of a vocab entry. Also return that eos id.
+    """
+    train = SessionStore.load(train_store)
+    test = SessionStore.load(test_store)
+    eos = int(max(train.ids.max(initial=-1), test.ids.max(initial=-1))) + 1
+    train_stream = train.to_stream(eos)
+    test_stream = test.to_stream(eos)
+    return (train_stream, test_stream, test_stream), eos
+
+
 def get_data_iter(raw_data, batch_size, num_steps):
     data_len = len(raw_data)
     raw_data = np.asarray(raw_data, dtype="int64")
@@ -0,0 +1,194 @@
+"""
+Preprocessed session store and bucketing batch sampler for gru4rec.
+
+The text files of train_dir/test_dir are parsed once into a flat int32
+array of item ids plus per-session offsets and saved as a .npz file:
+
+    python session_store.py train_data train_data.npz
+
+Batches are cut from length-sorted groups of sessions and come with the
+flattened src/trg ids and LoD offsets already computed, optionally with
+negatives drawn in the same background worker.
+"""
+import os
+import io
+import sys
+import threading
+import numpy as np
+from six.moves import queue
+
+
+class SessionStore(object):
+    """sessions as flat int32 item ids, session i is ids[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, ids, offsets):
+        self.ids = ids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_text(cls, file_dir):
+        lines = []
+        for fi in sorted(os.listdir(file_dir)):
+            with io.open(os.path.join(file_dir, fi), "r", encoding='utf-8') as f:
+                lines.extend(l.split() for l in f)
+        lens = np.array([len(l) for l in lines], dtype="int64")
+        offsets = np.zeros(len(lines) + 1, dtype="int64")
+        np.cumsum(lens, out=offsets[1:])
+        ids = np.array([w for l in lines for w in l], dtype="int32")
+        return cls(ids, offsets)
+
+    def save(self, path):
+        np.savez(path, ids=self.ids, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["ids"], data["offsets"])
+
+    def seq_lens(self):
+        """length of the src/trg sequences, one less than the session length"""
+        return np.maximum(np.diff(self.offsets) - 1, 0)
+
+    def to_stream(self, eos):
+        """
+        all sessions in one id stream, each one followed by eos. The item
+        ids of text2paddle.py start at 0, so eos has to be a reserved id
+        outside the item vocab, e.g. the vocab size.
+        """
+        lens = np.diff(self.offsets)
+        stream = np.full(len(self.ids) + len(lens), eos, dtype="int64")
+        pos = np.arange(len(self.ids)) + np.repeat(np.arange(len(lens)), lens)
+        stream[pos] = self.ids
+        return stream
+
+
+def sample_negatives(pos, neg_size, rng=np.random):
+    """
+    Draw neg_size negatives per position from the positives of the batch,
+    i.e. by popularity, as to_lodtensor_bpr does: neg_size copies of the
+    positives are shuffled, so they are drawn without replacement. A
+    negative equal to its positive is replaced by the positive mirrored in
+    the batch.
+    """
+    length = len(pos)
+    neg = rng.permutation(np.tile(pos, neg_size)).reshape(length, neg_size)
+    mirror = pos[length - 1 - np.arange(length)][:, None]
+    return np.where(neg == pos[:, None], mirror, neg)
+
+
+def make_batch(store, sessions, neg_size=0, rng=np.random):
+    """
+    Gather the sessions into flat [T, 1] int64 src/trg arrays and their
+    LoD offsets; if neg_size > 0 also add the [T, 1 + neg_size] label of
+    the positive followed by its negatives.
+    """
+    lens = store.seq_lens()[sessions]
+    lod = np.zeros(len(sessions) + 1, dtype="int64")
+    np.cumsum(lens, out=lod[1:])
+    src = np.repeat(store.offsets[sessions], lens) + \
+        np.arange(lod[-1]) - np.repeat(lod[:-1], lens)
+    batch = {
+        "src": store.ids[src].astype("int64").reshape([-1, 1]),
+        "trg": store.ids[src + 1].astype("int64").reshape([-1, 1]),
+        "lod": lod.tolist(),
+    }
+    if neg_size > 0:
+        pos = batch["trg"][:, 0]
+        batch["label"] = np.column_stack(
+            (pos, sample_negatives(pos, neg_size, rng)))
+    return batch
+
+
+def bucket_batches(store, batch_size, sort_group_size, shuffle=True,
+                   max_len=0, drop_last=False, rng=np.random):
+    """
+    Session ids of every batch of one epoch: sessions are shuffled, cut
+    into groups of sort_group_size and sorted by length inside each group,
+    so that sessions of a batch have similar lengths. With drop_last the
+    batches shorter than batch_size are dropped, as sort_batch in utils.py
+    does.
+    """
+    lens = store.seq_lens()
+    sessions = np.nonzero((lens > 0) & ((lens <= max_len) | (max_len <= 0)))[0]
+    if shuffle:
+        sessions = sessions[rng.permutation(len(sessions))]
+    batches = []
+    for begin in range(0, len(sessions), sort_group_size):
+        group = sessions[begin:begin + sort_group_size]
+        group = group[np.argsort(-lens[group], kind="mergesort")]
+        end = len(group) - batch_size + 1 if drop_last else len(group)
+        batches.extend(group[i:i + batch_size]
+                       for i in range(0, end, batch_size))
+    return batches
+
+
+def store_reader(store, batch_size, sort_group_size=None, neg_size=0,
+                 shuffle=True, max_len=0, drop_last=False, capacity=16):
+    """
+    Batch reader over a SessionStore. Batches are assembled, negatives
+    included, by a background thread up to capacity batches ahead. The
+    thread stops when the reader is closed before the end of the epoch; an
+    exception raised in the thread is raised again by the reader.
+    """
+    sort_group_size = sort_group_size or batch_size * 20
+
+    def put(out, stop, item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(out, stop):
+        try:
+            for sessions in bucket_batches(store, batch_size,
+                                           sort_group_size, shuffle, max_len,
+                                           drop_last):
+                if not put(out, stop, make_batch(store, sessions, neg_size)):
+                    return
+        except Exception as e:
+            put(out, stop, e)
+        finally:
+            put(out, stop, None)
+
+    def get(out, worker):
+        while True:
+            try:
+                return out.get(timeout=0.1)
+            except queue.Empty:
+                if not worker.is_alive() and out.empty():
+                    raise RuntimeError("session store reader thread exited")
+
+    def reader():
+        out = queue.Queue(maxsize=capacity)
+        stop = threading.Event()
+        worker = threading.Thread(target=produce, args=(out, stop))
+        worker.daemon = True
+        worker.start()
+        try:
+            batch = get(out, worker)
+            while batch is not None:
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+                batch = get(out, worker)
+        finally:
+            stop.set()
+            worker.join()
+
+    return reader
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python session_store.py <data_dir> <output.npz>")
+        sys.exit(1)
+    store = SessionStore.from_text(sys.argv[1])
+    store.save(sys.argv[2])
+    print("saved %d sessions, %d items to %s" %
+          (len(store), len(store.ids), sys.argv[2]))
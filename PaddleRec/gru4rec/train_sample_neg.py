@@ -18,6 +18,11 @@ def parse_args():
     parser = argparse.ArgumentParser("gru4rec benchmark.")
     parser.add_argument(
         '--train_dir', type=str, default='train_data', help='train file')
+    parser.add_argument(
+        '--session_store',
+        type=str,
+        default='',
+        help='session store made by session_store.py, used instead of train_dir if set')
     parser.add_argument(
         '--vocab_path', type=str, default='vocab.txt', help='vocab file')
     parser.add_argument(
@@ -62,9 +67,14 @@ def train():
     parallel = True if args.parallel else False
     print("use_cuda:", use_cuda, "parallel:", parallel)
     batch_size = args.batch_size
-    vocab_size, train_reader = utils.prepare_data(
-        train_dir, vocab_path, batch_size=batch_size * get_cards(args),\
-        buffer_size=1000, word_freq_threshold=0, is_train=True)
+    if args.session_store:
+        vocab_size, train_reader = utils.prepare_store_data(
+            args.session_store, vocab_path, batch_size * get_cards(args),
+            neg_size=args.neg_size, buffer_size=1000, is_train=True)
+    else:
+        vocab_size, train_reader = utils.prepare_data(
+            train_dir, vocab_path, batch_size=batch_size * get_cards(args),\
+            buffer_size=1000, word_freq_threshold=0, is_train=True)
 
     # Train program
     if args.loss == 'bpr':
@@ -104,8 +114,11 @@ def train():
         newest_ppl = 0
         for data in train_reader():
             i += 1
-            ls, lp, ll = utils.to_lodtensor_bpr(data, args.neg_size, vocab_size,
-                                                place)
+            if args.session_store:
+                ls, lp, ll = utils.to_lodtensor_store_bpr(data, place)
+            else:
+                ls, lp, ll = utils.to_lodtensor_bpr(data, args.neg_size,
+                                                    vocab_size, place)
             ret_avg_cost = train_exe.run(
                 feed={"src": ls,
                       "label": ll,
@@ -7,6 +7,7 @@ import paddle.fluid as fluid
 import paddle
 import os
 import io
+from session_store import SessionStore, store_reader
 
 
 def to_lodtensor(data, place):
@@ -25,6 +26,24 @@ def to_lodtensor(data, place):
     return res
 
 
+def to_lodtensor_flat(flattened_data, lod, place):
+    """ convert flattened data with precomputed lod offsets to LODtensor """
+    res = fluid.LoDTensor()
+    res.set(flattened_data, place)
+    res.set_lod([lod])
+    return res
+
+
+def to_lodtensor_store_bpr(batch, place):
+    """ convert a session store batch with negatives to LODtensor """
+    lod = batch["lod"]
+    res = to_lodtensor_flat(batch["src"], lod, place)
+    res_pos = to_lodtensor_flat(
+        np.zeros_like(batch["src"]), lod, place)
+    res_label = to_lodtensor_flat(batch["label"], lod, place)
+    return res, res_pos, res_label
+
+
 def to_lodtensor_bpr(raw_data, neg_size, vocab_size, place):
     """ convert to LODtensor """
     data = [dat[0] for dat in raw_data]
@@ -117,6 +136,27 @@ def prepare_data(file_dir,
     return vocab_size, reader
 
 
+def prepare_store_data(store_path,
+                       vocab_path,
+                       batch_size,
+                       neg_size=0,
+                       buffer_size=1000,
+                       is_train=True):
+    """ prepare batches with lod offsets (and negatives) from a session store """
+    vocab_size = get_vocab_size(vocab_path)
+    store = SessionStore.load(store_path)
+    shuffle = is_train and 'ce_mode' not in os.environ
+    reader = store_reader(
+        store,
+        batch_size,
+        batch_size * 20,
+        neg_size=neg_size,
+        shuffle=shuffle,
+        max_len=buffer_size,
+        drop_last=is_train)
+    return vocab_size, reader
+
+
 def check_version():
     """
      Log error and exit when the installed version of paddlepaddle is
@@ -12,6 +12,7 @@ def parse_args():
     parser.add_argument('--num_users', type=int, default=6040, help='num_users')
     parser.add_argument('--num_items', type=int, default=3706, help='num_users')
     parser.add_argument('--num_neg', type=int, default=4, help='Number of negative instances to pair with a positive instance.')
+    parser.add_argument('--online_neg', type=int, default=0, help='Sample fresh negative instances from the .rating file every epoch instead of reading train_data_path.')
     parser.add_argument('--lr', type=float, default=0.001, help='Learning rate.')
     parser.add_argument('--train_data_path', type=str, default="Data/train_data.csv", help='train_data_path')
     parser.add_argument('--test_data_path', type=str, default="Data/test.txt", help='train_data_path')
@@ -1,56 +1,75 @@
-import scipy.sparse as sp
 import numpy as np
 from time import time
 import args
 
+
+def load_rating_csr(filename):
+        '''
+        Read .rating file and Return CSR arrays (indptr, indices, num_users, num_items).
+        Each line of .rating file is: user\t item\t rating\t timestamp
+        Items of every user are sorted and deduplicated, so the row slices
+        indices[indptr[u]:indptr[u + 1]] can be used for membership tests.
+        '''
+        data = np.loadtxt(filename, delimiter="\t", usecols=(0, 1, 2), ndmin=2)
+        data = data[data[:, 2] > 0]
+        users = data[:, 0].astype(np.int64)
+        items = data[:, 1].astype(np.int64)
+        num_users = int(users.max()) + 1 if users.size else 0
+        num_items = int(items.max()) + 1 if items.size else 0
+
+        # sort by (user, item) and drop repeated ratings
+        keys = np.unique(users * num_items + items)
+        users, items = keys // num_items, keys % num_items
+        indptr = np.zeros(num_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(users, minlength=num_users), out=indptr[1:])
+        return indptr, items, num_users, num_items
+
+
+def sample_negatives(indptr, indices, num_items, num_negatives, rng=np.random):
+        '''
+        Draw num_negatives unobserved items for every positive (u, i) pair.
+        Candidates are drawn for all pairs at once, checked against the sorted
+        (user, item) keys with searchsorted, and only the rejected ones are redrawn.
+        Return an int64 array of shape [nnz, num_negatives].
+        '''
+        num_users = len(indptr) - 1
+        degree = np.diff(indptr)
+        if np.any(degree >= num_items):
+            raise ValueError("some users have rated every item, "
+                             "no negative instance can be sampled for them")
+        users = np.repeat(np.arange(num_users, dtype=np.int64), degree)
+        pos_keys = users * num_items + indices
+
+        cand_users = np.repeat(users, num_negatives)
+        negs = rng.randint(num_items, size=cand_users.shape[0]).astype(np.int64)
+        todo = np.arange(cand_users.shape[0])
+        while todo.size > 0:
+            keys = cand_users[todo] * num_items + negs[todo]
+            pos = np.searchsorted(pos_keys, keys)
+            pos[pos == pos_keys.shape[0]] = 0
+            todo = todo[pos_keys[pos] == keys]
+            negs[todo] = rng.randint(num_items, size=todo.shape[0])
+        return negs.reshape(-1, num_negatives)
+
+
 def get_train_data(filename, write_file, num_negatives):
         '''
-        Read .rating file and Return dok matrix.
-        The first line of .rating file is: num_users\t num_items
+        Read .rating file and write positive instances, each followed by
+        num_negatives sampled negative instances, as "user,item,label" lines.
         '''
-        # Get number of users and items
-        num_users, num_items = 0, 0
-        with open(filename, "r") as f:
-            line = f.readline()
-            while line != None and line != "":
-                arr = line.split("\t")
-                u, i = int(arr[0]), int(arr[1])
-                num_users = max(num_users, u)
-                num_items = max(num_items, i)
-                line = f.readline()
-        # Construct matrix
-        mat = sp.dok_matrix((num_users+1, num_items+1), dtype=np.float32)
-        with open(filename, "r") as f:
-            line = f.readline()
-            while line != None and line != "":
-                arr = line.split("\t")
-                user, item, rating = int(arr[0]), int(arr[1]), float(arr[2])
-                if (rating > 0):
-                    mat[user, item] = 1.0
-                line = f.readline()    
-
-        file = open(write_file, 'w') 
+        indptr, indices, num_users, num_items = load_rating_csr(filename)
+        negs = sample_negatives(indptr, indices, num_items, num_negatives)
+
+        users = np.repeat(np.arange(num_users, dtype=np.int64), np.diff(indptr))
+        items = np.concatenate([indices[:, None], negs], axis=1)
+        labels = np.zeros_like(items)
+        labels[:, 0] = 1
+        samples = np.stack([np.repeat(users, num_negatives + 1),
+                            items.reshape(-1), labels.reshape(-1)], axis=1)
+
         print("writing " + write_file)
-        
-        for (u, i) in mat.keys():
-            # positive instance
-            user_input = str(u)
-            item_input = str(i)
-            label = str(1)
-            sample =  "{0},{1},{2}".format(user_input, item_input,label) + "\n"
-            file.write(sample)
-            # negative instances
-            for t in range(num_negatives):
-                j = np.random.randint(num_items)
-                while (u, j) in mat.keys():
-                    j = np.random.randint(num_items)
-                user_input = str(u)
-                item_input = str(j)
-                label = str(0)
-                sample =  "{0},{1},{2}".format(user_input, item_input,label) + "\n"
-                file.write(sample)
-                
+        np.savetxt(write_file, samples, fmt="%d", delimiter=",")
+
 if __name__ == "__main__":
     args = args.parse_args()
     get_train_data(args.path + args.dataset + ".train.rating", args.train_data_path, args.num_neg)
-    
\ No newline at end of file
@@ -23,8 +23,12 @@ def train(args, train_data_path):
     testRatings, testNegatives = dataset.testRatings, dataset.testNegatives
 
     train_data_generator = utils.Dataset()
-    train_reader = fluid.io.batch(train_data_generator.train(train_data_path, True), batch_size=args.batch_size)
-    
+    if args.online_neg:
+        train_reader = train_data_generator.train_online(
+            args.path + args.dataset + ".train.rating", args.num_neg, args.batch_size)
+    else:
+        train_reader = fluid.io.batch(train_data_generator.train(train_data_path, True), batch_size=args.batch_size)
+
     inputs = utils.input_data(True)
     if args.GMF:
         model = GMF()
@@ -45,7 +49,10 @@ def train(args, train_data_path):
 
     loader = fluid.io.DataLoader.from_generator(
         feed_list=inputs, capacity=args.batch_size, iterable=True)
-    loader.set_sample_list_generator(train_reader, places=place)
+    if args.online_neg:
+        loader.set_batch_generator(train_reader, places=place)
+    else:
+        loader.set_sample_list_generator(train_reader, places=place)
     
     for epoch in range(args.epochs):
 
@@ -26,6 +26,31 @@ class Dataset(object):
 
     def test(self, file, is_train):
         return self._reader_creator(file, is_train)
+
+    def train_online(self, rating_file, num_negatives, batch_size, shuffle=True):
+        """
+        Batch generator which samples fresh negatives from the .rating file
+        on every call, i.e. on every epoch, instead of reading a fixed
+        train_data.csv. Yields [user_input, item_input, label] int64 arrays
+        of shape [batch_size, 1].
+        """
+        from get_train_data import load_rating_csr, sample_negatives
+        indptr, indices, num_users, num_items = load_rating_csr(rating_file)
+        pos_users = np.repeat(np.arange(num_users, dtype=np.int64), np.diff(indptr))
+
+        def reader():
+            negs = sample_negatives(indptr, indices, num_items, num_negatives)
+            users = np.repeat(pos_users, num_negatives + 1)
+            items = np.concatenate([indices[:, None], negs], axis=1).reshape(-1)
+            labels = np.zeros((len(indices), num_negatives + 1), dtype=np.int64)
+            labels[:, 0] = 1
+            labels = labels.reshape(-1)
+            order = np.random.permutation(len(users)) if shuffle else np.arange(len(users))
+            for begin in range(0, len(order), batch_size):
+                idx = order[begin:begin + batch_size]
+                yield [users[idx][:, None], items[idx][:, None], labels[idx][:, None]]
+
+        return reader
         
 def input_data(is_train):
     user_input = fluid.data(name="user_input", shape=[-1, 1], dtype="int64", lod_level=0)
@@ -122,6 +122,10 @@ def parse_args():
     model_g.add_arg("tree_emb_init_path", str,
                     "./thirdparty/tree_emb.txt", "TDM tree emb file path")
 
+    model_g.add_arg("tree_index_path", str, "",
+                    "binary tree index dir made by tree_index.py, "
+                    "used instead of the tree text files if set")
+
     model_g.add_arg("load_model", bool, False,
                     "whether load model(paddle persistables model)")
     model_g.add_arg("save_init_model", bool, False,
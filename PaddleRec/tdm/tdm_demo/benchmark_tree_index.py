@@ -0,0 +1,138 @@
+# -*- coding=utf-8 -*-
+"""
+#   Copyright (c) 2020 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+from __future__ import print_function
+import time
+import argparse
+import numpy as np
+
+from tree_index import TreeIndex, beam_search
+
+
+def build_complete_tree(layer_size, child_nums, emb_size, seed=0):
+    """
+    Build a complete child_nums-ary tree with child_nums**layer_size leaves
+    in the TreeIndex layout. Embeddings are generated top-down as
+    parent + noise, so that the tree clusters similar leaves, then every
+    internal node is reset to the mean of its children as in the README.
+    """
+    rng = np.random.RandomState(seed)
+    layer_num = [child_nums**l for l in range(layer_size + 1)]
+    offsets = np.concatenate([[0], np.cumsum(layer_num)])
+    node_num = int(offsets[-1])
+
+    emb = np.zeros((node_num, emb_size), dtype=np.float32)
+    for l in range(1, layer_size + 1):
+        begin, end = offsets[l], offsets[l + 1]
+        parent = (np.arange(begin, end) - 1) // child_nums
+        emb[begin:end] = emb[parent] + rng.randn(end - begin, emb_size) / l
+    for l in range(layer_size - 1, -1, -1):
+        begin, end = offsets[l + 1], offsets[l + 2]
+        emb[offsets[l]:offsets[l + 1]] = emb[begin:end].reshape(
+            -1, child_nums, emb_size).mean(axis=1)
+
+    node_ids = np.arange(node_num, dtype=np.int64)
+    internal = int(offsets[layer_size])
+    item_ids = np.zeros(node_num, dtype=np.int64)
+    item_ids[internal:] = np.arange(node_num - internal)
+    degree = np.zeros(node_num, dtype=np.int64)
+    degree[:internal] = child_nums
+    child_indptr = np.concatenate([[0], np.cumsum(degree)])
+    arrays = {
+        "item_ids": item_ids,
+        "layer_ids": np.repeat(np.arange(layer_size + 1), layer_num),
+        "parent": np.maximum((node_ids - 1) // child_nums, 0),
+        "child_indptr": child_indptr,
+        "child_indices": np.arange(1, node_num, dtype=np.int64),
+        "layer_offsets": offsets[1:] - 1,
+        "layer_nodes": np.arange(1, node_num, dtype=np.int64),
+        "emb": emb,
+    }
+    return TreeIndex(arrays)
+
+
+def brute_force_topk(index, query, topk, chunk_size=65536):
+    """exact topk items by inner product over all leaves"""
+    leaves = index.layer(index.layer_num - 1)
+    best_score = np.full((query.shape[0], 0), -np.inf, dtype=np.float32)
+    best_node = np.zeros((query.shape[0], 0), dtype=np.int64)
+    for begin in range(0, len(leaves), chunk_size):
+        nodes = np.asarray(leaves[begin:begin + chunk_size])
+        score = np.concatenate(
+            [best_score, np.dot(query, index.emb[nodes].T)], axis=1)
+        node = np.concatenate(
+            [best_node, np.tile(nodes, (query.shape[0], 1))], axis=1)
+        top = np.argpartition(-score, topk - 1, axis=1)[:, :topk]
+        best_score = np.take_along_axis(score, top, axis=1)
+        best_node = np.take_along_axis(node, top, axis=1)
+    return index.item_ids[best_node]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("benchmark TDM beam search retrieval")
+    # yapf: disable
+    parser.add_argument("--layer_size", type=int, default=20,
+                        help="2**20 leaves by default")
+    parser.add_argument("--child_nums", type=int, default=2)
+    parser.add_argument("--emb_size", type=int, default=64)
+    parser.add_argument("--query_num", type=int, default=1000)
+    parser.add_argument("--batch_size", type=int, default=100)
+    parser.add_argument("--topK", type=int, default=50)
+    parser.add_argument("--beam_size", type=int, default=200)
+    parser.add_argument("--tree_index_path", type=str, default="",
+                        help="save the generated tree and benchmark the "
+                        "memory-mapped copy")
+    # yapf: enable
+    return parser.parse_args()
+
+
+def main(args):
+    start = time.time()
+    index = build_complete_tree(args.layer_size, args.child_nums, args.emb_size)
+    leaf_num, cost = index.layer_node_num_list()[-1], time.time() - start
+    print("build tree with {} nodes, {} leaves in {:.2f}s".format(
+        index.node_num, leaf_num, cost))
+    if args.tree_index_path:
+        index.save(args.tree_index_path)
+        index = TreeIndex.load(args.tree_index_path)
+
+    rng = np.random.RandomState(1)
+    leaves = index.layer(index.layer_num - 1)
+    picked = np.asarray(leaves)[rng.randint(len(leaves), size=args.query_num)]
+    noise = rng.randn(args.query_num, args.emb_size).astype(np.float32)
+    query = index.emb[picked] + noise
+
+    start = time.time()
+    results = []
+    for begin in range(0, args.query_num, args.batch_size):
+        items, _ = beam_search(
+            index,
+            query[begin:begin + args.batch_size],
+            args.topK,
+            beam_size=args.beam_size)
+        results.append(items)
+    cost = time.time() - start
+    results = np.concatenate(results)
+
+    truth = brute_force_topk(index, query, args.topK)
+    hit = (results[:, :, None] == truth[:, None, :]).any(axis=2).sum()
+    print("beam_size: {}, recall@{}: {:.4f}, queries/sec: {:.1f}".format(
+        args.beam_size, args.topK, hit / float(truth.size),
+        args.query_num / cost))
+
+
+if __name__ == "__main__":
+    main(parse_args())
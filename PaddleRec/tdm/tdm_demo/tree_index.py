@@ -0,0 +1,235 @@
+# -*- coding=utf-8 -*-
+"""
+#   Copyright (c) 2020 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+from __future__ import print_function
+import os
+import argparse
+import numpy as np
+
+# 树索引目录中保存的数组，每个数组一个.npy文件，加载时可以memory-map
+TREE_INDEX_ARRAYS = [
+    "item_ids", "layer_ids", "parent", "child_indptr", "child_indices",
+    "layer_offsets", "layer_nodes", "travel", "emb"
+]
+
+
+def _read_int_rows(path):
+    """read comma separated int rows, rows may have different length"""
+    with open(path, 'r') as fin:
+        rows = [line.strip() for line in fin]
+    rows = [row for row in rows if row]
+    lengths = np.array([row.count(',') + 1 for row in rows], dtype=np.int64)
+    values = np.array(','.join(rows).split(','), dtype=np.int64)
+    return values, lengths
+
+
+def _read_int_matrix(path):
+    values, lengths = _read_int_rows(path)
+    return values.reshape(len(lengths), -1)
+
+
+class TreeIndex(object):
+    """
+    Compact TDM tree: per-node item/layer/parent arrays, children as CSR
+    (child_indptr, child_indices), layer nodes as CSR (layer_offsets,
+    layer_nodes), leaf travel paths and node embeddings.
+    Node 0 is the root, it is also used as padding and never retrieved.
+    """
+
+    def __init__(self, arrays):
+        for name in TREE_INDEX_ARRAYS:
+            setattr(self, name, arrays.get(name))
+        self.node_num = self.item_ids.shape[0]
+        self.layer_num = self.layer_offsets.shape[0] - 1
+        self._child_table = None
+
+    @classmethod
+    def from_text(cls, info_path, travel_path, layer_path, emb_path=None):
+        """convert tree_info, travel_list, layer_list and tree_emb .txt files"""
+        info = _read_int_matrix(info_path)
+        children = info[:, 3:]
+        child_indptr = np.zeros(info.shape[0] + 1, dtype=np.int64)
+        np.cumsum((children != 0).sum(axis=1), out=child_indptr[1:])
+
+        layer_values, layer_lengths = _read_int_rows(layer_path)
+        layer_rows = np.repeat(np.arange(len(layer_lengths)), layer_lengths)
+        keep = layer_values != 0
+        layer_offsets = np.zeros(len(layer_lengths) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(layer_rows[keep], minlength=len(layer_lengths)),
+            out=layer_offsets[1:])
+
+        arrays = {
+            "item_ids": info[:, 0],
+            "layer_ids": info[:, 1],
+            "parent": info[:, 2],
+            "child_indptr": child_indptr,
+            "child_indices": children[children != 0],
+            "layer_offsets": layer_offsets,
+            "layer_nodes": layer_values[keep],
+            "travel": _read_int_matrix(travel_path),
+        }
+        if emb_path:
+            arrays["emb"] = np.loadtxt(
+                emb_path, delimiter=',', dtype=np.float32, ndmin=2)
+        return cls(arrays)
+
+    def save(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name in TREE_INDEX_ARRAYS:
+            value = getattr(self, name)
+            if value is not None:
+                np.save(os.path.join(path, name + ".npy"), value)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        arrays = {}
+        for name in TREE_INDEX_ARRAYS:
+            file_name = os.path.join(path, name + ".npy")
+            if os.path.exists(file_name):
+                arrays[name] = np.load(file_name, mmap_mode=mmap_mode)
+        return cls(arrays)
+
+    def layer(self, layer_idx):
+        """node ids of the layer_idx-th layer of layer_list (root excluded)"""
+        begin, end = self.layer_offsets[layer_idx:layer_idx + 2]
+        return self.layer_nodes[begin:end]
+
+    def layer_node_num_list(self):
+        return np.diff(self.layer_offsets).tolist()
+
+    @property
+    def child_table(self):
+        """children padded with 0 to [node_num, max_child_num], built lazily"""
+        if self._child_table is None:
+            degree = np.diff(self.child_indptr)
+            width = max(int(degree.max()), 1) if degree.size else 1
+            table = np.zeros((self.node_num, width), dtype=np.int64)
+            rows = np.repeat(np.arange(self.node_num), degree)
+            cols = np.arange(len(rows)) - np.repeat(self.child_indptr[:-1],
+                                                    degree)
+            table[rows, cols] = self.child_indices
+            self._child_table = table
+        return self._child_table
+
+    def info_array(self):
+        """rebuild the tree_info matrix: item_id, layer, parent, children..."""
+        head = np.stack([self.item_ids, self.layer_ids, self.parent], axis=1)
+        return np.concatenate([head, self.child_table], axis=1)
+
+    def layer_array(self):
+        return np.asarray(self.layer_nodes).reshape([-1, 1])
+
+
+def inner_product_scorer(index):
+    """score nodes by the inner product of query and node embedding"""
+
+    def score(query, nodes):
+        return np.einsum('bd,bcd->bc', query, index.emb[nodes])
+
+    return score
+
+
+def beam_search(index,
+                query,
+                topk,
+                score_fn=None,
+                beam_size=None,
+                start_layer=None):
+    """
+    Batched layer-wise beam search, the numpy counterpart of
+    TdmInferNet.infer_net.
+
+    query is a [B, D] array and score_fn(query, nodes) returns [B, C] scores
+    of the [B, C] candidate node ids. Every layer keeps the best beam_size
+    nodes and expands them with one child_table lookup; leaves met on any
+    layer are collected and the topk of them are returned as
+    ([B, topk] item ids, [B, topk] scores). Missing results are -1.
+    """
+    score_fn = score_fn or inner_product_scorer(index)
+    beam_size = beam_size or topk
+    if start_layer is None:
+        start_layer = index.layer_num - 1
+        for idx, num in enumerate(index.layer_node_num_list()):
+            if num >= beam_size:
+                start_layer = idx
+                break
+    child_table = index.child_table
+    is_leaf = np.diff(index.child_indptr) == 0
+    batch_size = query.shape[0]
+
+    nodes = np.tile(np.asarray(index.layer(start_layer)), (batch_size, 1))
+    leaf_nodes, leaf_scores = [], []
+    for layer_idx in range(start_layer, index.layer_num):
+        scores = np.asarray(score_fn(query, nodes), dtype=np.float32)
+        scores[nodes == 0] = -np.inf
+        leaf_mask = is_leaf[nodes] & (nodes != 0)
+        leaf_nodes.append(nodes)
+        leaf_scores.append(np.where(leaf_mask, scores, -np.inf))
+
+        if layer_idx == index.layer_num - 1:
+            break
+        scores[leaf_mask] = -np.inf
+        k = min(beam_size, nodes.shape[1])
+        if k < nodes.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(k), (batch_size, 1))
+        top_nodes = np.take_along_axis(nodes, top, axis=1)
+        top_nodes[np.take_along_axis(scores, top, axis=1) == -np.inf] = 0
+        # node 0 is padding here, although its row holds the root's children
+        children = child_table[top_nodes]
+        children[top_nodes == 0] = 0
+        nodes = children.reshape(batch_size, -1)
+
+    leaf_nodes = np.concatenate(leaf_nodes, axis=1)
+    leaf_scores = np.concatenate(leaf_scores, axis=1)
+    k = min(topk, leaf_nodes.shape[1])
+    top = np.argsort(-leaf_scores, axis=1, kind='mergesort')[:, :k]
+    res_scores = np.take_along_axis(leaf_scores, top, axis=1)
+    res_nodes = np.take_along_axis(leaf_nodes, top, axis=1)
+    res_items = np.asarray(index.item_ids)[res_nodes]
+    res_items[res_scores == -np.inf] = -1
+    return res_items, res_scores
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        "convert TDM tree text files to a binary tree index")
+    # yapf: disable
+    parser.add_argument("--tree_info_init_path", type=str,
+                        default="./thirdparty/tree_info.txt")
+    parser.add_argument("--tree_travel_init_path", type=str,
+                        default="./thirdparty/travel_list.txt")
+    parser.add_argument("--tree_layer_init_path", type=str,
+                        default="./thirdparty/layer_list.txt")
+    parser.add_argument("--tree_emb_init_path", type=str,
+                        default="./thirdparty/tree_emb.txt")
+    parser.add_argument("--tree_index_path", type=str,
+                        default="./thirdparty/tree_index")
+    # yapf: enable
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    index = TreeIndex.from_text(
+        args.tree_info_init_path, args.tree_travel_init_path,
+        args.tree_layer_init_path, args.tree_emb_init_path)
+    index.save(args.tree_index_path)
+    print("save tree index with {} nodes, {} layers to {}".format(
+        index.node_num, index.layer_num, args.tree_index_path))
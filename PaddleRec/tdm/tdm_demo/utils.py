@@ -22,6 +22,7 @@ import logging
 import numpy as np
 import paddle.fluid as fluid
 from args import print_arguments, parse_args
+from tree_index import TreeIndex
 
 logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("fluid")
@@ -67,9 +68,25 @@ def read_layer_list(path):
     return layer_list, layer_array
 
 
+def load_tree_index(args):
+    """load the binary tree index if --tree_index_path is given"""
+    if getattr(args, "tree_index_path", ""):
+        return TreeIndex.load(args.tree_index_path)
+    return None
+
+
 def tdm_sampler_prepare(args):
     """load tdm tree param from list file"""
     prepare_dict = {}
+    index = load_tree_index(args)
+    if index is not None:
+        prepare_dict['travel_array'] = np.asarray(index.travel)
+        prepare_dict['leaf_node_num'] = index.travel.shape[0]
+        prepare_dict['layer_array'] = index.layer_array()
+        prepare_dict['layer_node_num_list'] = index.layer_node_num_list()
+        prepare_dict['node_num'] = int(index.layer_offsets[-1])
+        return prepare_dict
+
     travel_list = read_list(args.tree_travel_init_path)
 
     travel_array = np.array(travel_list)
@@ -92,6 +109,9 @@ def tdm_sampler_prepare(args):
 
 def tdm_child_prepare(args):
     """load tdm tree param from list file"""
+    index = load_tree_index(args)
+    if index is not None:
+        return index.info_array()
     info_list = read_list(args.tree_info_init_path)
     info_array = np.array(info_list)
     return info_array
@@ -99,6 +119,9 @@ def tdm_child_prepare(args):
 
 def tdm_emb_prepare(args):
     """load tdm tree emb from list file"""
+    index = load_tree_index(args)
+    if index is not None and index.emb is not None:
+        return np.asarray(index.emb)
     emb_list = read_list_float(args.tree_emb_init_path)
     emb_array = np.array(emb_list)
     return emb_array
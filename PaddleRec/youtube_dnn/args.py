@@ -35,6 +35,9 @@ def parse_args():
     parser.add_argument('--video_vec_path', type=str, default='./video_vec.csv', help='video_vec_path')
     parser.add_argument('--user_vec_path', type=str, default='./user_vec.csv', help='user_vec_path')
     parser.add_argument('--topk', type=int, default=5, help='topk')
+    parser.add_argument('--topk_chunk_size', type=int, default=1024, help='number of users scored per matmul in get_topk')
+    parser.add_argument('--topk_num_threads', type=int, default=1, help='number of threads used by get_topk')
+    parser.add_argument('--topk_output_path', type=str, default='', help='write top K results to this csv file instead of printing them')
 
     args = parser.parse_args()
     return args
@@ -0,0 +1,43 @@
+"""
+Benchmark get_topk retrieval on random vectors at catalog scale, e.g.
+
+    python benchmark_topk.py --num_videos 1000000 --num_users 10000 --topk_num_threads 4
+"""
+import argparse
+import time
+import numpy as np
+from get_topk import normalize, topk_search
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num_videos', type=int, default=1000000, help='number of videos in the catalog')
+    parser.add_argument('--num_users', type=int, default=10000, help='number of users to retrieve for')
+    parser.add_argument('--dim', type=int, default=64, help='vector size')
+    parser.add_argument('--topk', type=int, default=100, help='topk')
+    parser.add_argument('--topk_chunk_size', type=int, default=256, help='number of users scored per matmul')
+    parser.add_argument('--topk_num_threads', type=int, default=1, help='number of threads')
+    return parser.parse_args()
+
+
+def main(args):
+    rng = np.random.RandomState(0)
+    video_vec = normalize(rng.randn(args.num_videos, args.dim))
+    user_vec = normalize(rng.randn(args.num_users, args.dim))
+
+    # warm up and check against a full sort on a few users
+    idx, _ = topk_search(user_vec[:8], video_vec, args.topk)
+    ref = np.argsort(-np.dot(user_vec[:8], video_vec.T), axis=1, kind="mergesort")[:, :args.topk]
+    assert np.array_equal(idx, ref)
+
+    start = time.time()
+    topk_search(user_vec, video_vec, args.topk,
+                args.topk_chunk_size, args.topk_num_threads)
+    cost = time.time() - start
+    print("videos: {}, users: {}, dim: {}, topk: {}, threads: {}, "
+          "time: {:.3f}s, users/sec: {:.1f}".format(
+              args.num_videos, args.num_users, args.dim, args.topk,
+              args.topk_num_threads, cost, args.num_users / cost))
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,34 +1,81 @@
 import numpy as np
 import pandas as pd
 import args
-import copy
+from multiprocessing.pool import ThreadPool
 
-def cos_sim(vector_a, vector_b):
-    vector_a = np.mat(vector_a)
-    vector_b = np.mat(vector_b)
-    num = float(vector_a * vector_b.T)
-    denom = np.linalg.norm(vector_a) * np.linalg.norm(vector_b)
-    cos = num / denom
-    sim = 0.5 + 0.5 * cos
-    return sim
 
-def get_topK(args):
-    video_vec = pd.read_csv(args.video_vec_path, header=None)
-    user_vec = pd.read_csv(args.user_vec_path, header=None)
+def load_vectors(args):
+    """
+    Load user vectors (one per row) and video vectors (one per column,
+    the layout written by train.py) as L2-normalized float32 matrices.
+    """
+    video_vec = pd.read_csv(args.video_vec_path, header=None).values.T
+    user_vec = pd.read_csv(args.user_vec_path, header=None).values
+    return normalize(user_vec), normalize(video_vec)
+
+
+def normalize(vec):
+    vec = np.ascontiguousarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(vec, axis=1, keepdims=True)
+    norm[norm == 0] = 1.0
+    vec /= norm
+    return vec
+
 
-    user_video_sim_list = []
-    for i in range(user_vec.shape[0]):
-        for j in range(video_vec.shape[1]):    
-            user_video_sim = cos_sim(np.array(user_vec.loc[i]), np.array(video_vec[j]))
-            user_video_sim_list.append(user_video_sim)
+def topk_chunk(user_vec, video_vec, k):
+    """
+    Return the indices and similarities (0.5 + 0.5 * cos) of the top k videos
+    of every user in user_vec, ordered by decreasing similarity.
+    """
+    k = min(k, video_vec.shape[0])
+    scores = np.dot(user_vec, video_vec.T)
+    if k < scores.shape[1]:
+        idx = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        idx = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    top = np.take_along_axis(scores, idx, axis=1)
+    # sort the k candidates, ties broken by the smaller video index
+    order = np.lexsort((idx, -top), axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return idx, 0.5 + 0.5 * top
 
-        tmp_list=copy.deepcopy(user_video_sim_list)
-        tmp_list.sort()
-        max_sim_index=[user_video_sim_list.index(one) for one in tmp_list[::-1][:args.topk]]
 
-        print("user:{0}, top K videos:{1}".format(i, max_sim_index))
-        user_video_sim_list = []
+def topk_search(user_vec, video_vec, k, chunk_size=1024, num_threads=1):
+    """
+    Top k retrieval for all users, computed chunk by chunk so that the
+    [chunk_size, num_videos] score matrix stays small. numpy releases the GIL
+    inside matmul and argpartition, so chunks can run on a thread pool.
+    """
+    chunks = [user_vec[i:i + chunk_size]
+              for i in range(0, user_vec.shape[0], chunk_size)]
+    run = lambda chunk: topk_chunk(chunk, video_vec, k)
+    if num_threads > 1:
+        pool = ThreadPool(num_threads)
+        results = pool.map(run, chunks)
+        pool.close()
+        pool.join()
+    else:
+        results = list(map(run, chunks))
+    if not results:
+        return np.zeros((0, k), dtype=np.int64), np.zeros((0, k), dtype=np.float32)
+    idx, sim = zip(*results)
+    return np.concatenate(idx), np.concatenate(sim)
+
+
+def get_topK(args):
+    user_vec, video_vec = load_vectors(args)
+    idx, _ = topk_search(user_vec, video_vec, args.topk,
+                         args.topk_chunk_size, args.topk_num_threads)
+
+    if args.topk_output_path:
+        users = np.arange(idx.shape[0])[:, None]
+        np.savetxt(args.topk_output_path, np.hstack([users, idx]),
+                   fmt="%d", delimiter=",")
+    else:
+        print("\n".join("user:{0}, top K videos:{1}".format(i, list(row))
+                        for i, row in enumerate(idx.tolist())))
 
 if __name__ == "__main__":
     args = args.parse_args()
-    get_topK(args)
\ No newline at end of file
+    get_topK(args)